@@ -0,0 +1,270 @@
+import json
+from datetime import datetime
+from itertools import chain, islice
+from flask import Blueprint, Response, current_app, request
+from routing import read_engine
+from conditional import conditional, venue_validators, artist_validators, \
+    table_validators
+from pagination import decode_cursor, InvalidCursor
+from queries import venue_collection, artist_collection, show_collection, \
+    venue_detail, artist_detail, venue_show_cards, artist_show_cards, \
+    stream_rows, UnknownField, VENUE_DETAIL_COLUMNS, ARTIST_DETAIL_COLUMNS
+from search import venue_search, artist_search
+from facets import genre_facets, parse_genre_filter, InvalidFilter
+from areas import area_directory, parse_area_filter
+from calendars import parse_time_window, InvalidWindow
+from model import Venue, Artist
+
+#----------------------------------------------------------------------------#
+# JSON API.
+#----------------------------------------------------------------------------#
+# /api/v1 serves the read routes as JSON from the same query layer as the
+# HTML pages. Collections are streamed: rows come from a server-side
+# cursor in batches and are written out as they are read, so a response
+# never holds the whole table. ?fields=a,b narrows both the columns
+# selected and the payload. The venue and artist collections and
+# searches take the genre filters of facets.py (?genre=...&match=all),
+# and /venues/genres and /artists/genres count the genres of the set
+# they select. The collections also take the area filters of areas.py
+# (?state=...&city=...), and /areas serves the area directory. /shows
+# takes a ?from=...&to=... start time window (see calendars.py).
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+DETAIL_LISTS = ('upcoming_shows', 'upcoming_shows_count',
+                'upcoming_shows_next', 'past_shows', 'past_shows_count',
+                'past_shows_next')
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+
+def dumps(value):
+    return json.dumps(value, default=_json_default, separators=(',', ':'))
+
+
+def json_response(value, status=200):
+    return Response(dumps(value), status=status,
+                    mimetype='application/json')
+
+
+def fields_arg():
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(',') if field.strip()]
+
+
+def limit_arg():
+    limit = request.args.get('limit')
+    if limit is None:
+        return None
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise BadRequest('limit must be an integer')
+    if limit < 1:
+        raise BadRequest('limit must be positive')
+    return limit
+
+
+def genre_filter_arg():
+    try:
+        return parse_genre_filter(request.args)
+    except InvalidFilter as error:
+        raise BadRequest(str(error))
+
+
+def area_filter_arg():
+    try:
+        return parse_area_filter(request.args)
+    except InvalidFilter as error:
+        raise BadRequest(str(error))
+
+
+def time_window_args():
+    try:
+        return parse_time_window(request.args)
+    except InvalidWindow as error:
+        raise BadRequest(str(error))
+
+
+def stream_collection(collection, **filters):
+    '''
+    stream_collection(collection, **filters)
+        streams {"data": [...]} from the statement `collection` builds
+        for the request's fields, limit and `filters`, writing rows as
+        they are read from the server-side cursor. The first batch is
+        read before the response starts, so a failing query answers 500
+        rather than a truncated 200.
+    '''
+    try:
+        statement = collection(fields=fields_arg(), limit=limit_arg(),
+                               **filters)
+    except UnknownField as error:
+        raise BadRequest('unknown fields: {}'.format(error))
+    batch_size = current_app.config['API_BATCH_SIZE']
+    rows = stream_rows(read_engine(), statement, batch_size)
+    first = list(islice(rows, batch_size))
+
+    def generate():
+        yield '{"data":['
+        chunk = []
+        separator = ''
+        for row in chain(first, rows):
+            chunk.append(separator + dumps(row))
+            separator = ','
+            if len(chunk) == 500:
+                yield ''.join(chunk)
+                chunk = []
+        yield ''.join(chunk) + ']}'
+
+    return Response(generate(), mimetype='application/json')
+
+
+def detail_fields(columns):
+    fields = fields_arg()
+    if fields is None:
+        return None
+    unknown = [field for field in fields
+               if field not in columns and field not in DETAIL_LISTS]
+    if unknown:
+        raise BadRequest('unknown fields: {}'.format(', '.join(unknown)))
+    return set(fields)
+
+
+def show_cards(cards):
+    when = request.args.get('when')
+    if when not in ('upcoming', 'past'):
+        raise BadRequest('when must be upcoming or past')
+    shows, next_cursor = cards(when, decode_cursor(
+        request.args.get('cursor', '')))
+    return json_response({'data': shows, 'next_cursor': next_cursor})
+
+
+@api.errorhandler(BadRequest)
+def bad_request(error):
+    return json_response({'error': str(error)}, 400)
+
+
+@api.errorhandler(InvalidCursor)
+def invalid_cursor(error):
+    return json_response({'error': 'invalid cursor'}, 400)
+
+
+@api.errorhandler(404)
+def not_found(error):
+    return json_response({'error': 'not found'}, 404)
+
+#  Collections
+#  ----------------------------------------------------------------
+
+
+@api.route('/venues')
+@conditional(table_validators('Venue', 'Show', split_on_now=True))
+def venues():
+    return stream_collection(venue_collection,
+                             genre_filter=genre_filter_arg(),
+                             area_filter=area_filter_arg())
+
+
+@api.route('/artists')
+@conditional(table_validators('Artist'))
+def artists():
+    return stream_collection(artist_collection,
+                             genre_filter=genre_filter_arg(),
+                             area_filter=area_filter_arg())
+
+
+@api.route('/shows')
+@conditional(table_validators('Show', 'Venue', 'Artist'))
+def shows():
+    return stream_collection(show_collection, **time_window_args())
+
+#  Areas and genre facets
+#  ----------------------------------------------------------------
+
+
+@api.route('/areas')
+@conditional(table_validators('Venue', 'Artist', 'Show', split_on_now=True))
+def areas():
+    return json_response({'data': area_directory(area_filter_arg())})
+
+
+@api.route('/venues/genres')
+@conditional(table_validators('Venue'))
+def venue_genres():
+    return json_response({'data': genre_facets(Venue, genre_filter_arg())})
+
+
+@api.route('/artists/genres')
+@conditional(table_validators('Artist'))
+def artist_genres():
+    return json_response({'data': genre_facets(Artist, genre_filter_arg())})
+
+#  Search
+#  ----------------------------------------------------------------
+
+
+def run_search(search):
+    fuzzy = request.args.get('fuzzy') in ('1', 'true')
+    limit = limit_arg() or current_app.config['SEARCH_RESULT_LIMIT']
+    return json_response(search(request.args.get('q', ''), fuzzy=fuzzy,
+                                limit=limit, genre_filter=genre_filter_arg()))
+
+
+@api.route('/venues/search')
+def search_venues():
+    return run_search(venue_search)
+
+
+@api.route('/artists/search')
+def search_artists():
+    return run_search(artist_search)
+
+#  Detail
+#  ----------------------------------------------------------------
+
+
+@api.route('/venues/<int:venue_id>')
+@conditional(venue_validators)
+def show_venue(venue_id):
+    data = venue_detail(venue_id, limit=current_app.config['SHOW_CARDS_LIMIT'],
+                        fields=detail_fields(VENUE_DETAIL_COLUMNS))
+    if data is None:
+        return not_found(None)
+    return json_response(data)
+
+
+@api.route('/venues/<int:venue_id>/shows')
+@conditional(venue_validators)
+def venue_shows(venue_id):
+    return show_cards(lambda when, cursor: venue_show_cards(
+        venue_id, when, cursor,
+        limit=current_app.config['SHOW_CARDS_LIMIT']))
+
+
+@api.route('/artists/<int:artist_id>')
+@conditional(artist_validators)
+def show_artist(artist_id):
+    data = artist_detail(artist_id,
+                         limit=current_app.config['SHOW_CARDS_LIMIT'],
+                         fields=detail_fields(ARTIST_DETAIL_COLUMNS))
+    if data is None:
+        return not_found(None)
+    return json_response(data)
+
+
+@api.route('/artists/<int:artist_id>/shows')
+@conditional(artist_validators)
+def artist_shows(artist_id):
+    return show_cards(lambda when, cursor: artist_show_cards(
+        artist_id, when, cursor,
+        limit=current_app.config['SHOW_CARDS_LIMIT']))
@@ -2,42 +2,62 @@
 # Imports
 # ----------------------------------------------------------------------------#
 
-import json
-import dateutil.parser
-import babel
 from flask import Flask, render_template,\
-  request, Response, flash, redirect, url_for, jsonify
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+  request, flash, redirect, url_for, abort, g
 import logging
 from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
-from datetime import datetime
-from model import db, Venue, Artist, Show, setup_db
+from sqlalchemy.exc import IntegrityError
+from model import db, Venue, Artist, Show, ShowSeries, setup_db
+from queries import venue_areas, artist_listing, show_listing, \
+  venue_detail, artist_detail, venue_show_cards, artist_show_cards
+from pagination import decode_cursor, InvalidCursor
+from search import venue_search, artist_search
+from facets import facets_cli, parse_genre_filter, InvalidFilter
+from areas import areas_cli, parse_area_filter, area_directory
+from calendars import calendars, parse_time_window, InvalidWindow
+from bookings import booking_conflict, end_time
+from series import parse_recurrence, create_series, edit_series, \
+    cancel_series, upcoming_shows, InvalidSeries, SeriesConflict
+from formatting import format_datetime
+from conditional import conditional, venue_validators, artist_validators, \
+  table_validators
+from api import api
+from importer import import_cli
+from exporter import export_cli, export_api
+from counters import counters_cli
+from metrics import init_metrics
+from assets import init_assets
+from templating import init_templates
+from sessions import init_sessions
+from cache import page_cache, venue_key, artist_key, venue_page_keys, \
+  artist_page_keys
+from loading import query_budget
 # ----------------------------------------------------------------------------#
 # App Config.
 # ----------------------------------------------------------------------------#
 
 app = Flask(__name__)
-moment = Moment(app)
 setup_db(app)
+init_sessions(app)
+page_cache.init_app(app)
+app.register_blueprint(api)
+app.register_blueprint(export_api)
+app.register_blueprint(calendars)
+app.cli.add_command(import_cli)
+app.cli.add_command(export_cli)
+app.cli.add_command(counters_cli)
+app.cli.add_command(facets_cli)
+app.cli.add_command(areas_cli)
+init_metrics(app)
+init_assets(app)
+init_templates(app)
 
 # TODO: connect to a local postgresql database
 
 # ----------------------------------------------------------------------------#
 # Filters.
 # ----------------------------------------------------------------------------#
-# Date formatter for the frontend
-
-
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+# Date formatter for the frontend (see formatting.py)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
@@ -51,118 +71,174 @@ app.jinja_env.filters['datetime'] = format_datetime
 def index():
     return render_template('pages/home.html')
 
+# parses ?when=upcoming|past&cursor=... for the "load more" routes
+
+
+def show_cards_args():
+    when = request.args.get('when')
+    if when not in ('upcoming', 'past'):
+        abort(400)
+    return when, decode_cursor(request.args.get('cursor', ''))
+
+# a cached detail page is stale once its first upcoming show has started
+
+
+def first_upcoming_start(data):
+    if data['upcoming_shows']:
+        return data['upcoming_shows'][0]['start_time']
+    return None
+
+# parses the ?after=... / ?before=... cursors of the paginated listings
+
+
+def page_args():
+    args = {}
+    for direction in ('after', 'before'):
+        if request.args.get(direction):
+            args[direction] = decode_cursor(request.args[direction])
+    return args
+
+# parses the ?genre=...&match=any|all&seeking=1 filters (see facets.py)
+
+
+def genre_filter(args):
+    try:
+        return parse_genre_filter(args)
+    except InvalidFilter:
+        abort(400)
+
+# parses the ?from=...&to=... start time window (see calendars.py)
+
+
+def time_window(args):
+    try:
+        return parse_time_window(args)
+    except InvalidWindow:
+        abort(400)
+
+# parses the ?state=...&city=... filters (see areas.py)
+
+
+def area_filter(args):
+    try:
+        return parse_area_filter(args)
+    except InvalidFilter:
+        abort(400)
+
+# the link to another page of the current listing, keeping its filters
+
+
+@app.template_global()
+def page_url(**cursor):
+    args = request.args.to_dict(flat=False)
+    args.pop('after', None)
+    args.pop('before', None)
+    args.update(cursor)
+    return url_for(request.endpoint, **args)
+
+# runs a venue or artist search for the submitted search_term
+
+
+def run_search(search):
+    term = request.form.get('search_term', '')
+    fuzzy = bool(request.form.get('fuzzy'))
+    limit = app.config['SEARCH_RESULT_LIMIT']
+    genres = genre_filter(request.form)
+    results = search(term, fuzzy=fuzzy, limit=limit, genre_filter=genres)
+    if not results['count'] and not fuzzy and \
+            app.config['SEARCH_TYPO_TOLERANT']:
+        results = search(term, fuzzy=True, limit=limit, genre_filter=genres)
+    return results
+
+#  Areas
+#  ----------------------------------------------------------------
+# route handler for /areas: the precomputed directory (see areas.py)
+
+
+@app.route('/areas')
+@conditional(table_validators('Venue', 'Artist', 'Show', split_on_now=True))
+@query_budget(1)
+def areas():
+    return render_template('pages/areas.html',
+                           areas=area_directory(area_filter(request.args)))
+
 #  Venues
 #  ----------------------------------------------------------------
 # route handler for /venues
 
 
 @app.route('/venues')
+@conditional(table_validators('Venue', 'Show', split_on_now=True))
+@query_budget(1)
 def venues():
-    venues = Venue.query.all()
-    # DONE: replace with real venues data.
-    # num_shows should be aggregated based
-    # on number of upcoming shows per venue.
-
-    data = []
-    for venue in venues:
-        data.append({
-            "city": venue.city,
-            "state": venue.state,
-            "venues": [{
-                "id": venue.id,
-                "name": venue.name
-                }]
-        })
-    return render_template('pages/venues.html', areas=data)
+    # venues are grouped by city and state, and num_upcoming_shows is
+    # aggregated per venue in the database (see queries.venue_areas).
+    page = venue_areas(size=app.config['LISTING_PAGE_SIZE'],
+                       genre_filter=genre_filter(request.args),
+                       area_filter=area_filter(request.args), **page_args())
+    return render_template('pages/venues.html', areas=page.items, page=page)
 
 # Venue Search
 
 
 @app.route('/venues/search', methods=['POST'])
+@query_budget(2)
 def search_venues():
-    # DONE: implement search on artists with partial
-    # string search. Ensure it is case-insensitive.
-    # seach for Hop should return "The Musical Hop".
-    # search for "Music" should return "The Musical Hop"
-    # and "Park Square Live Music & Coffee"
-    name = request.form.get('search_term')
-    search_term = "%{}%".format(name)
-    venues = Venue.query.filter(Venue.name.ilike(search_term)).all()
-
-    data = []
-    if venues:
-        for venue in venues:
-            data.append({
-                "id": venue.id,
-                "name": venue.name,
-            })
-
-    response = {
-        "count": len(venues),
-        "data": data
-    }
+    # ranked, index-backed search on name, city and genres
+    # (see search.py); falls back to the typo-tolerant mode when an
+    # exact partial match finds nothing.
+    response = run_search(venue_search)
     return render_template('pages/search_venues.html', results=response,
                            search_term=request.form.get('search_term', ''))
 
 
 # GET venue by id
 @app.route('/venues/<int:venue_id>', methods=['GET'])
+@conditional(venue_validators)
+@page_cache.cached('venue:{venue_id}')
+@query_budget(1)
 def show_venue(venue_id):
-    # shows the venue page with the given venue_id
-    # TODO: replace with real venue data from the venues table, using venue_id
-
-    shows = Show.query.filter(Show.venue == venue_id).all()
-    venue = Venue.query.get(venue_id)
-    past_shows = []
-    upcoming_shows = []
-    for show in shows:
-        if(shows and datetime.now() > show.start_time):
-            past_shows.append({
-                "artist_id": show.Artist.id,
-                "artist_name": show.Artist.name,
-                "artist_image_link": show.Artist.image_link,
-                "start_time": str(show.start_time)
-            })
-        else:
-            upcoming_shows.append({
-                "artist_id": show.Artist.id,
-                "artist_name": show.Artist.name,
-                "artist_image_link": show.Artist.image_link,
-                "start_time": str(show.start_time)
-            })
-    data = {
-        "id": venue.id,
-        "name": venue.name,
-        "genres": venue.genres,
-        "address": venue.address,
-        "city": venue.city,
-        "state": venue.state,
-        "phone": venue.phone,
-        "website": venue.website,
-        "facebook_link": venue.facebook_link,
-        "seeking_talent": venue.seeking_talent,
-        "seeking_description": venue.seeking_description,
-        "image_link": venue.image_link,
-        "past_shows": past_shows,
-        "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
-    }
+    # shows the venue page with the given venue_id.
+    # the venue, its show counts and the first page of past and
+    # upcoming shows are loaded in one statement (see queries.venue_detail)
+    data = venue_detail(venue_id, limit=app.config['SHOW_CARDS_LIMIT'])
+    if data is None:
+        abort(404)
+    g.page_cache_expires = first_upcoming_start(data)
 
     return render_template('pages/show_venue.html', venue=data)
 
+# GET the next page of a venue's past or upcoming shows
+
+
+@app.route('/venues/<int:venue_id>/shows', methods=['GET'])
+@conditional(venue_validators)
+@query_budget(1)
+def venue_shows(venue_id):
+    when, cursor = show_cards_args()
+    shows, next_cursor = venue_show_cards(
+        venue_id, when, cursor, limit=app.config['SHOW_CARDS_LIMIT'])
+    next_url = None
+    if next_cursor:
+        next_url = url_for('venue_shows', venue_id=venue_id, when=when,
+                           cursor=next_cursor)
+    return render_template('pages/show_cards.html', shows=shows,
+                           card='artist', next_url=next_url)
+
 # Create Venue
 # ----------------------------------------------------------------
 
 
 @app.route('/venues/create', methods=['GET'])
 def create_venue_form():
+    from forms import VenueForm
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
 @app.route('/venues/create', methods=['POST'])
 def create_venue_submission():
+    from forms import VenueForm
     form = VenueForm()
     # TODO: insert form data as a new Venue record in the db, instead
     # TODO: modify data to be the data object returned from db insertion
@@ -207,8 +283,10 @@ def delete_venue(venue_id):
     venue = Venue.query.get(venue_id)
     if venue and request.method == 'DELETE':
         try:
+            cache_keys = venue_page_keys(venue.id)
             db.session.delete(venue)
             db.session.commit()
+            page_cache.delete(*cache_keys)
         except:
             db.session.rollback()
         finally:
@@ -230,8 +308,10 @@ def delete_artist(artist_id):
     artist = Artist.query.get(artist_id)
     if artist and request.method == 'DELETE':
         try:
+            cache_keys = artist_page_keys(artist.id)
             db.session.delete(artist)
             db.session.commit()
+            page_cache.delete(*cache_keys)
         except:
             db.session.rollback()
         finally:
@@ -250,46 +330,26 @@ def delete_artist(artist_id):
 
 
 @app.route('/artists')
+@conditional(table_validators('Artist'))
+@query_budget(1)
 def artists():
-    # DONE: replace with real data returned from querying the database
-    artists = Artist.query.all()
-    data = []
-
-    for artist in artists:
-        data.append({
-            'id': artist.id,
-            'name': artist.name
-        })
-
-    return render_template('pages/artists.html', artists=data)
+    page = artist_listing(size=app.config['LISTING_PAGE_SIZE'],
+                          genre_filter=genre_filter(request.args),
+                          area_filter=area_filter(request.args),
+                          **page_args())
+    return render_template('pages/artists.html', artists=page.items,
+                           page=page)
 
 # POST artists/search
 
 
 @app.route('/artists/search', methods=['POST'])
+@query_budget(2)
 def search_artists():
-    # DONE: implement search on artists with partial string search.
-    # Ensure it is case-insensitive.
-    # seach for "A" should return "Guns N Petals",
-    # "Matt Quevado", and "The Wild Sax Band".
-    # search for "band" should return "The Wild Sax Band".
-
-    name = request.form.get('search_term')
-    search_term = "%{}%".format(name)
-    artists = Artist.query.filter(Artist.name.ilike(search_term)).all()
-
-    data = []
-    if artists:
-        for artist in artists:
-            data.append({
-                "id": artist.id,
-                "name": artist.name,
-            })
-
-    response = {
-        "count": len(artists),
-        "data": data
-    }
+    # ranked, index-backed search on name, city and genres
+    # (see search.py); falls back to the typo-tolerant mode when an
+    # exact partial match finds nothing.
+    response = run_search(artist_search)
     return render_template('pages/search_artists.html', results=response,
                            search_term=request.form.get('search_term', ''))
 
@@ -297,57 +357,48 @@ def search_artists():
 
 
 @app.route('/artists/<int:artist_id>', methods=['GET'])
+@conditional(artist_validators)
+@page_cache.cached('artist:{artist_id}')
+@query_budget(1)
 def show_artist(artist_id):
     '''
-    shows the artist page with the given artist_id
-    DONE: replace with real artist data from the
-    artists table, using artist_id
+    shows the artist page with the given artist_id.
+    the artist, its show counts and the first page of past and
+    upcoming shows are loaded in one statement (see queries.artist_detail)
     '''
-    shows = Show.query.filter(Show.artist == artist_id).all()
-    artist = Artist.query.get(artist_id)
-    past_shows = []
-    upcoming_shows = []
-    for show in shows:
-        if(shows and datetime.now() > show.start_time):
-            past_shows.append({
-                "venue_id": show.Venue.id,
-                "venue_name": show.Venue.name,
-                "venue_image_link": show.Venue.image_link,
-                "start_time": str(show.start_time)
-            })
-        else:
-            upcoming_shows.append({
-                "venue_id": show.Venue.id,
-                "venue_name": show.Venue.name,
-                "venue_image_link": show.Artist.image_link,
-                "start_time": str(show.start_time)
-            })
-    data = {
-        "id": artist.id,
-        "name": artist.name,
-        "genres": artist.genres,
-        "city": artist.city,
-        "state": artist.state,
-        "phone": artist.phone,
-        "facebook_link": artist.facebook_link,
-        "seeking_venue": artist.seeking_venue,
-        "seeking_description": artist.seeking_description,
-        "image_link": artist.image_link,
-        "past_shows": past_shows,
-        "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
-    }
+    data = artist_detail(artist_id, limit=app.config['SHOW_CARDS_LIMIT'])
+    if data is None:
+        abort(404)
+    g.page_cache_expires = first_upcoming_start(data)
 
     return render_template('pages/show_artist.html', artist=data)
 
+# GET the next page of an artist's past or upcoming shows
+
+
+@app.route('/artists/<int:artist_id>/shows', methods=['GET'])
+@conditional(artist_validators)
+@query_budget(1)
+def artist_shows(artist_id):
+    when, cursor = show_cards_args()
+    shows, next_cursor = artist_show_cards(
+        artist_id, when, cursor, limit=app.config['SHOW_CARDS_LIMIT'])
+    next_url = None
+    if next_cursor:
+        next_url = url_for('artist_shows', artist_id=artist_id, when=when,
+                           cursor=next_cursor)
+    return render_template('pages/show_cards.html', shows=shows,
+                           card='venue', next_url=next_url)
+
 # Update
 # ----------------------------------------------------------------
 # Fetch Artist Update Form into view
 
 
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@query_budget(1)
 def edit_artist(artist_id):
+    from forms import ArtistForm
     form = ArtistForm()
     artist = Artist.query.get(artist_id)
     # DONE: populate form with fields from artist with ID <artist_id>
@@ -365,6 +416,7 @@ def edit_artist(artist_id):
 
 @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
+    from forms import ArtistForm
     # DONE: take values from the form submitted, and update existing
     # artist record with ID <artist_id> using the new attributes
     form = ArtistForm()
@@ -381,6 +433,7 @@ def edit_artist_submission(artist_id):
             artist.image_link = form.image_link.data
 
             db.session.commit()
+            page_cache.delete(*artist_page_keys(artist_id))
             flash('Artist ' + form.name.data + ' was successfully Updated!')
         except:
             db.session.rollback()
@@ -393,7 +446,9 @@ def edit_artist_submission(artist_id):
 
 
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@query_budget(1)
 def edit_venue(venue_id):
+    from forms import VenueForm
     form = VenueForm()
     venue = Venue.query.get(venue_id)
 
@@ -412,6 +467,7 @@ def edit_venue(venue_id):
 
 @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
+    from forms import VenueForm
     # TODO: take values from the form submitted, and update existing
     # venue record with ID <venue_id> using the new attributes
     form = VenueForm()
@@ -427,6 +483,7 @@ def edit_venue_submission(venue_id):
             venue.website = form.website.data
 
             db.session.commit()
+            page_cache.delete(*venue_page_keys(venue_id))
             flash('Venue ' + form.name.data +
                   ' was successfully Updated!')
         except:
@@ -442,6 +499,7 @@ def edit_venue_submission(venue_id):
 
 @app.route('/artists/create', methods=['GET'])
 def create_artist_form():
+    from forms import ArtistForm
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
@@ -449,6 +507,7 @@ def create_artist_form():
 # Artist Create Controller
 @app.route('/artists/create', methods=['POST'])
 def create_artist_submission():
+    from forms import ArtistForm
     # called upon submitting the new artist listing form
     form = ArtistForm()
     # DONE: insert form data as a new Artist record in the db, instead
@@ -486,32 +545,24 @@ def create_artist_submission():
 # ----------------------------------------------------------------
 # Fetch list of shows
 @app.route('/shows')
+@conditional(table_validators('Show', 'Venue', 'Artist'))
+@query_budget(1)
 def shows():
     '''
     displays list of shows at /shows
     DONE: replace with real venues data.
     num_shows should be aggregated based on number of upcoming shows per venue.
     '''
-    shows = Show.query.all()
-    data = []
-    if shows:
-        for show in shows:
-            data.append({
-                "venue_id": show.Venue.id,
-                "venue_name": show.Venue.name,
-                "artist_id": show.Artist.id,
-                "artist_name": show.Artist.name,
-                "artist_image_link": show.Artist.image_link,
-                "start_time": str(show.start_time)
-            })
-
-    return render_template('pages/shows.html', shows=data)
+    page = show_listing(size=app.config['LISTING_PAGE_SIZE'],
+                        **time_window(request.args), **page_args())
+    return render_template('pages/shows.html', shows=page.items, page=page)
 
 # Fetch form for creating a Show
 
 
 @app.route('/shows/create')
 def create_shows():
+    from forms import ShowForm
     # renders form. do not touch.
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
@@ -526,30 +577,179 @@ def create_show_submission():
     upon submitting new show listing form
     TODO: insert form data as a new Show record in the db, instead
     '''
+    from forms import ShowForm
     form = ShowForm()
-    if request.method == 'POST':
-        try:
-            show = Show(
-                venue=form.venue_id.data,
-                artist=form.artist_id.data,
-                start_time=form.start_time.data
-            )
+    if not form.validate():
+        # e.g. a duration under a minute, which the database would
+        # refuse (ck_Show_end_time) with a generic error
+        return render_template('forms/new_show.html', form=form), 400
+    if form.repeat.data:
+        return create_series_submission(form)
+    try:
+        # ids as the database returns them, for the flush hooks
+        # (counters.py, areas.py) that key on them
+        show = Show(
+            venue=int(form.venue_id.data),
+            artist=int(form.artist_id.data),
+            start_time=form.start_time.data,
+            end_time=end_time(form.start_time.data, form.duration.data)
+        )
+
+        db.session.add(show)
+        db.session.commit()
+        page_cache.delete(venue_key(form.venue_id.data),
+                          artist_key(form.artist_id.data))
+        # on successful db insert, flash success
+        flash('Show was successfully listed!')
+
+    except IntegrityError as error:
+        db.session.rollback()
+        # the database refuses double bookings (see bookings.py)
+        conflict = booking_conflict(error, show.venue, show.artist,
+                                    show.start_time, show.end_time)
+        if conflict is None:
+            flash('An error occurred. Show could not be listed.')
+        else:
+            flash('{} Show could not be listed.'.format(conflict))
+            return render_template('forms/new_show.html', form=form), 409
+
+    except Exception:
+        db.session.rollback()
+        # DONE: on unsuccessful db insert, flash an error instead.
+        # e.g., flash('An error occurred. Show could not be listed.')
+        # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+        flash('An error occurred. Show could not be listed.')
+
+    finally:
+        db.session.close()
+    return render_template('pages/home.html')
 
-            db.session.add(show)
-            db.session.commit()
-            # on successful db insert, flash success
-            flash('Show was successfully listed!')
 
-        except:
-            db.session.rollback()
-            # DONE: on unsuccessful db insert, flash an error instead.
-            # e.g., flash('An error occurred. Show could not be listed.')
-            # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
-            flash('An error occurred. Show could not be listed.')
+def create_series_submission(form):
+    '''
+    lists every show of a recurring series at once, in one transaction
+    (see series.py)
+    '''
+    try:
+        recurrence = parse_recurrence(form.repeat.data, form.count.data,
+                                      form.until.data)
+        series, shows = create_series(
+            form.venue_id.data, form.artist_id.data, form.start_time.data,
+            form.duration.data, recurrence)
+        series_id = series.id
+        db.session.commit()
+        page_cache.delete(venue_key(form.venue_id.data),
+                          artist_key(form.artist_id.data))
+        flash('{} shows were successfully listed! Edit or cancel them '
+              'together at {}'.format(shows, url_for(
+                  'edit_show_series', series_id=series_id)))
+
+    except InvalidSeries as error:
+        db.session.rollback()
+        flash('{} Shows could not be listed.'.format(error))
+        return render_template('forms/new_show.html', form=form), 400
+
+    except SeriesConflict as conflict:
+        db.session.rollback()
+        flash('{} Shows could not be listed.'.format(conflict))
+        return render_template('forms/new_show.html', form=form), 409
+
+    except Exception:
+        db.session.rollback()
+        flash('An error occurred. Shows could not be listed.')
+
+    finally:
+        db.session.close()
+    return render_template('pages/home.html')
 
+#  Show series
+#  ----------------------------------------------------------------
+# Fetch Series Update Form into view
+
+
+@app.route('/shows/series/<int:series_id>/edit', methods=['GET'])
+def edit_show_series(series_id):
+    from forms import ShowForm
+    series = db.session.get(ShowSeries, series_id)
+    if series is None:
+        abort(404)
+    form = ShowForm()
+    form.venue_id.data = series.venue
+    form.artist_id.data = series.artist
+    form.start_time.data = series.start_time
+    form.duration.data = series.duration
+    form.repeat.data = series.frequency
+    form.count.data = series.count
+    form.until.data = series.until
+    return render_template('forms/edit_series.html', form=form,
+                           series=series, shows=upcoming_shows(series))
+
+# Series Update Controller
+
+
+@app.route('/shows/series/<int:series_id>/edit', methods=['POST'])
+def edit_show_series_submission(series_id):
+    from forms import ShowForm
+    form = ShowForm()
+    series = db.session.get(ShowSeries, series_id)
+    if series is None:
+        abort(404)
+    if not form.validate():
+        return render_template('forms/edit_series.html', form=form,
+                               series=series,
+                               shows=upcoming_shows(series)), 400
+    cache_keys = [venue_key(series.venue), artist_key(series.artist),
+                  venue_key(form.venue_id.data),
+                  artist_key(form.artist_id.data)]
+    try:
+        recurrence = parse_recurrence(form.repeat.data, form.count.data,
+                                      form.until.data)
+        if recurrence is None:
+            raise InvalidSeries('A series repeats weekly or monthly.')
+        shows = edit_series(series, form.venue_id.data, form.artist_id.data,
+                            form.start_time.data, form.duration.data,
+                            recurrence)
+        db.session.commit()
+        page_cache.delete(*cache_keys)
+        flash('The series was successfully updated: {} upcoming shows.'
+              .format(shows))
+
+    except (InvalidSeries, SeriesConflict) as error:
+        db.session.rollback()
+        flash('{} The series could not be updated.'.format(error))
+        status = 409 if isinstance(error, SeriesConflict) else 400
+        return render_template('forms/edit_series.html', form=form,
+                               series=series,
+                               shows=upcoming_shows(series)), status
+
+    except Exception:
+        db.session.rollback()
+        flash('An error occurred. The series could not be updated.')
+
+    finally:
+        db.session.close()
+    return redirect(url_for('edit_show_series', series_id=series_id))
+
+# Cancel a series: its upcoming shows are removed, past ones kept
+
+
+@app.route('/shows/series/<int:series_id>', methods=['DELETE'])
+def cancel_show_series(series_id):
+    series = db.session.get(ShowSeries, series_id)
+    if series:
+        try:
+            cache_keys = (venue_key(series.venue), artist_key(series.artist))
+            removed = cancel_series(series)
+            db.session.commit()
+            page_cache.delete(*cache_keys)
+            flash('The series was cancelled: {} upcoming shows removed.'
+                  .format(removed))
+        except Exception:
+            db.session.rollback()
+            flash('An error occurred. The series could not be cancelled.')
         finally:
             db.session.close()
-            return render_template('pages/home.html')
+    return render_template('pages/home.html')
 
 
 @app.errorhandler(404)
@@ -557,6 +757,11 @@ def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
+@app.errorhandler(InvalidCursor)
+def invalid_cursor(error):
+    return 'Invalid cursor', 400
+
+
 @app.errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
@@ -564,8 +769,9 @@ def server_error(error):
 
 if not app.debug:
     file_handler = FileHandler('error.log')
-    file_handler.setFormatter(Formatter('% (asctime)s % (levelname)s:
-                              % (message)s[in % (pathname)s: % (lineno)d]'))
+    file_handler.setFormatter(Formatter(
+        '%(asctime)s %(levelname)s: %(message)s '
+        '[in %(pathname)s:%(lineno)d]'))
     app.logger.setLevel(logging.INFO)
     file_handler.setLevel(logging.INFO)
     app.logger.addHandler(file_handler)
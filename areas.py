@@ -0,0 +1,225 @@
+from collections import Counter, namedtuple
+import click
+from flask.cli import AppGroup
+from sqlalchemy import Integer, String, column, event, func, literal, \
+    select, union_all, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from model import db, Venue, Artist, Area
+from facets import InvalidFilter
+
+#----------------------------------------------------------------------------#
+# Areas.
+#----------------------------------------------------------------------------#
+# The venue and artist listings and API collections browse by area:
+# ?state=CA&city=San Francisco keeps the rows of that city, ?state=CA
+# those of the state. Cities are matched on their key, fyyur_city_key(),
+# an IMMUTABLE SQL function (migration 2e8b4f6a9c13) that lowercases,
+# drops punctuation and collapses whitespace, so "san francisco",
+# "San  Francisco" and "San-Francisco" are one area. The (state, city
+# key) indexes on Venue and Artist serve the lookup.
+#
+# The area directory (/areas, /api/v1/areas) reads the Area table: per
+# area, the number of venues and artists and the upcoming shows at its
+# venues. Every flush and bulk import that adds, removes or moves a
+# venue or artist adjusts it, and so do the show counters (counters.py)
+# as a venue's upcoming count changes. `flask areas repair` recounts it.
+
+areas_cli = AppGroup('areas', help='Maintain the area directory.')
+
+AreaFilter = namedtuple('AreaFilter', ['state', 'city'])
+
+
+def city_key(city):
+    '''
+    city_key(city)
+        the SQL expression of the area key of `city`.
+    '''
+    return func.fyyur_city_key(city)
+
+
+def parse_area_filter(args):
+    '''
+    parse_area_filter(args)
+        the AreaFilter given by the state and city values of `args`, or
+        None without them. A city needs its state.
+    '''
+    state = (args.get('state') or '').strip().upper()
+    city = (args.get('city') or '').strip()
+    if city and not state:
+        raise InvalidFilter('city needs a state')
+    if not state:
+        return None
+    return AreaFilter(state, city or None)
+
+
+def area_criteria(entity, area_filter):
+    '''
+    area_criteria(entity, area_filter)
+        the WHERE criteria of `area_filter` for Venue or Artist.
+    '''
+    if area_filter is None:
+        return []
+    criteria = [entity.state == area_filter.state]
+    if area_filter.city:
+        criteria.append(city_key(entity.city) == city_key(area_filter.city))
+    return criteria
+
+
+def area_directory(area_filter=None, session=None):
+    '''
+    area_directory(area_filter)
+        [{"state", "city", "venues", "artists", "upcoming_shows"}] for
+        the areas holding a venue or an artist, by state and city.
+    '''
+    query = (session or db.session).query(Area).filter(
+        (Area.venue_count > 0) | (Area.artist_count > 0))
+    if area_filter is not None:
+        query = query.filter(Area.state == area_filter.state)
+        if area_filter.city:
+            query = query.filter(Area.city_key == city_key(area_filter.city))
+    return [{
+        "state": area.state,
+        "city": area.city,
+        "venues": area.venue_count,
+        "artists": area.artist_count,
+        "upcoming_shows": area.upcoming_shows_count
+    } for area in query.order_by(Area.state, Area.city_key)]
+
+
+# Maintenance
+# ----------------------------------------------------------------
+
+
+def adjust_area_counts(connection, changes):
+    '''
+    adjust_area_counts(connection, changes)
+        applies `changes`, (state, city, venues, artists, upcoming_shows)
+        deltas, to the Area rows. Called for every ORM flush; writes that
+        bypass the ORM (bulk loads) call it directly.
+    '''
+    deltas = Counter()
+    for state, city, *counts in changes:
+        for name, delta in zip(('venues', 'artists', 'upcoming'), counts):
+            deltas[state, city, name] += delta or 0
+    rows = [(state, city, deltas[state, city, 'venues'],
+             deltas[state, city, 'artists'], deltas[state, city, 'upcoming'])
+            for state, city in sorted({(state, city)
+                                       for state, city, name in deltas})]
+    rows = [row for row in rows if any(row[2:])]
+    if not rows:
+        return
+    # spellings of one city share a key: sum them in the statement, which
+    # may not upsert the same row twice
+    changed = values(column('state', String), column('city', String),
+                     column('venues', Integer), column('artists', Integer),
+                     column('upcoming', Integer), name='changed').data(rows)
+    key = city_key(changed.c.city)
+    table = Area.__table__
+    statement = insert(table).from_select(
+        ['state', 'city_key', 'city', 'venue_count', 'artist_count',
+         'upcoming_shows_count'],
+        select(changed.c.state, key, func.min(changed.c.city),
+               func.sum(changed.c.venues), func.sum(changed.c.artists),
+               func.sum(changed.c.upcoming))
+        .group_by(changed.c.state, key).order_by(changed.c.state, key))
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=[table.c.state, table.c.city_key],
+        set_={'venue_count': table.c.venue_count +
+              statement.excluded.venue_count,
+              'artist_count': table.c.artist_count +
+              statement.excluded.artist_count,
+              'upcoming_shows_count': table.c.upcoming_shows_count +
+              statement.excluded.upcoming_shows_count}))
+
+
+def adjust_area_shows(connection, params):
+    '''
+    adjust_area_shows(connection, params)
+        adds the `upcoming` of each {"entity_id", "upcoming"} in `params`
+        to the area of the venue `entity_id`; see counters.py.
+    '''
+    if not params:
+        return
+    venues = Venue.__table__
+    venue_ids = [row['entity_id'] for row in params]
+    upcoming = {row['entity_id']: row['upcoming'] for row in params}
+    adjust_area_counts(connection, (
+        (state, city, 0, 0, upcoming[venue_id])
+        for venue_id, state, city in connection.execute(
+            select(venues.c.id, venues.c.state, venues.c.city)
+            .where(venues.c.id.in_(venue_ids)))))
+
+
+def _area_key(instance, state):
+    '''the (state, city) of a venue or artist before ('old') or after
+    ('new') the pending flush.'''
+    key = []
+    for attribute in ('state', 'city'):
+        history = get_history(instance, attribute)
+        if state == 'old' and history.deleted:
+            key.append(history.deleted[0])
+        elif state == 'new' and history.added:
+            key.append(history.added[0])
+        else:
+            key.append(getattr(instance, attribute))
+    return tuple(key)
+
+
+def _area_change(instance, key, delta):
+    if isinstance(instance, Venue):
+        # the area's upcoming shows are its venues'
+        return key + (delta, 0, delta * (instance.upcoming_shows_count or 0))
+    return key + (0, delta, 0)
+
+
+@event.listens_for(Session, 'after_flush')
+def _adjust_flushed_area_counts(session, flush_context):
+    changes = []
+    for instance in session.new:
+        if isinstance(instance, (Venue, Artist)):
+            changes.append(_area_change(
+                instance, _area_key(instance, 'new'), 1))
+    for instance in session.deleted:
+        if isinstance(instance, (Venue, Artist)):
+            changes.append(_area_change(
+                instance, _area_key(instance, 'old'), -1))
+    for instance in session.dirty:
+        if isinstance(instance, (Venue, Artist)) and \
+                session.is_modified(instance):
+            old, new = _area_key(instance, 'old'), _area_key(instance, 'new')
+            if old != new:
+                changes.extend((_area_change(instance, old, -1),
+                                _area_change(instance, new, 1)))
+    if changes:
+        adjust_area_counts(session.connection(), changes)
+
+
+def repair(connection):
+    '''
+    repair(connection)
+        recounts the Area rows from the venue and artist tables.
+    '''
+    connection.execute(Area.__table__.delete())
+    members = union_all(
+        select(Venue.state, Venue.city, literal(1).label('venues'),
+               literal(0).label('artists'),
+               Venue.upcoming_shows_count.label('upcoming')),
+        select(Artist.state, Artist.city, literal(0), literal(1),
+               literal(0))).subquery()
+    key = city_key(members.c.city)
+    connection.execute(insert(Area.__table__).from_select(
+        ['state', 'city_key', 'city', 'venue_count', 'artist_count',
+         'upcoming_shows_count'],
+        select(members.c.state, key, func.min(members.c.city),
+               func.sum(members.c.venues), func.sum(members.c.artists),
+               func.sum(members.c.upcoming))
+        .group_by(members.c.state, key)))
+
+
+@areas_cli.command('repair', help='Recount the area directory.')
+def repair_command():
+    with db.engine.begin() as connection:
+        repair(connection)
+    click.echo('Recounted areas.')
@@ -0,0 +1,331 @@
+import asyncio
+import io
+import sys
+from asgiref.wsgi import WsgiToAsgi
+from flask import abort, make_response, render_template, request, session
+from flask.signals import request_started
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from werkzeug.exceptions import HTTPException
+from app import app, page_args, genre_filter, area_filter, time_window, \
+    first_upcoming_start
+from cache import page_cache, venue_key, artist_key
+from conditional import not_modified, set_validators, venue_validators, \
+    artist_validators, table_validators
+from queries import venue_areas, artist_listing, show_listing, \
+    venue_detail, artist_detail
+from routing import read_bind_key
+from search import venue_search, artist_search
+
+#----------------------------------------------------------------------------#
+# ASGI entry point.
+#----------------------------------------------------------------------------#
+# `uvicorn asgi:application` serves the read-only pages (listings,
+# searches, venue and artist pages) from async views that query through
+# asyncpg, so one worker keeps many requests waiting on Postgres at once.
+# Every other route, the writes included, runs unchanged through the WSGI
+# app in a thread (asgiref's WsgiToAsgi).
+#
+# The async views reuse the synchronous query layer: each read runs in
+# AsyncSession.run_sync on its own session (and pooled connection), so
+# independent reads run concurrently, e.g. a page's conditional GET
+# validators next to its own query. The Flask request pipeline (before /
+# after request hooks, sessions, error handlers) runs as for WSGI.
+
+POOL_OPTIONS = {
+    'pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle',
+    'pool_pre_ping'
+}
+
+_engines = {}
+
+
+def async_engine(bind_key=None):
+    '''
+    async_engine(bind_key)
+        the asyncpg engine for the primary (None) or a replica bind, with
+        the pool options of the sync engines.
+    '''
+    engine = _engines.get(bind_key)
+    if engine is None:
+        if bind_key is None:
+            url = app.config['SQLALCHEMY_DATABASE_URI']
+        else:
+            url = app.config['SQLALCHEMY_BINDS'][bind_key]
+        options = {name: value for name, value
+                   in app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}).items()
+                   if name in POOL_OPTIONS}
+        engine = _engines[bind_key] = create_async_engine(
+            make_url(url).set(drivername='postgresql+asyncpg'), **options)
+    return engine
+
+
+async def read(function, *args, **kwargs):
+    '''
+    read(function, *args, **kwargs)
+        awaits function(*args, session=..., **kwargs), a read of the query
+        layer, on a new AsyncSession for the request's read bind.
+    '''
+    async with AsyncSession(async_engine(read_bind_key())) as session:
+        return await session.run_sync(
+            lambda sync_session: function(*args, session=sync_session,
+                                          **kwargs))
+
+
+async def conditional_page(validate, load):
+    '''
+    conditional_page(validate, load)
+        the async counterpart of conditional.conditional: returns
+        (validators, data), with data None when the client's copy is
+        still fresh. Without a conditional header, where the page is
+        needed anyway, the validators and load() run concurrently.
+    '''
+    # pages carrying flashed messages are one-offs
+    if session.get('_flashes'):
+        return None, await load()
+    if request.if_none_match or request.if_modified_since:
+        validators = await read(validate)
+        if validators is not None and not_modified(validators):
+            return validators, None
+        return validators, await load()
+    return await asyncio.gather(read(validate), load())
+
+
+def conditional_response(validators, data, render):
+    if data is None:
+        return set_validators(make_response('', 304), validators)
+    response = make_response(render(data))
+    if validators is not None and response.status_code == 200:
+        set_validators(response, validators)
+    return response
+
+
+async def run_search(search):
+    term = request.form.get('search_term', '')
+    fuzzy = bool(request.form.get('fuzzy'))
+    limit = app.config['SEARCH_RESULT_LIMIT']
+    genres = genre_filter(request.form)
+    results = await read(search, term, fuzzy=fuzzy, limit=limit,
+                         genre_filter=genres)
+    if not results['count'] and not fuzzy and \
+            app.config['SEARCH_TYPO_TOLERANT']:
+        results = await read(search, term, fuzzy=True, limit=limit,
+                             genre_filter=genres)
+    return results
+
+
+async def detail_page(validate, detail, entity_id, cache_key, template,
+                      name):
+    # the cached page is versioned by the ETag (see cache.py), so the
+    # validators are read first rather than next to the page
+    validators = None
+    if not session.get('_flashes'):
+        validators = await read(
+            lambda sync_session: validate(entity_id, session=sync_session))
+        if validators is not None and not_modified(validators):
+            return conditional_response(validators, None, None)
+    version = validators and validators[0]
+
+    page = page_cache.get(cache_key, version)
+    if page is None:
+        data = await read(detail, entity_id,
+                          limit=app.config['SHOW_CARDS_LIMIT'])
+        if data is None:
+            abort(404)
+        page = render_template(template, **{name: data})
+        page_cache.set(cache_key, page, first_upcoming_start(data), version)
+    return conditional_response(validators, page, lambda page: page)
+
+
+#  Views
+#  ----------------------------------------------------------------
+# Mirror the views of the same name in app.py.
+
+
+async def venues():
+    args = dict(page_args(), genre_filter=genre_filter(request.args),
+                area_filter=area_filter(request.args))
+
+    async def load():
+        return await read(venue_areas, size=app.config['LISTING_PAGE_SIZE'],
+                          **args)
+    validators, page = await conditional_page(
+        table_validators('Venue', 'Show', split_on_now=True), load)
+    return conditional_response(validators, page, lambda page: render_template(
+        'pages/venues.html', areas=page.items, page=page))
+
+
+async def artists():
+    args = dict(page_args(), genre_filter=genre_filter(request.args),
+                area_filter=area_filter(request.args))
+
+    async def load():
+        return await read(artist_listing,
+                          size=app.config['LISTING_PAGE_SIZE'], **args)
+    validators, page = await conditional_page(
+        table_validators('Artist'), load)
+    return conditional_response(validators, page, lambda page: render_template(
+        'pages/artists.html', artists=page.items, page=page))
+
+
+async def shows():
+    args = dict(page_args(), **time_window(request.args))
+
+    async def load():
+        return await read(show_listing, size=app.config['LISTING_PAGE_SIZE'],
+                          **args)
+    validators, page = await conditional_page(
+        table_validators('Show', 'Venue', 'Artist'), load)
+    return conditional_response(validators, page, lambda page: render_template(
+        'pages/shows.html', shows=page.items, page=page))
+
+
+async def search_venues():
+    return render_template('pages/search_venues.html',
+                           results=await run_search(venue_search),
+                           search_term=request.form.get('search_term', ''))
+
+
+async def search_artists():
+    return render_template('pages/search_artists.html',
+                           results=await run_search(artist_search),
+                           search_term=request.form.get('search_term', ''))
+
+
+async def show_venue(venue_id):
+    return await detail_page(venue_validators, venue_detail, venue_id,
+                             venue_key(venue_id), 'pages/show_venue.html',
+                             'venue')
+
+
+async def show_artist(artist_id):
+    return await detail_page(artist_validators, artist_detail, artist_id,
+                             artist_key(artist_id), 'pages/show_artist.html',
+                             'artist')
+
+
+ASYNC_VIEWS = {
+    'venues': venues,
+    'artists': artists,
+    'shows': shows,
+    'search_venues': search_venues,
+    'search_artists': search_artists,
+    'show_venue': show_venue,
+    'show_artist': show_artist,
+}
+
+#  Application
+#  ----------------------------------------------------------------
+
+
+async def dispatch(environ):
+    '''
+    dispatch(environ)
+        runs an async view through Flask's request pipeline, as
+        Flask.full_dispatch_request does for sync views.
+    '''
+    with app.request_context(environ):
+        try:
+            try:
+                request_started.send(app)
+                rv = app.preprocess_request()
+                if rv is None:
+                    rv = await ASYNC_VIEWS[request.endpoint](
+                        **request.view_args)
+            except Exception as error:
+                rv = app.handle_user_exception(error)
+            return app.finalize_request(rv)
+        except Exception as error:
+            return app.handle_exception(error)
+
+
+def _endpoint(scope):
+    adapter = app.url_map.bind(
+        'localhost', script_name=scope.get('root_path') or None)
+    try:
+        endpoint, view_args = adapter.match(scope['path'], scope['method'])
+    except HTTPException:
+        return None
+    return endpoint
+
+
+def build_environ(scope, body):
+    '''
+    build_environ(scope, body)
+        the WSGI environ of an ASGI http `scope` and its request `body`.
+    '''
+    script_name = scope.get('root_path', '')
+    path = scope['path']
+    if path.startswith(script_name):
+        path = path[len(script_name):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = 'HTTP_' + name
+            environ[key] = environ[key] + ',' + value \
+                if key in environ else value
+    return environ
+
+
+async def _body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _send_response(send, response):
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                    for name, value in response.headers.items()],
+    })
+    await send({'type': 'http.response.body', 'body': response.get_data()})
+
+
+wsgi_application = WsgiToAsgi(app)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for engine in _engines.values():
+                    await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] != 'http' or scope['method'] not in ('GET', 'POST') \
+            or _endpoint(scope) not in ASYNC_VIEWS:
+        return await wsgi_application(scope, receive, send)
+
+    environ = build_environ(scope, await _body(receive))
+    await _send_response(send, await dispatch(environ))
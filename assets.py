@@ -0,0 +1,236 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+import click
+from flask import abort, current_app, request, send_from_directory
+from flask.cli import AppGroup
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#----------------------------------------------------------------------------#
+# Static asset bundles.
+#----------------------------------------------------------------------------#
+# The stylesheets and scripts of layouts/main.html are concatenated and
+# minified into one bundle per BUNDLES entry, named after a hash of its
+# content (main.3f9a2c7d5b16.css), and precompressed next to it as .gz
+# and, when the brotli package is installed, .br. `flask assets build`
+# writes them to static/dist with a manifest.json mapping bundle names to
+# the hashed files; it needs no network access.
+#
+# Templates link bundles with {{ asset_url('main.css') }}. The bundles
+# are served from /static/dist, in the precompressed form the client
+# accepts, with a year-long immutable Cache-Control: a changed bundle
+# gets a new name. They sit one level below static/ like the sources
+# in static/css, so relative url()s in the stylesheets still resolve.
+
+BUNDLES = {
+    'main.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    # loaded blocking in <head>
+    'head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    # loaded with defer, in the order the separate scripts ran
+    'app.js': [
+        'js/libs/jquery-1.11.1.min.js',
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+ONE_YEAR = 365 * 24 * 60 * 60
+
+_lock = threading.Lock()
+
+
+def minify_css(source):
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    return source.replace(';}', '}').strip()
+
+
+def minify_js(source):
+    # line-level only (blank lines, indentation, whole-line comments):
+    # safe without a JavaScript parser, and the libraries come minified
+    lines = (line.strip() for line in source.splitlines())
+    return '\n'.join(line for line in lines
+                     if line and not line.startswith('//'))
+
+
+def bundle(static_folder, name):
+    '''
+    bundle(static_folder, name)
+        the minified content of bundle `name`, as bytes.
+    '''
+    minify = minify_css if name.endswith('.css') else minify_js
+    parts = []
+    for path in BUNDLES[name]:
+        with open(os.path.join(static_folder, path), encoding='utf-8') as f:
+            parts.append(minify(f.read()))
+    # a script that omits its final semicolon must not run into the next
+    separator = '\n' if name.endswith('.css') else ';\n'
+    return (separator.join(parts) + '\n').encode('utf-8')
+
+
+def _write(path, data):
+    # workers may read the directory while another one builds
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+
+def build_assets(static_folder):
+    '''
+    build_assets(static_folder)
+        writes every bundle, precompressed, and the manifest to
+        static_folder/dist; returns the manifest. Files of the previous
+        build are kept, so cached pages that link them still load, and
+        older ones removed.
+    '''
+    directory = os.path.join(static_folder, DIST)
+    os.makedirs(directory, exist_ok=True)
+    previous = load_manifest(static_folder) or {}
+    manifest = {}
+    for name in BUNDLES:
+        data = bundle(static_folder, name)
+        stem, extension = os.path.splitext(name)
+        filename = '{}.{}{}'.format(
+            stem, hashlib.sha256(data).hexdigest()[:12], extension)
+        manifest[name] = filename
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            continue
+        _write(path, data)
+        _write(path + '.gz', gzip.compress(data, 9, mtime=0))
+        if brotli is not None:
+            _write(path + '.br', brotli.compress(data, quality=11))
+    keep = set(manifest.values()) | set(previous.values()) | {MANIFEST}
+    for filename in os.listdir(directory):
+        base = filename
+        for encoding, suffix in ENCODINGS:
+            if base.endswith(suffix):
+                base = base[:-len(suffix)]
+        if base not in keep:
+            os.remove(os.path.join(directory, filename))
+    _write(os.path.join(directory, MANIFEST),
+           json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _stale(static_folder):
+    path = os.path.join(static_folder, DIST, MANIFEST)
+    built = os.path.getmtime(path)
+    return any(os.path.getmtime(os.path.join(static_folder, source)) > built
+               for sources in BUNDLES.values() for source in sources)
+
+
+def manifest():
+    '''
+    manifest()
+        the current app's manifest. Built on first use when no build step
+        ran, and rebuilt whenever a source changes under ASSETS_AUTO_BUILD.
+    '''
+    app = current_app
+    state = app.extensions['assets']
+    if state['manifest'] is None or app.config['ASSETS_AUTO_BUILD']:
+        with _lock:
+            if state['manifest'] is None:
+                state['manifest'] = load_manifest(app.static_folder)
+            if state['manifest'] is None or (
+                    app.config['ASSETS_AUTO_BUILD'] and
+                    _stale(app.static_folder)):
+                state['manifest'] = build_assets(app.static_folder)
+    return state['manifest']
+
+
+def asset_url(name):
+    '''
+    asset_url(name)
+        the URL of the current build of bundle `name`; a template global.
+    '''
+    return '{}/{}/{}'.format(current_app.static_url_path, DIST,
+                             manifest()[name])
+
+
+def serve_asset(filename):
+    # any build still on disk: pages cached before a rebuild link the
+    # previous one
+    if filename == MANIFEST or filename.endswith(
+            tuple(suffix for encoding, suffix in ENCODINGS)):
+        abort(404)
+    directory = os.path.join(current_app.static_folder, DIST)
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding, suffix in ENCODINGS:
+        if request.accept_encodings[encoding] and \
+                os.path.exists(os.path.join(directory, filename + suffix)):
+            response = send_from_directory(directory, filename + suffix,
+                                           mimetype=mimetype,
+                                           max_age=ONE_YEAR)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(directory, filename, mimetype=mimetype,
+                                       max_age=ONE_YEAR)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    return response
+
+
+assets_cli = AppGroup('assets')
+
+
+@assets_cli.command('build', help='Build the static asset bundles into '
+                    'static/dist.')
+def build_command():
+    if brotli is None:
+        click.echo('brotli is not installed; writing gzip copies only.',
+                   err=True)
+    built = build_assets(current_app.static_folder)
+    current_app.extensions['assets']['manifest'] = built
+    directory = os.path.join(current_app.static_folder, DIST)
+    for name, filename in sorted(built.items()):
+        sizes = [os.path.getsize(os.path.join(directory, filename + suffix))
+                 for suffix in ('', '.gz', '.br')
+                 if os.path.exists(os.path.join(directory, filename + suffix))]
+        click.echo('{:<10} {:<28} {}'.format(
+            name, filename, ' / '.join('{:,} B'.format(size)
+                                       for size in sizes)))
+
+
+def init_assets(app):
+    '''
+    init_assets(app)
+        adds the asset_url template global, the bundle route and the
+        `flask assets` commands to `app`.
+    '''
+    app.extensions['assets'] = {'manifest': None}
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.add_url_rule('{}/{}/<filename>'.format(app.static_url_path, DIST),
+                     'asset', serve_asset)
+    app.cli.add_command(assets_cli)
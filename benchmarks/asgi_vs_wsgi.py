@@ -0,0 +1,105 @@
+'''
+WSGI vs ASGI throughput benchmark.
+
+Starts the app twice with a single worker each, under gunicorn (WSGI,
+app:app) and under uvicorn (ASGI, asgi:application), and load tests the
+read routes the async views serve (see benchmarks/load.py) against
+both with the same concurrency. Prints requests/s per worker and the
+latency percentiles side by side. The database should hold a realistic
+dataset (benchmarks/generate.py), and the page cache is disabled so
+every request reaches Postgres.
+
+The async views pay off when requests spend their time waiting on the
+database (a remote or replica host, slow plans); with Postgres on the
+same machine and fast indexed queries, template rendering dominates
+and the ASGI worker's extra overhead can make it the slower one.
+
+    python benchmarks/asgi_vs_wsgi.py [--concurrency 32] [--duration 30]
+                                      [--wsgi-threads 1]
+'''
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import load  # noqa: E402
+
+READ_ROUTES = ('venues', 'artists', 'shows', 'venue', 'artist',
+               'search_venues', 'search_artists')
+
+
+def wait_for(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    sys.exit('server on port {} did not start'.format(port))
+
+
+def serve(command, port):
+    environment = dict(os.environ, PAGE_CACHE_BACKEND='')
+    server = subprocess.Popen(command, cwd=ROOT, env=environment)
+    wait_for(port)
+    return server
+
+
+def measure(command, port, args):
+    server = serve(command, port)
+    try:
+        # let the pools fill and the templates compile before measuring
+        load.run('http://127.0.0.1:{}'.format(port), args.concurrency, 3,
+                 False, args.seed, READ_ROUTES)
+        return load.run('http://127.0.0.1:{}'.format(port),
+                        args.concurrency, args.duration, False, args.seed,
+                        READ_ROUTES)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--wsgi-threads', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--port', type=int, default=5100)
+    args = parser.parse_args()
+
+    results = {
+        'wsgi': measure([
+            sys.executable, '-m', 'gunicorn', '--workers', '1',
+            '--threads', str(args.wsgi_threads),
+            '--bind', '127.0.0.1:{}'.format(args.port), 'app:app'],
+            args.port, args),
+        'asgi': measure([
+            sys.executable, '-m', 'uvicorn', '--workers', '1',
+            '--log-level', 'warning', '--host', '127.0.0.1',
+            '--port', str(args.port + 1), 'asgi:application'],
+            args.port + 1, args),
+    }
+
+    print('{:<16} {:>12} {:>12} {:>10} {:>10} {:>10} {:>10}'.format(
+        'route', 'wsgi req/s', 'asgi req/s', 'wsgi p50', 'asgi p50',
+        'wsgi p99', 'asgi p99'))
+    for name in READ_ROUTES + ('total',):
+        wsgi, asgi = results['wsgi'].get(name), results['asgi'].get(name)
+        if not wsgi or not asgi:
+            continue
+        print('{:<16} {:>12.1f} {:>12.1f} {:>10.1f} {:>10.1f} {:>10.1f} '
+              '{:>10.1f}'.format(name, wsgi['rps'], asgi['rps'], wsgi['p50'],
+                                 asgi['p50'], wsgi['p99'], asgi['p99']))
+    print('\nASGI serves {:.2f}x the requests/s of WSGI per worker'.format(
+        results['asgi']['total']['rps'] / results['wsgi']['total']['rps']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+'''
+Query plan check for the hot read routes.
+
+Requests every read route through the test client, captures each SQL
+statement that touches "Show", and EXPLAINs it with sequential scans
+disabled. If a plan still contains a Seq Scan on Show, no index can
+serve that query; the script lists it and exits non-zero.
+
+    python benchmarks/check_plans.py
+'''
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from app import app  # noqa: E402
+from model import db, Venue, Artist  # noqa: E402
+from pagination import encode_cursor  # noqa: E402
+
+
+def hot_requests():
+    venue_id = db.session.query(Venue.id).limit(1).scalar() or 1
+    artist_id = db.session.query(Artist.id).limit(1).scalar() or 1
+    db.session.remove()
+    cursor = encode_cursor(datetime.now(), 0)
+    return [
+        ('GET', '/venues', None),
+        ('GET', '/artists', None),
+        ('GET', '/shows', None),
+        ('GET', '/shows?after=' + cursor, None),
+        ('GET', '/venues/{}'.format(venue_id), None),
+        ('GET', '/artists/{}'.format(artist_id), None),
+        ('GET', '/venues/{}/shows?when=past&cursor={}'.format(
+            venue_id, cursor), None),
+        ('GET', '/venues/{}/shows?when=upcoming&cursor={}'.format(
+            venue_id, cursor), None),
+        ('GET', '/artists/{}/shows?when=past&cursor={}'.format(
+            artist_id, cursor), None),
+        ('GET', '/artists/{}/shows?when=upcoming&cursor={}'.format(
+            artist_id, cursor), None),
+        ('POST', '/venues/search', {'search_term': 'music'}),
+        ('POST', '/artists/search', {'search_term': 'band'}),
+    ]
+
+
+def capture(requests):
+    '''
+    capture(requests)
+        returns (request, statement, parameters) for every statement on
+        Show issued while serving `requests`.
+    '''
+    captured = []
+    current = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context,
+                              executemany):
+        if '"Show"' in statement and not executemany:
+            current.append((statement, parameters))
+
+    client = app.test_client()
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        for method, url, data in requests:
+            del current[:]
+            response = client.open(url, method=method, data=data)
+            label = '{} {} ({})'.format(method, url, response.status_code)
+            captured.extend((label, statement, parameters)
+                            for statement, parameters in current)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return captured
+
+
+def seq_scans_on_show(plan):
+    if plan.get('Node Type') == 'Seq Scan' and \
+            plan.get('Relation Name') == 'Show':
+        yield plan
+    for child in plan.get('Plans', []):
+        yield from seq_scans_on_show(child)
+
+
+def main():
+    with app.app_context():
+        captured = capture(hot_requests())
+        failures = 0
+        connection = db.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            # with seq scans priced out, any Seq Scan left in a plan is
+            # one no index can replace
+            cursor.execute('SET enable_seqscan = off')
+            for label, statement, parameters in captured:
+                cursor.execute('EXPLAIN (FORMAT JSON) ' + statement,
+                               parameters)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                scans = list(seq_scans_on_show(plan[0]['Plan']))
+                status = 'SEQ SCAN' if scans else 'ok'
+                print('{:<8} {}'.format(status, label))
+                if scans:
+                    failures += 1
+                    print('         ' + ' '.join(statement.split()))
+        finally:
+            connection.rollback()
+            connection.close()
+
+    if not captured:
+        print('no statements on "Show" were captured')
+        return 1
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+'''
+Micro-benchmark of the `datetime` template filter.
+
+Formats the start times of a /shows-sized page (cards with repeating
+start times) with the previous filter, which received str(start_time),
+re-parsed it with dateutil and rebuilt the babel pattern on every call,
+and with formatting.format_datetime on datetime objects (cold and warm
+cache) and on strings.
+
+    python benchmarks/datetime_filter.py [--cards 5000] [--distinct 500]
+'''
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import babel.dates  # noqa: E402
+import dateutil.parser  # noqa: E402
+import formatting  # noqa: E402
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--cards', type=int, default=5000)
+    parser.add_argument('--distinct', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    start = datetime(2026, 1, 1, 20, 0)
+    times = [start + timedelta(hours=i % args.distinct)
+             for i in range(args.cards)]
+    strings = [str(value) for value in times]
+
+    def cold():
+        formatting._format.cache_clear()
+        for value in times:
+            formatting.format_datetime(value, 'full')
+
+    cases = [
+        ('legacy filter, str input', lambda: [
+            legacy_format_datetime(value, 'full') for value in strings]),
+        ('new filter, datetime, cold cache', cold),
+        ('new filter, datetime, warm cache', lambda: [
+            formatting.format_datetime(value, 'full') for value in times]),
+        ('new filter, str input', lambda: [
+            formatting.format_datetime(value, 'full') for value in strings]),
+    ]
+
+    assert [legacy_format_datetime(value, 'full') for value in strings] == \
+        [formatting.format_datetime(value, 'full') for value in times]
+
+    print('{} cards, {} distinct start times'.format(args.cards,
+                                                     args.distinct))
+    baseline = None
+    for label, case in cases:
+        best = min(timeit.repeat(case, number=1, repeat=args.repeat))
+        baseline = baseline or best
+        print('{:<34} {:>9.2f} ms  {:>6.1f}x'.format(
+            label, best * 1000, baseline / best))
+
+
+if __name__ == '__main__':
+    main()
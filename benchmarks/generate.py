@@ -0,0 +1,172 @@
+'''
+Synthetic dataset generator.
+
+Replaces the contents of Venue, Artist and Show with a seeded synthetic
+catalogue at production scale (10k venues, 100k artists, 5M shows by
+default). Rows are generated inside the database with generate_series,
+in batches committed one by one, so memory use does not grow with the
+scale. The same --seed and sizes always produce the same data.
+
+The data is shaped like the real catalogue: a few large cities hold
+most venues and artists, genre arrays hold one to three genres skewed
+towards the popular ones, a minority of venues host most shows, and
+shows start in the evening, spread over the past two years and the
+next one with more of them in recent months. Shows run 90 minutes, and
+those that would double-book their venue or artist are dropped (see
+bookings.py), so fewer than --shows land at the busiest venues.
+
+The show counters (counters.py) with the area directory (areas.py) and
+the genre facet counts (facets.py) are recounted and the tables
+analyzed at the end. Restart the app afterwards to drop its page
+cache.
+
+    python benchmarks/generate.py [--venues 10000] [--artists 100000]
+                                  [--shows 5000000] [--seed 42]
+                                  [--batch-size 500000] [--yes]
+'''
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+from app import app  # noqa: E402
+from model import db, bump_table_versions  # noqa: E402
+from counters import repair  # noqa: E402
+import facets  # noqa: E402
+
+# most common first; picks are skewed towards the front of each list
+GENRES = ['Rock n Roll', 'Pop', 'Jazz', 'Hip-Hop', 'Alternative', 'Electronic',
+          'Folk', 'Blues', 'R&B', 'Soul', 'Country', 'Punk', 'Heavy Metal',
+          'Reggae', 'Funk', 'Classical', 'Instrumental', 'Musical Theatre',
+          'Other']
+CITIES = [('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'),
+          ('Nashville', 'TN'), ('Austin', 'TX'), ('San Francisco', 'CA'),
+          ('Seattle', 'WA'), ('New Orleans', 'LA'), ('Atlanta', 'GA'),
+          ('Denver', 'CO'), ('Portland', 'OR'), ('Boston', 'MA'),
+          ('Philadelphia', 'PA'), ('Detroit', 'MI'), ('Minneapolis', 'MN'),
+          ('Miami', 'FL'), ('Memphis', 'TN'), ('Kansas City', 'MO')]
+
+# 1-based index into an array of n entries, skewed towards the front
+SKEWED = '(1 + floor(power(random(), {power}) * {n}))::int'
+
+GENRE_ARRAY = '''
+ARRAY(SELECT DISTINCT (:genres)[{pick}]
+      FROM generate_series(1, 1 + floor(random() * 3)::int + 0 * g))
+'''.format(pick=SKEWED.format(power=2, n=len(GENRES)))
+
+CITY = SKEWED.format(power=2, n=len(CITIES))
+
+VENUES = '''
+INSERT INTO "Venue" (name, city, state, address, phone, genres, image_link,
+                     website, facebook_link, seeking_talent,
+                     seeking_description, updated_at)
+SELECT 'Venue ' || g || ' ' || initcap(substr(md5(random()::text), 1, 8)),
+       (:cities)[c], (:states)[c],
+       (1 + floor(random() * 9999))::int || ' ' ||
+           initcap(substr(md5(random()::text), 1, 6)) || ' St',
+       '555-' || lpad((floor(random() * 10000))::int::text, 4, '0'),
+       {genres},
+       'https://images.example.com/venues/' || g || '.jpg',
+       'https://venue' || g || '.example.com',
+       'https://www.facebook.com/venue' || g,
+       random() < 0.3, NULL, now()
+FROM (SELECT g, {city} AS c FROM generate_series(:start, :stop) AS g) AS v
+'''.format(genres=GENRE_ARRAY, city=CITY)
+
+ARTISTS = '''
+INSERT INTO "Artist" (name, city, state, phone, genres, image_link,
+                      facebook_link, seeking_venue, seeking_description,
+                      updated_at)
+SELECT 'Artist ' || g || ' ' || initcap(substr(md5(random()::text), 1, 8)),
+       (:cities)[c], (:states)[c],
+       '555-' || lpad((floor(random() * 10000))::int::text, 4, '0'),
+       {genres},
+       'https://images.example.com/artists/' || g || '.jpg',
+       'https://www.facebook.com/artist' || g,
+       random() < 0.4, NULL, now()
+FROM (SELECT g, {city} AS c FROM generate_series(:start, :stop) AS g) AS a
+'''.format(genres=GENRE_ARRAY, city=CITY)
+
+# days from 730 in the past to 365 ahead, denser towards today; doors
+# open between 18:00 and 23:45 in quarter hours
+SHOWS = '''
+INSERT INTO "Show" (venue, artist, start_time, end_time, updated_at)
+SELECT venue, artist, start_time, start_time + interval '90 minutes', now()
+FROM (
+    SELECT {venue} AS venue, {artist} AS artist,
+           date_trunc('day', now()::timestamp)
+               + ((CASE WHEN random() < 0.75
+                        THEN -floor(power(random(), 1.5) * 730)
+                        ELSE floor(random() * 365) END) * interval '1 day')
+               + ((18 * 4 + floor(random() * 24)) * interval '15 minutes')
+               AS start_time
+    FROM generate_series(:start, :stop) AS g
+) AS shows
+ON CONFLICT DO NOTHING
+'''.format(venue=SKEWED.format(power=2, n=':venues'),
+           artist=SKEWED.format(power=1.5, n=':artists'))
+
+
+def fill(connection, label, statement, total, batch_size, params=None):
+    started = time.perf_counter()
+    inserted = 0
+    for start in range(1, total + 1, batch_size):
+        stop = min(start + batch_size - 1, total)
+        inserted += connection.execute(text(statement), dict(
+            params or {}, start=start, stop=stop)).rowcount
+        connection.commit()
+        elapsed = time.perf_counter() - started
+        print('{:<8} {:>10} / {:<10} {:>9.0f} rows/s {:>10} inserted'.format(
+            label, stop, total, stop / elapsed if elapsed else 0, inserted))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--venues', type=int, default=10000)
+    parser.add_argument('--artists', type=int, default=100000)
+    parser.add_argument('--shows', type=int, default=5000000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=500000)
+    parser.add_argument('--yes', action='store_true',
+                        help='do not ask before emptying the tables')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if not args.yes and input(
+                'This deletes every venue, artist and show in {}. '
+                'Continue? [y/N] '.format(db.engine.url)).lower() != 'y':
+            sys.exit(1)
+        with db.engine.connect() as connection:
+            connection.execute(text(
+                'TRUNCATE "Show", "ShowSeries", "Venue", "Artist" '
+                'RESTART IDENTITY'))
+            # setseed takes a value in [-1, 1]
+            connection.execute(text('SELECT setseed(:seed)'),
+                               {'seed': (args.seed % 1000) / 1000})
+            connection.commit()
+
+            params = {'genres': GENRES,
+                      'cities': [city for city, state in CITIES],
+                      'states': [state for city, state in CITIES]}
+            fill(connection, 'venues', VENUES, args.venues, args.batch_size,
+                 params)
+            fill(connection, 'artists', ARTISTS, args.artists,
+                 args.batch_size, params)
+            fill(connection, 'shows', SHOWS, args.shows, args.batch_size,
+                 {'venues': args.venues, 'artists': args.artists})
+
+            repair(connection, now=datetime.now())
+            facets.repair(connection)
+            bump_table_versions(connection, ('Venue', 'Artist', 'Show'))
+            connection.commit()
+            for table in ('Venue', 'Artist', 'Show'):
+                connection.execute(text('ANALYZE "{}"'.format(table)))
+            connection.commit()
+
+
+if __name__ == '__main__':
+    main()
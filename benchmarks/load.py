@@ -0,0 +1,330 @@
+'''
+Load test of every route.
+
+Drives a running server with --concurrency workers for --duration
+seconds. Each worker keeps its own keep-alive connection and picks
+routes at random by weight: listings, detail pages, "load more" show
+cards, searches, the create/edit forms and the JSON API, plus show and
+artist creation with --writes (which adds rows to the database). Ids
+are sampled from the server's own /api/v1 collections; run
+benchmarks/generate.py first for production-sized data. Venue and
+artist deletion is never exercised.
+
+Prints the p50, p95 and p99 latency and the throughput per route and
+overall. --json writes the same figures to a file; --baseline compares
+them with an earlier --json file and exits non-zero when a route's p95
+(on routes with enough requests to tell) or the overall throughput is
+worse by more than --tolerance.
+
+    python benchmarks/load.py [--url http://localhost:5000]
+                              [--concurrency 8] [--duration 30]
+                              [--writes] [--seed 42] [--json FILE]
+                              [--baseline FILE] [--tolerance 0.2]
+'''
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pagination import encode_cursor  # noqa: E402
+
+SEARCH_TERMS = ['jazz', 'rock', 'new york', 'venue 1', 'artist 12',
+                'austin', 'blues', 'nashvile']
+
+# routes with fewer requests than this are too noisy to compare
+MIN_SAMPLES = 30
+
+CSRF_TOKEN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+
+class Client(object):
+    '''
+    Client
+        one worker's keep-alive connection, with its session cookie.
+    '''
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.netloc
+        self.https = parts.scheme == 'https'
+        self.connection = None
+        self.cookies = SimpleCookie()
+
+    def request(self, method, path, form=None):
+        headers = {}
+        body = None
+        if form is not None:
+            body = urlencode(form, doseq=True)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(
+                '{}={}'.format(key, morsel.value)
+                for key, morsel in self.cookies.items())
+        for attempt in (1, 2):
+            if self.connection is None:
+                connection_class = http.client.HTTPSConnection \
+                    if self.https else http.client.HTTPConnection
+                self.connection = connection_class(self.host, timeout=60)
+            try:
+                self.connection.request(method, path, body, headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # the server closed an idle keep-alive connection
+                self.connection.close()
+                self.connection = None
+                if attempt == 2:
+                    raise
+        for header in response.headers.get_all('Set-Cookie') or ():
+            self.cookies.load(header)
+        if response.headers.get('Connection', '').lower() == 'close' or \
+                response.version == 10:
+            self.connection.close()
+            self.connection = None
+        return response.status, data
+
+    def csrf_token(self, form_path):
+        status, data = self.request('GET', form_path)
+        match = CSRF_TOKEN.search(data.decode('utf-8', 'replace'))
+        return match.group(1) if match else ''
+
+
+def sample_ids(client, collection, size=5000):
+    status, data = client.request(
+        'GET', '/api/v1/{}?fields=id&limit={}'.format(collection, size))
+    if status != 200:
+        sys.exit('could not list {}: HTTP {}'.format(collection, status))
+    ids = [row['id'] for row in json.loads(data)['data']]
+    if not ids:
+        sys.exit('no {} to load test; run benchmarks/generate.py'.format(
+            collection))
+    return ids
+
+
+def routes(venue_ids, artist_ids, writes, only=None):
+    '''
+    routes(venue_ids, artist_ids, writes, only)
+        (name, weight, request) triples, restricted to the names in
+        `only` if given; request(client, rng) issues one request and
+        returns its status.
+    '''
+    def get(path):
+        return lambda client, rng: client.request('GET', path(rng))[0]
+
+    def search(kind):
+        def request(client, rng):
+            return client.request('POST', '/{}/search'.format(kind), {
+                'search_term': rng.choice(SEARCH_TERMS)})[0]
+        return request
+
+    def venue(rng):
+        return rng.choice(venue_ids)
+
+    def artist(rng):
+        return rng.choice(artist_ids)
+
+    def cards(kind, pick):
+        # a "load more" page starting from now, in either direction
+        def path(rng):
+            return '/{}/{}/shows?when={}&cursor={}'.format(
+                kind, pick(rng), rng.choice(('upcoming', 'past')),
+                encode_cursor(datetime.now().replace(microsecond=0), 0))
+        return get(path)
+
+    def create_show(client, rng):
+        start = datetime.now() + timedelta(days=rng.randint(1, 365))
+        return client.request('POST', '/shows/create', {
+            'csrf_token': client.csrf_token('/shows/create'),
+            'venue_id': venue(rng), 'artist_id': artist(rng),
+            'start_time': start.strftime('%Y-%m-%d %H:%M:%S')})[0]
+
+    def create_artist(client, rng):
+        return client.request('POST', '/artists/create', {
+            'csrf_token': client.csrf_token('/artists/create'),
+            'name': 'Load test artist {}'.format(rng.getrandbits(64)),
+            'city': 'Austin', 'state': 'TX', 'phone': '555-0100',
+            'genres': ['Jazz'],
+            'facebook_link': 'https://www.facebook.com/loadtest',
+            'image_link': 'https://images.example.com/loadtest.jpg'})[0]
+
+    table = [
+        ('index', 2, get(lambda rng: '/')),
+        ('venues', 8, get(lambda rng: '/venues')),
+        ('artists', 8, get(lambda rng: '/artists')),
+        ('shows', 8, get(lambda rng: '/shows')),
+        ('venue', 15, get(lambda rng: '/venues/{}'.format(venue(rng)))),
+        ('artist', 15, get(lambda rng: '/artists/{}'.format(artist(rng)))),
+        ('venue_shows', 4, cards('venues', venue)),
+        ('artist_shows', 4, cards('artists', artist)),
+        ('search_venues', 6, search('venues')),
+        ('search_artists', 6, search('artists')),
+        ('venue_form', 1, get(lambda rng: '/venues/create')),
+        ('artist_form', 1, get(lambda rng: '/artists/create')),
+        ('show_form', 1, get(lambda rng: '/shows/create')),
+        ('edit_venue_form', 1, get(
+            lambda rng: '/venues/{}/edit'.format(venue(rng)))),
+        ('edit_artist_form', 1, get(
+            lambda rng: '/artists/{}/edit'.format(artist(rng)))),
+        ('api_venue', 4, get(
+            lambda rng: '/api/v1/venues/{}'.format(venue(rng)))),
+        ('api_artist', 4, get(
+            lambda rng: '/api/v1/artists/{}'.format(artist(rng)))),
+        ('api_venue_search', 2, get(
+            lambda rng: '/api/v1/venues/search?q={}'.format(
+                rng.choice(SEARCH_TERMS).replace(' ', '+')))),
+        ('api_shows', 1, get(lambda rng: '/api/v1/shows?limit=1000')),
+    ]
+    if writes:
+        table.extend([
+            ('create_show', 2, create_show),
+            ('create_artist', 1, create_artist),
+        ])
+    if only:
+        table = [route for route in table if route[0] in only]
+    return table
+
+
+def percentile(timings, fraction):
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+def summarize(timings, errors, elapsed):
+    timings = sorted(timings)
+    if not timings:
+        return None
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'p50': percentile(timings, 0.50),
+        'p95': percentile(timings, 0.95),
+        'p99': percentile(timings, 0.99),
+        'rps': len(timings) / elapsed,
+    }
+
+
+def run(url, concurrency, duration, writes, seed, only=None):
+    client = Client(url)
+    table = routes(sample_ids(client, 'venues'),
+                   sample_ids(client, 'artists'), writes, only)
+    names = [name for name, weight, request in table]
+    weights = [weight for name, weight, request in table]
+    requests = {name: request for name, weight, request in table}
+    timings = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(number):
+        rng = random.Random(seed * 1000 + number)
+        client = Client(url)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                status = requests[name](client, rng)
+            except Exception:
+                status = None
+            took = (time.perf_counter() - started) * 1000
+            with lock:
+                timings[name].append(took)
+                if status is None or status >= 400:
+                    errors[name] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(number,))
+               for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    results = {}
+    for name in names:
+        summary = summarize(timings[name], errors[name], elapsed)
+        if summary:
+            results[name] = summary
+    results['total'] = summarize(
+        [took for name in names for took in timings[name]],
+        sum(errors.values()), elapsed)
+    return results
+
+
+def report(results, baseline=None):
+    print('{:<18} {:>8} {:>6} {:>9} {:>9} {:>9} {:>9}{}'.format(
+        'route', 'requests', 'errors', 'p50 ms', 'p95 ms', 'p99 ms',
+        'req/s', '  p95 vs baseline' if baseline else ''))
+    for name, result in results.items():
+        line = '{:<18} {requests:>8} {errors:>6} {p50:>9.1f} {p95:>9.1f} ' \
+               '{p99:>9.1f} {rps:>9.1f}'.format(name, **result)
+        if baseline and name in baseline:
+            line += '  {:>+8.0%}'.format(
+                result['p95'] / baseline[name]['p95'] - 1)
+        print(line)
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if name == 'total' or not before or \
+                min(result['requests'], before['requests']) < MIN_SAMPLES:
+            continue
+        if result['p95'] > before['p95'] * (1 + tolerance):
+            found.append('{}: p95 {:.1f} ms, baseline {:.1f} ms'.format(
+                name, result['p95'], before['p95']))
+    total, before = results['total'], baseline.get('total')
+    if before and total['rps'] < before['rps'] * (1 - tolerance):
+        found.append('throughput {:.1f} req/s, baseline {:.1f} req/s'.format(
+            total['rps'], before['rps']))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--writes', action='store_true')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='compare with this --json file')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = run(args.url.rstrip('/'), args.concurrency, args.duration,
+                  args.writes, args.seed)
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline) as baseline_file:
+                baseline = json.load(baseline_file)
+        except FileNotFoundError:
+            print('No baseline at {}; not comparing.'.format(args.baseline))
+    report(results, baseline)
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
+
+    if baseline:
+        found = regressions(results, baseline, args.tolerance)
+        if found:
+            print('\nSlower than the baseline by more than {:.0%}:'.format(
+                args.tolerance))
+            for regression in found:
+                print('  ' + regression)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+'''
+Search latency benchmark.
+
+Grows Venue and Artist step by step (1k -> 1M rows by default) and times
+venue_search / artist_search at each size, in the default and in the
+typo-tolerant mode. Everything runs in one transaction that is rolled
+back at the end, so the configured database is left as it was.
+
+With the trigram indexes of migration 9a4c1e6f2d83 the latency stays
+flat as the tables grow; without them it grows with the row count.
+
+    python benchmarks/search_latency.py [--sizes 1000,10000,100000,1000000]
+                                        [--repeat 20]
+'''
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+from app import app  # noqa: E402
+from model import db  # noqa: E402
+from search import venue_search, artist_search  # noqa: E402
+
+CITIES = ['San Francisco', 'New York', 'Chicago', 'Austin', 'Seattle',
+          'Nashville', 'New Orleans', 'Portland']
+GENRES = ['Jazz', 'Blues', 'Rock n Roll', 'Folk', 'Hip-Hop', 'Soul',
+          'Classical', 'Reggae']
+
+GROW = '''
+INSERT INTO "{table}" (name, city, state, {extra_columns} phone, genres)
+SELECT 'bench ' || substr(md5(g::text), 1, 10) || ' ' || g,
+       (:cities)[1 + g % {cities}], 'CA', {extra_values} '555-0100',
+       ARRAY[(:genres)[1 + g % {genres}]]::varchar[]
+FROM generate_series(:start, :stop) AS g
+'''
+
+# (term, fuzzy) pairs timed at every size
+SEARCHES = [
+    ('Musical Hop', False),
+    ('jazz', False),
+    ('new orleans', False),
+    ('musicla hop', True),
+]
+
+
+def grow(start, stop):
+    for table, extra_columns, extra_values in (
+            ('Venue', 'address,', "'1 Bench St',"),
+            ('Artist', '', '')):
+        db.session.execute(text(GROW.format(
+            table=table, extra_columns=extra_columns,
+            extra_values=extra_values, cities=len(CITIES),
+            genres=len(GENRES))), {
+            'cities': CITIES, 'genres': GENRES,
+            'start': start, 'stop': stop})
+    db.session.execute(text('ANALYZE "Venue"'))
+    db.session.execute(text('ANALYZE "Artist"'))
+
+
+def time_search(search, term, fuzzy, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        search(term, fuzzy=fuzzy, limit=50)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    print('{:>9}  {:<8} {:<14} {:>5}  {:>9} {:>9}'.format(
+        'rows', 'table', 'term', 'fuzzy', 'p50 ms', 'p95 ms'))
+    with app.app_context():
+        try:
+            grown = 0
+            for size in sizes:
+                grow(grown + 1, size)
+                grown = size
+                for label, search in (('venue', venue_search),
+                                      ('artist', artist_search)):
+                    for term, fuzzy in SEARCHES:
+                        p50, p95 = time_search(search, term, fuzzy,
+                                               args.repeat)
+                        print('{:>9}  {:<8} {:<14} {:>5}  {:>9.2f} {:>9.2f}'
+                              .format(size, label, term, str(fuzzy), p50,
+                                      p95))
+        finally:
+            db.session.rollback()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+'''
+Cold start benchmark.
+
+Measures what a freshly started worker costs before it is useful: the
+time to import the app, and the latency of the first request to each
+route. Every measurement runs in a new process, so each route pays its
+own first-hit costs (template compilation, mapper configuration, the
+first database connection). Runs with an empty Jinja bytecode cache and
+again with one filled by `flask templates warm` (see templating.py),
+and prints the median of --runs samples side by side.
+
+The requests go through the app's test client with the page cache off,
+so no server is needed; the database needs at least one venue and
+artist (benchmarks/generate.py).
+
+    python benchmarks/startup.py [--runs 5] [--json FILE]
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ROUTES = [
+    ('index', 'GET', '/'),
+    ('venues', 'GET', '/venues'),
+    ('artists', 'GET', '/artists'),
+    ('shows', 'GET', '/shows'),
+    ('venue', 'GET', '/venues/{venue}'),
+    ('artist', 'GET', '/artists/{artist}'),
+    ('search_venues', 'POST', '/venues/search'),
+    ('venue_form', 'GET', '/venues/create'),
+    ('show_form', 'GET', '/shows/create'),
+]
+
+
+def child(method, path):
+    # runs in the measured process: nothing of the app is imported yet
+    started = time.perf_counter()
+    from app import app
+    imported = time.perf_counter()
+    response = app.test_client().open(
+        path, method=method,
+        data={'search_term': 'a'} if method == 'POST' else None)
+    finished = time.perf_counter()
+    print(json.dumps({'import': (imported - started) * 1000,
+                      'first': (finished - imported) * 1000,
+                      'status': response.status_code}))
+
+
+def sample_ids():
+    from sqlalchemy import text
+    from app import app
+    from model import db
+    with app.app_context():
+        venue, artist = db.session.execute(text(
+            'SELECT (SELECT min(id) FROM "Venue"), '
+            '(SELECT min(id) FROM "Artist")')).one()
+    if venue is None or artist is None:
+        sys.exit('no venues or artists; run benchmarks/generate.py')
+    return {'venue': venue, 'artist': artist}
+
+
+def measure(method, path, cache_dir):
+    environment = dict(os.environ, PAGE_CACHE_BACKEND='',
+                       JINJA_BYTECODE_CACHE_DIR=cache_dir)
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', method, path],
+        cwd=ROOT, env=environment, check=True, capture_output=True,
+        text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    if result['status'] >= 400:
+        sys.exit('{} {} returned HTTP {}'.format(method, path,
+                                                 result['status']))
+    return result
+
+
+def run(runs):
+    ids = sample_ids()
+    results = {}
+    with tempfile.TemporaryDirectory() as warm_dir:
+        subprocess.run(['flask', 'templates', 'warm'], cwd=ROOT, check=True,
+                       env=dict(os.environ, FLASK_APP='app.py',
+                                JINJA_BYTECODE_CACHE_DIR=warm_dir))
+        for name, method, path in ROUTES:
+            path = path.format(**ids)
+            samples = {'cold': [], 'warm': []}
+            for number in range(runs):
+                with tempfile.TemporaryDirectory() as cold_dir:
+                    samples['cold'].append(measure(method, path, cold_dir))
+                samples['warm'].append(measure(method, path, warm_dir))
+            results[name] = {
+                mode: {
+                    'import': statistics.median(
+                        sample['import'] for sample in mode_samples),
+                    'first': statistics.median(
+                        sample['first'] for sample in mode_samples),
+                } for mode, mode_samples in samples.items()}
+    return results
+
+
+def report(results):
+    print('{:<14} {:>10} {:>14} {:>14}'.format(
+        'route', 'import ms', 'first ms cold', 'first ms warm'))
+    for name, result in results.items():
+        print('{:<14} {:>10.0f} {:>14.1f} {:>14.1f}'.format(
+            name, result['cold']['import'], result['cold']['first'],
+            result['warm']['first']))
+    imports = [result[mode]['import'] for result in results.values()
+               for mode in ('cold', 'warm')]
+    print('\nmedian import {:.0f} ms'.format(statistics.median(imports)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--child', nargs=2, metavar=('METHOD', 'PATH'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(*args.child)
+    results = run(args.runs)
+    report(results)
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
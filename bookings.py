@@ -0,0 +1,153 @@
+from datetime import timedelta
+from sqlalchemy import DateTime, column, func, literal, select, union_all, \
+    values
+from sqlalchemy.exc import IntegrityError
+from model import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Bookings.
+#----------------------------------------------------------------------------#
+# A show books its venue and its artist for [start_time, end_time). The
+# database refuses overlapping bookings: Show carries a GiST exclusion
+# constraint per side (see model.py), so a conflicting INSERT or UPDATE
+# fails with an IntegrityError naming the constraint, whatever wrote it
+# and however long the history. The check is one index probe.
+#
+# booking_conflict turns such an error into a BookingConflict naming
+# the show in the way, looked up through the same index. find_conflicts
+# checks many times at once, for a series of shows (series.py).
+
+# Minutes a show runs when its form or import row gives no duration.
+DEFAULT_DURATION = 120
+
+CONSTRAINTS = {'ex_Show_venue_booking': Venue,
+               'ex_Show_artist_booking': Artist}
+
+
+class BookingConflict(Exception):
+    '''
+    BookingConflict
+        the venue or artist of a show is already booked for an
+        overlapping one, `show` (see find_conflict) when known.
+    '''
+    def __init__(self, entity, show):
+        self.entity = entity
+        self.show = show
+        super(BookingConflict, self).__init__(self.message())
+
+    def message(self):
+        show = self.show
+        if show is None:
+            return 'The {} is already booked at that time.'.format(
+                self.entity.__tablename__.lower())
+        when = '{:%Y-%m-%d %H:%M} to {:%H:%M}'.format(show.start_time,
+                                                     show.end_time)
+        if self.entity is Venue:
+            return '{} is already booked from {} for {}.'.format(
+                show.venue_name, when, show.artist_name)
+        return '{} is already booked from {} at {}.'.format(
+            show.artist_name, when, show.venue_name)
+
+
+def end_time(start_time, duration=None):
+    '''
+    end_time(start_time, duration)
+        the end of a show starting at `start_time` and running for
+        `duration` minutes, DEFAULT_DURATION if not given.
+    '''
+    return start_time + timedelta(minutes=duration or DEFAULT_DURATION)
+
+
+def _one_value_range(value):
+    return func.int4range(value, value, literal('[]'))
+
+
+def find_conflict(entity, entity_id, start_time, end_time, session=None):
+    '''
+    find_conflict(entity, entity_id, start_time, end_time)
+        the first show booking the Venue or Artist `entity_id` during
+        [start_time, end_time), with its venue_name and artist_name, or
+        None. Queries with the constraint's expressions, so its GiST
+        index answers.
+    '''
+    fk = Show.venue if entity is Venue else Show.artist
+    return (session or db.session).query(
+        Show.id, Show.start_time, Show.end_time,
+        Venue.name.label('venue_name'), Artist.name.label('artist_name')
+    ).join(Venue, Venue.id == Show.venue).join(
+        Artist, Artist.id == Show.artist
+    ).filter(
+        fk.isnot(None),
+        _one_value_range(fk).op('&&')(_one_value_range(entity_id)),
+        func.tsrange(Show.start_time, Show.end_time).op('&&')(
+            func.tsrange(start_time, end_time))
+    ).order_by(Show.start_time).first()
+
+
+def find_conflicts(venue_id, artist_id, slots, series_id=None,
+                   session=None):
+    '''
+    find_conflicts(venue_id, artist_id, slots, series_id)
+        a BookingConflict per show booking the venue `venue_id` or the
+        artist `artist_id` during any of `slots`, (start_time, end_time)
+        pairs, leaving out the shows of ShowSeries `series_id`. One
+        query, probing the constraints' indexes once per slot and side.
+    '''
+    if not slots:
+        return []
+    slots = values(column('start_time', DateTime),
+                   column('end_time', DateTime), name='slots').data(slots)
+    sides = []
+    for entity, fk, entity_id in ((Venue, Show.venue, venue_id),
+                                  (Artist, Show.artist, artist_id)):
+        if entity_id is None:
+            continue
+        side = select(
+            literal(entity.__tablename__).label('kind'), Show.start_time,
+            Show.end_time, Show.venue, Show.artist
+        ).select_from(slots).join(Show, fk.isnot(None) & _one_value_range(
+            fk).op('&&')(_one_value_range(entity_id)) & func.tsrange(
+            Show.start_time, Show.end_time).op('&&')(
+            func.tsrange(slots.c.start_time, slots.c.end_time)))
+        if series_id is not None:
+            side = side.where(Show.series.is_distinct_from(series_id))
+        sides.append(side)
+    clashes = union_all(*sides).subquery()
+    rows = (session or db.session).execute(select(
+        clashes.c.kind, clashes.c.start_time, clashes.c.end_time,
+        Venue.name.label('venue_name'), Artist.name.label('artist_name')
+    ).join(Venue, Venue.id == clashes.c.venue).join(
+        Artist, Artist.id == clashes.c.artist
+    ).order_by(clashes.c.start_time, clashes.c.kind)).all()
+    return [BookingConflict(Venue if row.kind == 'Venue' else Artist, row)
+            for row in rows]
+
+
+def booked_entity(error):
+    '''
+    booked_entity(error)
+        Venue or Artist when IntegrityError `error` is a booking conflict
+        on that side, else None.
+    '''
+    if not isinstance(error, IntegrityError):
+        return None
+    diagnostics = getattr(error.orig, 'diag', None)
+    return CONSTRAINTS.get(getattr(diagnostics, 'constraint_name', None))
+
+
+def booking_conflict(error, venue_id, artist_id, start_time, end_time,
+                     session=None):
+    '''
+    booking_conflict(error, venue_id, artist_id, start_time, end_time)
+        the BookingConflict behind IntegrityError `error`, raised for a
+        show of `venue_id` and `artist_id` during [start_time, end_time),
+        or None when `error` is not a booking conflict. Call it after
+        rolling back.
+    '''
+    entity = booked_entity(error)
+    if entity is None:
+        return None
+    entity_id = venue_id if entity is Venue else artist_id
+    # None when the other show has gone again since
+    show = find_conflict(entity, entity_id, start_time, end_time, session)
+    return BookingConflict(entity, show)
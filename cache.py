@@ -0,0 +1,267 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, g, session
+from model import db, Show
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+# Rendered venue and artist pages keyed by entity id ("venue:<id>",
+# "artist:<id>"). Entries are evicted least recently used once the
+# backend goes over PAGE_CACHE_MAX_BYTES, expire when their first
+# upcoming show starts (the page would then list it as past), and are
+# deleted by the write controllers for exactly the pages a write changes.
+#
+# An entry also records the ETag of the page it holds (conditional.py)
+# and is only served under that ETag. A write made by another worker, or
+# by `flask import` in its own process, changes the ETag, so the stale
+# entry is skipped even where that writer could not delete it.
+#
+# PAGE_CACHE_BACKEND selects the store:
+#   'sqlite' - a SQLite file at PAGE_CACHE_PATH shared by the workers of
+#              one host (the default)
+#   'memory' - per process, for a single worker
+#   None     - caching off
+
+
+class MemoryBackend(object):
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.time():
+                self._delete(key)
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires=None):
+        with self.lock:
+            self._delete(key)
+            if len(value) > self.max_bytes:
+                return
+            self.entries[key] = (value, expires)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                self._delete(next(iter(self.entries)))
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self._delete(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _delete(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+
+class SqliteBackend(object):
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS pages ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+                'size INTEGER NOT NULL, expires REAL, accessed REAL NOT NULL)')
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS pages_accessed ON pages(accessed)')
+
+    def _connect(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+        return connection
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as connection:
+            row = connection.execute(
+                'SELECT value, expires FROM pages WHERE key = ?',
+                (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] <= now:
+                connection.execute('DELETE FROM pages WHERE key = ?', (key,))
+                return None
+            connection.execute('UPDATE pages SET accessed = ? WHERE key = ?',
+                               (now, key))
+            return bytes(row[0])
+
+    def set(self, key, value, expires=None):
+        if len(value) > self.max_bytes:
+            self.delete(key)
+            return
+        with self._connect() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)',
+                (key, value, len(value), expires, time.time()))
+            total = connection.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+            if total > self.max_bytes:
+                evicted = []
+                for old_key, size in connection.execute(
+                        'SELECT key, size FROM pages ORDER BY accessed'):
+                    if total <= self.max_bytes:
+                        break
+                    evicted.append((old_key,))
+                    total -= size
+                connection.executemany('DELETE FROM pages WHERE key = ?',
+                                       evicted)
+
+    def delete(self, *keys):
+        with self._connect() as connection:
+            connection.executemany('DELETE FROM pages WHERE key = ?',
+                                   [(key,) for key in keys])
+
+    def clear(self):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM pages')
+
+
+class PageCache(object):
+    '''
+    PageCache
+        binds a cache backend to a flask application, following the
+        init_app pattern of the other extensions.
+    '''
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('PAGE_CACHE_BACKEND')
+        max_bytes = app.config.get('PAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+        if backend == 'memory':
+            self.backend = MemoryBackend(max_bytes)
+        elif backend == 'sqlite':
+            path = app.config.get('PAGE_CACHE_PATH') or \
+                os.path.join(app.instance_path, 'page_cache.sqlite3')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.backend = SqliteBackend(path, max_bytes)
+        elif backend:
+            raise ValueError('Unknown PAGE_CACHE_BACKEND ' + repr(backend))
+        else:
+            self.backend = None
+
+    def cached(self, key_format):
+        '''
+        cached(key_format)
+            decorates a view whose page is cached under
+            key_format.format(**view_args), versioned by the ETag that
+            @conditional, applied above it, computed for the request.
+            The view may set g.page_cache_expires (a datetime) to bound
+            the entry's life. Pages are neither served from nor stored
+            in the cache while the session holds flashed messages, which
+            the layout renders.
+        '''
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                key = key_format.format(**kwargs)
+                validators = g.get('validators')
+                version = validators and validators[0]
+                body = self.get(key, version)
+                if body is not None:
+                    return Response(body, mimetype='text/html')
+
+                g.page_cache_expires = None
+                response = view(*args, **kwargs)
+                if isinstance(response, str):
+                    self.set(key, response, g.page_cache_expires, version)
+                return response
+            return wrapper
+        return decorator
+
+    def get(self, key, version=None):
+        '''
+        get(key, version)
+            the page body cached under `key` for `version`, or None.
+        '''
+        if self.backend is None or session.get('_flashes'):
+            return None
+        value = self.backend.get(key)
+        if value is None:
+            return None
+        # entries are stored as b'<version>\n<body>'
+        stored, _, body = value.partition(b'\n')
+        if stored.decode('utf-8') != (version or ''):
+            return None
+        return body
+
+    def set(self, key, page, expires=None, version=None):
+        '''
+        set(key, page, expires, version)
+            caches the rendered `page` (a str) of `version` under `key`
+            until `expires` (a datetime), if given.
+        '''
+        if self.backend is None or session.get('_flashes'):
+            return
+        self.backend.set(key, (version or '').encode('utf-8') + b'\n' +
+                         page.encode('utf-8'),
+                         expires and expires.timestamp())
+
+    def delete(self, *keys):
+        if self.backend is not None and keys:
+            self.backend.delete(*keys)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+
+page_cache = PageCache()
+
+# Cache keys
+# ----------------------------------------------------------------
+# A venue page lists the artists of its shows (name, image) and an artist
+# page the venues, so editing or deleting one also invalidates the pages
+# of everything it has shows with.
+
+
+def venue_key(venue_id):
+    return 'venue:{}'.format(venue_id)
+
+
+def artist_key(artist_id):
+    return 'artist:{}'.format(artist_id)
+
+
+def venue_page_keys(venue_id):
+    artist_ids = db.session.query(Show.artist).filter(
+        Show.venue == venue_id).distinct()
+    return [venue_key(venue_id)] + \
+        [artist_key(artist_id) for artist_id, in artist_ids]
+
+
+def artist_page_keys(artist_id):
+    venue_ids = db.session.query(Show.venue).filter(
+        Show.artist == artist_id).distinct()
+    return [artist_key(artist_id)] + \
+        [venue_key(venue_id) for venue_id, in venue_ids]
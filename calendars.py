@@ -0,0 +1,141 @@
+from datetime import datetime, timezone
+from flask import Blueprint, Response, abort, current_app, request
+from routing import read_engine
+from conditional import conditional, venue_validators, artist_validators
+from model import db, Venue, Artist
+from queries import show_events, stream_rows
+
+#----------------------------------------------------------------------------#
+# Time windows and calendar feeds.
+#----------------------------------------------------------------------------#
+# /shows, /api/v1/shows and the feeds take ?from=...&to=..., ISO dates or
+# times, and keep the shows starting in [from, to); the (start_time, id)
+# indexes on Show serve the range.
+#
+# /venues/<id>/shows.ics and /artists/<id>/shows.ics are iCalendar
+# (RFC 5545) feeds of a venue's or artist's shows. Events are read from
+# a server-side cursor in batches and written out as they are read, so a
+# feed of years of shows never sits in memory. Clients may reuse a feed
+# for ICAL_MAX_AGE seconds, then revalidate it with its ETag.
+
+calendars = Blueprint('calendars', __name__)
+
+PRODID = '-//Fyyur//Shows//EN'
+
+
+class InvalidWindow(ValueError):
+    pass
+
+
+def parse_time_window(args):
+    '''
+    parse_time_window(args)
+        {"start", "end"} from the from and to values of `args`, leaving
+        out those not given. Times with an offset are converted to the
+        naive local times shows are stored in.
+    '''
+    window = {}
+    for name, key in (('from', 'start'), ('to', 'end')):
+        if args.get(name):
+            try:
+                value = datetime.fromisoformat(args[name])
+            except ValueError:
+                raise InvalidWindow('{} must be an ISO date or time'
+                                    .format(name))
+            if value.tzinfo is not None:
+                value = value.astimezone().replace(tzinfo=None)
+            window[key] = value
+    return window
+
+
+# iCalendar
+# ----------------------------------------------------------------
+
+
+def _text(value):
+    # TEXT escaping (RFC 5545 3.3.11)
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;') \
+        .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def _utc(value, local=False):
+    # start times are naive local times, updated_at naive UTC
+    value = value.astimezone(timezone.utc) if local else value
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def _line(name, value):
+    # content lines are folded at 75 octets (RFC 5545 3.1)
+    line = '{}:{}'.format(name, value).encode('utf-8')
+    folded = []
+    while len(line) > 75:
+        cut = 75 if not folded else 74
+        # never split a UTF-8 sequence
+        while line[cut] & 0xC0 == 0x80:
+            cut -= 1
+        folded.append(line[:cut])
+        line = line[cut:]
+    folded.append(line)
+    return b'\r\n '.join(folded).decode('utf-8') + '\r\n'
+
+
+def ical_events(rows, name, domain):
+    '''
+    ical_events(rows, name, domain)
+        yields the iCalendar text of a calendar `name` holding one event
+        per show in `rows` (see queries.show_events), in chunks.
+    '''
+    yield (_line('BEGIN', 'VCALENDAR') + _line('VERSION', '2.0') +
+           _line('PRODID', PRODID) + _line('CALSCALE', 'GREGORIAN') +
+           _line('X-WR-CALNAME', _text(name)))
+    chunk = []
+    for row in rows:
+        location = ', '.join(part for part in (
+            row['venue_name'], row['address'], row['city'], row['state'])
+            if part)
+        chunk.append(
+            _line('BEGIN', 'VEVENT') +
+            _line('UID', 'show-{}@{}'.format(row['id'], domain)) +
+            _line('DTSTAMP', _utc(row['updated_at'])) +
+            _line('DTSTART', _utc(row['start_time'], local=True)) +
+            _line('DTEND', _utc(row['end_time'], local=True)) +
+            _line('SUMMARY', _text('{} at {}'.format(
+                row['artist_name'], row['venue_name']))) +
+            _line('LOCATION', _text(location)) +
+            _line('END', 'VEVENT'))
+        if len(chunk) == 500:
+            yield ''.join(chunk)
+            chunk = []
+    yield ''.join(chunk) + _line('END', 'VCALENDAR')
+
+
+def calendar_feed(entity, entity_id):
+    name = db.session.query(entity.name).filter(
+        entity.id == entity_id).scalar()
+    if name is None:
+        abort(404)
+    try:
+        window = parse_time_window(request.args)
+    except InvalidWindow:
+        abort(400)
+    rows = stream_rows(read_engine(), show_events(entity, entity_id,
+                                                  **window),
+                       current_app.config['API_BATCH_SIZE'])
+    response = Response(ical_events(rows, name, request.host),
+                        mimetype='text/calendar')
+    response.headers['Content-Disposition'] = \
+        'inline; filename={}-{}.ics'.format(entity.__tablename__.lower(),
+                                            entity_id)
+    return response
+
+
+@calendars.route('/venues/<int:venue_id>/shows.ics')
+@conditional(venue_validators, max_age='ICAL_MAX_AGE')
+def venue_calendar(venue_id):
+    return calendar_feed(Venue, venue_id)
+
+
+@calendars.route('/artists/<int:artist_id>/shows.ics')
+@conditional(artist_validators, max_age='ICAL_MAX_AGE')
+def artist_calendar(artist_id):
+    return calendar_feed(Artist, artist_id)
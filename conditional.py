@@ -0,0 +1,154 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+from flask import Response, current_app, g, make_response, request, \
+    session
+from sqlalchemy import true
+from model import db, Venue, Artist, Show, TableVersion
+from counters import counted_at, started_since_counted
+
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+# Read routes derive a strong ETag and a Last-Modified from a validator
+# query that is much cheaper than the page: a primary key lookup of the
+# updated_at and show counters of a detail page's own row (which
+# counters.py stamps for every write the page renders), or the
+# TableVersion counters for the listings.
+# When If-None-Match (or, without it, If-Modified-Since) matches, the
+# route answers 304 without running its queries or its template.
+#
+# Pages also change as time passes: a show that starts moves from the
+# upcoming to the past list of its detail pages (and from the upcoming to
+# the past count in the listings when the counters roll over, see
+# counters.py). The number and latest start of the shows started since
+# the counters' watermark, or the watermark itself for the listings, are
+# therefore part of the validators, and count as a modification time.
+
+
+def _utc(value, local=False):
+    if value is None:
+        return None
+    if local:
+        # start times are stored as naive local times
+        return value.astimezone(timezone.utc)
+    return value.replace(tzinfo=timezone.utc)
+
+
+def _validators(parts, modified):
+    modified = max(value for value in modified if value is not None)
+    digest = hashlib.sha1(repr((request.full_path, parts))
+                          .encode('utf-8')).hexdigest()
+    return digest, modified.replace(microsecond=0)
+
+
+def not_modified(validators):
+    '''
+    not_modified(validators)
+        whether the request's If-None-Match / If-Modified-Since match the
+        (etag, last_modified) `validators`.
+    '''
+    etag, last_modified = validators
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def set_validators(response, validators, max_age=None):
+    etag, last_modified = validators
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    if max_age is None:
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.max_age = max_age
+    return response
+
+
+def conditional(validate, max_age=None):
+    '''
+    conditional(validate, max_age)
+        decorates a GET view. validate(**view_args) returns the
+        (etag, last_modified) of the page, or None when it cannot tell
+        (the view then runs as usual, e.g. to answer 404). Validators
+        also accept a `session` to query, db.session by default.
+        Responses must be revalidated, or, given the config key
+        `max_age`, may be reused for that many seconds.
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # pages carrying flashed messages are one-offs
+            if session.get('_flashes'):
+                return view(*args, **kwargs)
+            validators = validate(**kwargs)
+            if validators is None:
+                return view(*args, **kwargs)
+            # the version of the page cache entry (see cache.py)
+            g.validators = validators
+
+            if not_modified(validators):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            return set_validators(
+                response, validators,
+                current_app.config[max_age] if max_age else None)
+        return wrapper
+    return decorator
+
+# Validators
+# ----------------------------------------------------------------
+
+
+def _detail_validators(entity, entity_fk, entity_id, session=None):
+    started = started_since_counted(entity_fk, entity_id, datetime.now())
+    row = (session or db.session).query(
+        entity.updated_at,
+        entity.upcoming_shows_count,
+        entity.past_shows_count,
+        started.c.started,
+        started.c.latest
+    ).join(started, true()).filter(entity.id == entity_id).first()
+    if row is None:
+        return None
+    return _validators(tuple(row), (_utc(row.updated_at),
+                                    _utc(row.latest, local=True)))
+
+
+def venue_validators(venue_id, session=None):
+    return _detail_validators(Venue, Show.venue, venue_id, session)
+
+
+def artist_validators(artist_id, session=None):
+    return _detail_validators(Artist, Show.artist, artist_id, session)
+
+
+def _listing_validators(tables, split_on_now, session=None):
+    session = session or db.session
+    versions = session.query(
+        TableVersion.table_name, TableVersion.version,
+        TableVersion.updated_at
+    ).filter(TableVersion.table_name.in_(tables)).all()
+    started = None
+    if split_on_now:
+        started = counted_at(session)
+    return _validators(
+        (sorted((row.table_name, row.version) for row in versions), started),
+        [_utc(row.updated_at) for row in versions] +
+        [_utc(started, local=True), datetime.fromtimestamp(0, timezone.utc)])
+
+
+def table_validators(*tables, split_on_now=False):
+    '''
+    table_validators(*tables, split_on_now)
+        returns a validator for a listing built from `tables`; with
+        `split_on_now`, for one that also counts upcoming shows.
+    '''
+    def validate(session=None, **view_args):
+        return _listing_validators(tables, split_on_now, session)
+    return validate
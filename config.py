@@ -1,5 +1,32 @@
 import os
-SECRET_KEY = os.urandom(32)
+
+# Cookie signing key, which every worker and node must share: the value
+# of FYYUR_SECRET_KEY, or the contents of the file FYYUR_SECRET_KEY_FILE.
+# Left unset, each process picks a random one (see sessions.py), which
+# only suits a single worker.
+def _secret_key():
+    if os.environ.get('FYYUR_SECRET_KEY'):
+        return os.environ['FYYUR_SECRET_KEY']
+    if os.environ.get('FYYUR_SECRET_KEY_FILE'):
+        with open(os.environ['FYYUR_SECRET_KEY_FILE']) as key_file:
+            return key_file.read().strip()
+    return None
+
+
+SECRET_KEY = _secret_key()
+
+# Deployment mode, for several workers or nodes: a missing SECRET_KEY
+# stops the app from starting, sessions default to the database and the
+# page cache is off.
+DEPLOYMENT = os.environ.get('FYYUR_DEPLOYMENT') == '1'
+
+# Server-side session store (see sessions.py): 'file' or 'sqlite' at
+# SESSION_PATH for the workers of one host, 'database' for every node,
+# None for signed cookie sessions.
+SESSION_BACKEND = os.environ.get(
+    'SESSION_BACKEND', 'database' if DEPLOYMENT else '') or None
+SESSION_PATH = os.environ.get('SESSION_PATH')
+
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -13,6 +40,77 @@ pg_pass = ""
 database_path = "postgresql://{}:{}@{}/{}".format(pg_user, pg_pass,'localhost:5432', database_name)
 
 
-# TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = database_path
-SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', database_path)
+
+# Connection pool, applied to the primary and every replica.
+SQLALCHEMY_ENGINE_OPTIONS = {
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+    'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+    'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+}
+
+# Read replicas (comma separated URLs): requests to the read-only pages
+# read from one of them, except for clients that wrote in the last
+# READ_YOUR_WRITES_SECONDS (see routing.py).
+SQLALCHEMY_BINDS = {
+    'replica_{}'.format(number): url
+    for number, url in enumerate(
+        url.strip() for url in
+        os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip())
+}
+READ_YOUR_WRITES_SECONDS = int(os.environ.get('READ_YOUR_WRITES_SECONDS', 5))
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+# Raise when a view issues more SQL statements than its query_budget
+# (always enforced when TESTING is set; otherwise only logged).
+QUERY_BUDGET_ENFORCE = False
+
+# Show cards rendered per past/upcoming list on venue and artist pages;
+# the rest are fetched page by page with "load more".
+SHOW_CARDS_LIMIT = 12
+
+# Rows per page on the venue, artist and show listings.
+LISTING_PAGE_SIZE = 50
+
+# Search: results per page, and whether an empty exact search retries
+# in the typo-tolerant (trigram similarity) mode.
+SEARCH_RESULT_LIMIT = 50
+SEARCH_TYPO_TOLERANT = True
+
+# Rendered venue/artist page cache (see cache.py): 'sqlite' for the
+# workers of a host sharing PAGE_CACHE_PATH, 'memory' for a single
+# worker, None to disable. Off by default in DEPLOYMENT, whose nodes
+# share no host; set it per node where that pays.
+PAGE_CACHE_BACKEND = os.environ.get(
+    'PAGE_CACHE_BACKEND', '' if DEPLOYMENT else 'sqlite') or None
+PAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+PAGE_CACHE_PATH = None
+
+# Rows fetched per server-side cursor batch by the streamed JSON API.
+API_BATCH_SIZE = 1000
+
+# Seconds calendar clients may reuse a venue or artist .ics feed before
+# revalidating it (see calendars.py).
+ICAL_MAX_AGE = int(os.environ.get('ICAL_MAX_AGE', 3600))
+
+# Shows one recurring series may hold (see series.py): two years of
+# weekly shows.
+SERIES_MAX_SHOWS = int(os.environ.get('SERIES_MAX_SHOWS', 104))
+
+# Bearer token for the admin endpoints (/admin/export); they 404 when unset.
+ADMIN_TOKEN = os.environ.get('FYYUR_ADMIN_TOKEN')
+
+# Per-request metrics served at /metrics (see metrics.py); the sample
+# rate is the fraction of requests whose timings are recorded.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', 1.0))
+
+# Rebuild the static asset bundles (see assets.py) when a source file
+# changes; otherwise they come from `flask assets build`.
+ASSETS_AUTO_BUILD = os.environ.get('ASSETS_AUTO_BUILD', '1' if DEBUG else '') == '1'
+
+# Compiled templates kept on disk for every worker of the host (see
+# templating.py); the directory defaults to jinja's per-user temp one.
+JINJA_BYTECODE_CACHE = os.environ.get('JINJA_BYTECODE_CACHE', '1') == '1'
+JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR')
@@ -0,0 +1,309 @@
+from collections import defaultdict
+from datetime import datetime
+import time
+import click
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, case, event, false, func, \
+    literal_column, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from model import db, Venue, Artist, Show, CounterWatermark
+from areas import adjust_area_shows, repair as repair_areas
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+# Venue and Artist carry upcoming_shows_count and past_shows_count so
+# listings and page headers never count Show rows. A show is counted as
+# upcoming while it starts after the CounterWatermark, and:
+#
+#   * every flush that adds, deletes or moves shows adjusts the counters
+#     of the venues and artists involved in the same transaction;
+#   * `flask counters rollover` moves the shows that started since the
+#     last run from upcoming to past and advances the watermark. It runs
+#     every minute, either from cron:
+#
+#         * * * * *  cd /srv/fyyur && FLASK_APP=app.py flask counters rollover
+#
+#     or as a long-running process, `flask counters rollover --every 60`
+#     (`fab rollover`), e.g. a Heroku worker dyno;
+#   * `flask counters repair` recounts everything against the watermark.
+#
+# Writers share-lock the watermark row and rollover/repair lock it
+# exclusively, so a show is never classified against a watermark that
+# moves before its transaction commits. The counters lag real time by
+# at most one rollover interval (or indefinitely if rollover stops). The
+# detail pages split their show lists on the clock, and correct their
+# header counts by the entity's shows that started between the watermark
+# and now (started_since_counted), so a page's counts always agree with
+# its lists. The listings and the upcoming shows of the area directory
+# (areas.py) follow the counters as they are.
+#
+# The same writes stamp updated_at on every venue and artist whose page
+# they change, including the ones whose shows merely moved or changed
+# length, and so do renames and new images of the venue or artist on the
+# other side of a show card. A detail page's ETag (conditional.py) is
+# then read from its own row alone.
+
+counters_cli = AppGroup('counters', help='Maintain the show counters.')
+
+WATERMARK = 'shows'
+
+
+def _watermark(connection, exclusive=False):
+    connection.execute(insert(CounterWatermark.__table__).values(
+        name=WATERMARK, counted_at=None).on_conflict_do_nothing())
+    query = select(CounterWatermark.counted_at).where(
+        CounterWatermark.name == WATERMARK)
+    return connection.execute(
+        query.with_for_update(read=not exclusive)).scalar()
+
+
+def counted_until():
+    '''
+    counted_until()
+        the watermark as a SQL expression: shows starting after it are
+        counted as upcoming, and before any rollover all of them are.
+    '''
+    return func.coalesce(
+        select(CounterWatermark.counted_at).where(
+            CounterWatermark.name == WATERMARK).scalar_subquery(),
+        literal_column("'-infinity'::timestamp"))
+
+
+def started_since_counted(entity_fk, entity_id, now):
+    '''
+    started_since_counted(entity_fk, entity_id, now)
+        a one row subquery of the entity's shows the counters have not
+        caught up with at `now`: `started`, the number of them that
+        started after the watermark (less any counted as past that start
+        after `now`), to move from the upcoming to the past count, and
+        `latest`, the start of the last of them.
+    '''
+    watermark = counted_until()
+    return select(
+        func.coalesce(func.sum(case((Show.start_time <= now, 1),
+                                    else_=-1)), 0).label('started'),
+        func.max(Show.start_time).filter(
+            Show.start_time <= now).label('latest')
+    ).where(
+        entity_fk == entity_id,
+        Show.start_time > func.least(watermark, now),
+        Show.start_time <= func.greatest(watermark, now)
+    ).subquery()
+
+
+def counted_at(session):
+    '''
+    counted_at(session)
+        the watermark, or None before the first rollover.
+    '''
+    return session.query(CounterWatermark.counted_at).filter(
+        CounterWatermark.name == WATERMARK).scalar()
+
+
+def adjust_show_counters(connection, changes):
+    '''
+    adjust_show_counters(connection, changes)
+        applies `changes`, (venue_id, artist_id, start_time, delta) tuples
+        with delta 1 for an added show, -1 for a removed one and 0 for
+        one changed in place, to the counters, and stamps updated_at on
+        the venues and artists involved. Called for every ORM flush;
+        writes that bypass the ORM (bulk loads) call it directly.
+    '''
+    changes = list(changes)
+    if not changes:
+        return
+    counted_at = _watermark(connection)
+    deltas = {Venue: defaultdict(lambda: [0, 0]),
+              Artist: defaultdict(lambda: [0, 0])}
+    for venue_id, artist_id, start_time, delta in changes:
+        past = counted_at is not None and start_time <= counted_at
+        for model, entity_id in ((Venue, venue_id), (Artist, artist_id)):
+            if entity_id is not None:
+                deltas[model][entity_id][past] += delta
+
+    updated_at = datetime.utcnow()
+    for model, by_id in deltas.items():
+        params = [{'entity_id': entity_id, 'upcoming': upcoming,
+                   'past': past}
+                  for entity_id, (upcoming, past) in sorted(by_id.items())]
+        if params:
+            table = model.__table__
+            connection.execute(update(table).where(
+                table.c.id == bindparam('entity_id')
+            ).values(
+                upcoming_shows_count=table.c.upcoming_shows_count +
+                bindparam('upcoming'),
+                past_shows_count=table.c.past_shows_count +
+                bindparam('past'),
+                updated_at=updated_at
+            ), params)
+            if model is Venue:
+                adjust_area_shows(connection, [
+                    row for row in params if row['upcoming']])
+
+
+def touch_show_partners(connection, model, entity_ids):
+    '''
+    touch_show_partners(connection, model, entity_ids)
+        stamps updated_at on the artists (for venues) or venues (for
+        artists) having shows with the `entity_ids`, whose show cards
+        render those venues' or artists' names and images.
+    '''
+    entity_ids = sorted(set(entity_ids))
+    if not entity_ids:
+        return
+    if model is Venue:
+        partner, entity_fk, partner_fk = Artist, Show.venue, Show.artist
+    else:
+        partner, entity_fk, partner_fk = Venue, Show.artist, Show.venue
+    table = partner.__table__
+    connection.execute(update(table).where(table.c.id.in_(
+        select(partner_fk).where(entity_fk.in_(entity_ids)))
+    ).values(updated_at=datetime.utcnow()))
+
+
+def _show_key(show, state):
+    '''the (venue, artist, start_time) of `show` before ('old') or after
+    ('new') the pending flush.'''
+    key = []
+    for attribute in ('venue', 'artist', 'start_time'):
+        history = get_history(show, attribute)
+        if state == 'old' and history.deleted:
+            key.append(history.deleted[0])
+        elif state == 'new' and history.added:
+            key.append(history.added[0])
+        else:
+            key.append(getattr(show, attribute))
+    return tuple(key)
+
+
+@event.listens_for(Session, 'after_flush')
+def _adjust_flushed_show_counters(session, flush_context):
+    changes = []
+    for show in session.new:
+        if isinstance(show, Show):
+            changes.append(_show_key(show, 'new') + (1,))
+    for show in session.deleted:
+        if isinstance(show, Show):
+            changes.append(_show_key(show, 'old') + (-1,))
+    for show in session.dirty:
+        if isinstance(show, Show) and session.is_modified(show):
+            old, new = _show_key(show, 'old'), _show_key(show, 'new')
+            if old != new:
+                changes.extend((old + (-1,), new + (1,)))
+            else:
+                # e.g. a new end_time: only the pages change
+                changes.append(new + (0,))
+    if changes:
+        adjust_show_counters(session.connection(), changes)
+
+
+@event.listens_for(Session, 'after_flush')
+def _touch_flushed_show_partners(session, flush_context):
+    renamed = {Venue: [], Artist: []}
+    for entity in session.dirty:
+        if isinstance(entity, (Venue, Artist)) and any(
+                get_history(entity, attribute).has_changes()
+                for attribute in ('name', 'image_link')):
+            renamed[type(entity)].append(entity.id)
+    for model, entity_ids in renamed.items():
+        touch_show_partners(session.connection(), model, entity_ids)
+
+
+def rollover(connection, now=None):
+    '''
+    rollover(connection, now)
+        moves the shows that started between the watermark and `now`
+        from upcoming to past and advances the watermark to `now`.
+        Returns the number of shows moved.
+    '''
+    now = now or datetime.now()
+    counted_at = _watermark(connection, exclusive=True)
+    if counted_at is not None and counted_at >= now:
+        return 0
+    started = Show.start_time <= now
+    if counted_at is not None:
+        started = started & (Show.start_time > counted_at)
+
+    moved = 0
+    for model, fk in ((Venue, Show.venue), (Artist, Show.artist)):
+        shows = select(fk.label('entity_id'),
+                       func.count(Show.id).label('shows')).where(
+            started, fk.isnot(None)).group_by(fk).subquery()
+        result = connection.execute(update(model.__table__).where(
+            model.__table__.c.id == shows.c.entity_id
+        ).values(
+            upcoming_shows_count=model.__table__.c.upcoming_shows_count -
+            shows.c.shows,
+            past_shows_count=model.__table__.c.past_shows_count +
+            shows.c.shows,
+            updated_at=datetime.utcnow()
+        ).returning(shows.c.entity_id, shows.c.shows))
+        if model is Venue:
+            rows = result.all()
+            moved = sum(row.shows for row in rows)
+            adjust_area_shows(connection, [
+                {'entity_id': row.entity_id, 'upcoming': -row.shows}
+                for row in rows])
+    connection.execute(update(CounterWatermark.__table__).where(
+        CounterWatermark.name == WATERMARK).values(counted_at=now))
+    return moved
+
+
+def repair(connection, now=None):
+    '''
+    repair(connection, now)
+        recounts every venue's and artist's shows against the watermark,
+        first moved to `now` if given, and fixes the counters that
+        drifted, then the area directory. Returns the number of venue
+        and artist rows fixed.
+    '''
+    counted_at = _watermark(connection, exclusive=True)
+    if now is not None:
+        connection.execute(update(CounterWatermark.__table__).where(
+            CounterWatermark.name == WATERMARK).values(counted_at=now))
+        counted_at = now
+    fixed = 0
+    for model, fk in ((Venue, Show.venue), (Artist, Show.artist)):
+        table = model.__table__
+        upcoming = select(func.count(Show.id)).where(fk == table.c.id)
+        past = select(func.count(Show.id)).where(fk == table.c.id)
+        if counted_at is not None:
+            upcoming = upcoming.where(Show.start_time > counted_at)
+            past = past.where(Show.start_time <= counted_at)
+        else:
+            past = past.where(false())
+        upcoming = upcoming.scalar_subquery()
+        past = past.scalar_subquery()
+        fixed += connection.execute(update(table).where(
+            (table.c.upcoming_shows_count != upcoming) |
+            (table.c.past_shows_count != past)
+        ).values(upcoming_shows_count=upcoming,
+                 past_shows_count=past,
+                 updated_at=datetime.utcnow())).rowcount
+    repair_areas(connection)
+    return fixed
+
+
+@counters_cli.command('rollover',
+                      help='Move started shows from upcoming to past.')
+@click.option('--every', type=int, default=None, metavar='SECONDS',
+              help='Keep running, rolling over every SECONDS.')
+def rollover_command(every):
+    while True:
+        with db.engine.begin() as connection:
+            moved = rollover(connection)
+        click.echo('Moved {} shows to past'.format(moved))
+        if not every:
+            break
+        time.sleep(every)
+
+
+@counters_cli.command('repair', help='Recount shows and fix drifted counters.')
+def repair_command():
+    with db.engine.begin() as connection:
+        fixed = repair(connection)
+    click.echo('Fixed {} venue/artist counters'.format(fixed))
@@ -0,0 +1,54 @@
+import os
+import unittest
+from flask_migrate import Migrate, upgrade
+from model import db
+
+#----------------------------------------------------------------------------#
+# Database test case.
+#----------------------------------------------------------------------------#
+# Tests of the app's queries and routes run against Postgres with the
+# migrated schema. Set FYYUR_TEST_DATABASE_URL to a scratch database:
+# each test case class drops and recreates its public schema and runs the
+# migrations, and every test empties the data tables when it is done.
+# Without it those tests are skipped.
+
+TEST_DATABASE_URL = os.environ.get('FYYUR_TEST_DATABASE_URL')
+app = None
+if TEST_DATABASE_URL:
+    # config.py reads these, and the app connects, on import
+    os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+    os.environ.setdefault('PAGE_CACHE_BACKEND', 'memory')
+    from app import app
+
+# TableVersion and WebSession rows outlive the tests
+DATA_TABLES = ('Venue', 'Artist', 'Show', 'ShowSeries', 'ImportProgress',
+               'CounterWatermark', 'GenreCount', 'Area')
+
+
+@unittest.skipUnless(TEST_DATABASE_URL, 'FYYUR_TEST_DATABASE_URL is not set')
+class DatabaseTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # setup_db only registers Flask-Migrate for the flask command
+        if 'migrate' not in app.extensions:
+            Migrate(app, db)
+        with app.app_context():
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql(
+                    'DROP SCHEMA public CASCADE; CREATE SCHEMA public')
+            upgrade()
+
+    def setUp(self):
+        self.app = app
+        self.context = app.app_context()
+        self.context.push()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql(
+                'TRUNCATE {} RESTART IDENTITY CASCADE'.format(
+                    ', '.join('"{}"'.format(name) for name in DATA_TABLES)))
+        self.context.pop()
@@ -0,0 +1,213 @@
+import csv
+import hmac
+import io
+import json
+import os
+import sys
+import time
+import zlib
+from datetime import datetime
+from itertools import chain, islice
+import click
+from flask import Blueprint, Response, abort, current_app, request
+from flask.cli import AppGroup
+from routing import read_engine
+from queries import venue_collection, artist_collection, show_collection, \
+    stream_rows, UnknownField
+
+#----------------------------------------------------------------------------#
+# Bulk export.
+#----------------------------------------------------------------------------#
+# `flask export venues|artists|shows` and GET /admin/export/<kind> dump a
+# table as NDJSON or CSV, optionally gzipped. Rows are read from a
+# server-side cursor in batches and encoded (and compressed) as they
+# arrive, so memory stays flat whatever the table size. Shows can be
+# limited to a start_time range for incremental exports. The first batch
+# is read before anything is written, so a failing query errors out
+# instead of leaving a truncated file or 200 response; --output files
+# are only moved into place once the whole stream has been written.
+
+export_cli = AppGroup('export', help='Stream venues, artists or shows out.')
+export_api = Blueprint('export', __name__, url_prefix='/admin/export')
+
+COLLECTIONS = {
+    'venues': venue_collection,
+    'artists': artist_collection,
+    'shows': show_collection,
+}
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        # same separator `flask import` splits genres on
+        return ';'.join(value)
+    return value
+
+
+def encode_ndjson(rows):
+    for row in rows:
+        yield (json.dumps(row, default=_value, separators=(',', ':')) +
+               '\n').encode('utf-8')
+
+
+def encode_csv(rows):
+    buffer = io.StringIO()
+    writer = None
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(row))
+            writer.writeheader()
+        writer.writerow({key: _value(value) for key, value in row.items()})
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def gzipped(chunks, flush_bytes=64 * 1024):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    pending = 0
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        pending += len(chunk)
+        if data:
+            yield data
+        if pending >= flush_bytes:
+            # hand compressed data on regularly on slow, sparse streams
+            yield compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+    yield compressor.flush()
+
+
+def export_stream(kind, format='ndjson', gzip=False, fields=None,
+                  start=None, end=None, batch_size=1000):
+    '''
+    export_stream(kind, format, gzip, fields, start, end, batch_size)
+        returns an iterator of encoded byte chunks for the `kind` table,
+        having read the first batch of rows. Raises UnknownField for
+        fields the table does not have.
+    '''
+    if kind == 'shows':
+        statement = show_collection(fields, start=start, end=end)
+    elif start or end:
+        raise ValueError('start_time ranges only apply to shows')
+    else:
+        statement = COLLECTIONS[kind](fields)
+    rows = stream_rows(read_engine(), statement, batch_size)
+    rows = chain(list(islice(rows, batch_size)), rows)
+    chunks = encode_csv(rows) if format == 'csv' else encode_ndjson(rows)
+    return gzipped(chunks) if gzip else chunks
+
+
+def filename(kind, format, gzip):
+    return '{}.{}{}'.format(kind, format, '.gz' if gzip else '')
+
+#  Command
+#  ----------------------------------------------------------------
+
+
+def run_export(kind, format, gzip, output, fields, start, end, batch_size):
+    fields = fields.split(',') if fields else None
+    try:
+        chunks = export_stream(kind, format, gzip, fields, start, end,
+                               batch_size)
+    except (UnknownField, ValueError) as error:
+        raise click.BadParameter(str(error))
+
+    started = time.perf_counter()
+    written = 0
+    if output:
+        # same directory, so os.replace stays a rename
+        partial = '{}.{}.partial'.format(output, os.getpid())
+        target = open(partial, 'wb')
+    else:
+        target = sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            target.write(chunk)
+            written += len(chunk)
+    except BaseException:
+        if output:
+            target.close()
+            os.unlink(partial)
+        raise
+    if output:
+        target.close()
+        os.replace(partial, output)
+    click.echo('Exported {} ({} bytes) in {:.1f}s'.format(
+        kind, written, time.perf_counter() - started), err=True)
+
+
+def export_command(kind):
+    @export_cli.command(kind, help='Export {} as NDJSON or CSV.'.format(kind))
+    @click.option('--format', type=click.Choice(['ndjson', 'csv']),
+                  default='ndjson', show_default=True)
+    @click.option('--gzip', is_flag=True, help='Gzip the output.')
+    @click.option('--output', '-o', type=click.Path(dir_okay=False),
+                  help='Output file (default: stdout).')
+    @click.option('--fields', help='Comma separated fields to export.')
+    @click.option('--from', 'start', type=click.DateTime(),
+                  help='Shows starting at or after this time.')
+    @click.option('--to', 'end', type=click.DateTime(),
+                  help='Shows starting before this time.')
+    @click.option('--batch-size', default=5000, show_default=True,
+                  help='Rows fetched per server-side cursor batch.')
+    def command(format, gzip, output, fields, start, end, batch_size):
+        run_export(kind, format, gzip, output, fields, start, end,
+                   batch_size)
+    return command
+
+
+export_venues = export_command('venues')
+export_artists = export_command('artists')
+export_shows = export_command('shows')
+
+#  Endpoint
+#  ----------------------------------------------------------------
+
+
+def require_admin():
+    token = current_app.config.get('ADMIN_TOKEN')
+    supplied = request.headers.get('Authorization', '')
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(supplied.encode('utf-8'),
+                               ('Bearer ' + token).encode('utf-8')):
+        abort(403)
+
+
+def datetime_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        abort(400)
+
+
+@export_api.route('/<kind>')
+def export(kind):
+    require_admin()
+    if kind not in COLLECTIONS:
+        abort(404)
+    format = request.args.get('format', 'ndjson')
+    if format not in ('ndjson', 'csv'):
+        abort(400)
+    gzip = request.args.get('gzip') in ('1', 'true')
+    fields = request.args.get('fields')
+    try:
+        chunks = export_stream(
+            kind, format, gzip, fields.split(',') if fields else None,
+            datetime_arg('from'), datetime_arg('to'),
+            current_app.config['API_BATCH_SIZE'])
+    except (UnknownField, ValueError):
+        abort(400)
+
+    mimetype = 'application/gzip' if gzip else \
+        'text/csv' if format == 'csv' else 'application/x-ndjson'
+    response = Response(chunks, mimetype=mimetype)
+    response.headers['Content-Disposition'] = 'attachment; filename=' + \
+        filename(kind, format, gzip)
+    return response
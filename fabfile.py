@@ -7,12 +7,40 @@ from fabric.contrib.console import confirm
 def test():
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python test_tasks.py -v && python test_users.py -v && "
+            "python test_sessions.py -v && python test_routing.py -v && "
+            "python test_counters.py -v && python test_series.py -v && "
+            "python test_pagination.py -v && python test_importer.py -v",
+            capture=True
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
 
+def bench(url='http://localhost:5000', concurrency=8, duration=30,
+          save=False):
+    # load test a running server (see benchmarks/load.py) and compare
+    # with benchmarks/baseline.json; `fab bench:save=1` records a new one
+    command = "python benchmarks/load.py --url {} --concurrency {} " \
+        "--duration {}".format(url, concurrency, duration)
+    if save:
+        local(command + " --json benchmarks/baseline.json")
+    else:
+        local(command + " --baseline benchmarks/baseline.json")
+
+
+def rollover(every=60):
+    # move started shows from upcoming to past every `every` seconds
+    # (see counters.py); run it once per host, or use the cron entry
+    # given there
+    local("FLASK_APP=app.py flask counters rollover --every {}".format(every))
+
+
+def assets():
+    # build the hashed, precompressed static bundles (see assets.py)
+    local("FLASK_APP=app.py flask assets build")
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
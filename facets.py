@@ -0,0 +1,212 @@
+import json
+from collections import Counter, namedtuple
+import click
+from flask.cli import AppGroup
+from sqlalchemy import String, event, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from model import db, Venue, Artist, GenreCount, TableVersion
+from cache import page_cache
+
+#----------------------------------------------------------------------------#
+# Genre filters and facets.
+#----------------------------------------------------------------------------#
+# The venue and artist listings, searches and API collections filter on
+# genres: ?genre=Jazz&genre=Blues keeps the rows listing any of them
+# (array overlap, &&), with &match=all only those listing every one
+# (containment, @>). Both operators are served by the GIN indexes on the
+# genres arrays (migration 6c3f1a8e2b94). ?seeking=1 keeps the venues
+# seeking talent / the artists seeking venues.
+#
+# genre_facets counts the genres of such a result set. The counts for
+# whole tables, and for their seeking rows, are kept in GenreCount and
+# adjusted by every flush and bulk import that changes a venue's or
+# artist's genres, so the unfiltered facets read a few dozen rows. The
+# counts of a genre-filtered set are aggregated over the index and
+# cached (cache.py) under the table's TableVersion, which any write
+# bumps. `flask facets repair` recounts GenreCount from scratch.
+
+facets_cli = AppGroup('facets', help='Maintain the genre facet counts.')
+
+MATCHES = ('any', 'all')
+
+SEEKING = {Venue: 'seeking_talent', Artist: 'seeking_venue'}
+
+GenreFilter = namedtuple('GenreFilter', ['genres', 'match', 'seeking'])
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+def parse_genre_filter(args):
+    '''
+    parse_genre_filter(args)
+        the GenreFilter given by the genre, match and seeking values of
+        `args` (request.args or request.form), or None without filters.
+    '''
+    genres = tuple(sorted({genre.strip() for genre in args.getlist('genre')
+                           if genre.strip()}))
+    match = args.get('match') or 'any'
+    if match not in MATCHES:
+        raise InvalidFilter('match must be any or all')
+    seeking = args.get('seeking') in ('1', 'true', 'on')
+    if not genres and not seeking:
+        return None
+    return GenreFilter(genres, match, seeking)
+
+
+def genre_criteria(entity, genre_filter):
+    '''
+    genre_criteria(entity, genre_filter)
+        the WHERE criteria of `genre_filter` for Venue or Artist.
+    '''
+    if genre_filter is None:
+        return []
+    criteria = []
+    if genre_filter.genres:
+        # typed as the column: a text[] operand would miss the index
+        genres = literal(list(genre_filter.genres), ARRAY(String))
+        operator = '@>' if genre_filter.match == 'all' else '&&'
+        criteria.append(entity.genres.op(operator)(genres))
+    if genre_filter.seeking:
+        criteria.append(getattr(entity, SEEKING[entity]).is_(True))
+    return criteria
+
+
+def _counted(entity, genre_filter, session):
+    count = GenreCount.seeking_count \
+        if genre_filter and genre_filter.seeking else GenreCount.count
+    return session.query(GenreCount.genre, count).filter(
+        GenreCount.kind == entity.__tablename__, count > 0
+    ).order_by(count.desc(), GenreCount.genre).all()
+
+
+def _aggregated(entity, genre_filter, session):
+    genres = select(func.unnest(entity.genres).label('genre')).where(
+        *genre_criteria(entity, genre_filter)).subquery()
+    count = func.count()
+    return session.execute(
+        select(genres.c.genre, count).group_by(genres.c.genre)
+        .order_by(count.desc(), genres.c.genre)).all()
+
+
+def genre_facets(entity, genre_filter=None, session=None):
+    '''
+    genre_facets(entity, genre_filter)
+        [{"genre", "count"}] for the Venue or Artist rows `genre_filter`
+        selects, most common genre first.
+    '''
+    session = session or db.session
+    if genre_filter is None or not genre_filter.genres:
+        rows = _counted(entity, genre_filter, session)
+    elif page_cache.backend is None:
+        rows = _aggregated(entity, genre_filter, session)
+    else:
+        version = session.query(TableVersion.version).filter(
+            TableVersion.table_name == entity.__tablename__).scalar()
+        key = 'facets:{}:{}:{}'.format(entity.__tablename__, version,
+                                       json.dumps(genre_filter))
+        cached = page_cache.get(key)
+        if cached is not None:
+            rows = json.loads(cached)
+        else:
+            rows = [tuple(row)
+                    for row in _aggregated(entity, genre_filter, session)]
+            page_cache.set(key, json.dumps(rows))
+    return [{"genre": genre, "count": count} for genre, count in rows]
+
+
+# Maintenance
+# ----------------------------------------------------------------
+
+
+def adjust_genre_counts(connection, changes):
+    '''
+    adjust_genre_counts(connection, changes)
+        applies `changes`, (kind, genres, seeking, delta) tuples with
+        delta 1 for a venue or artist added with those genres and -1 for
+        one removed, to GenreCount. Called for every ORM flush; writes
+        that bypass the ORM (bulk loads) call it directly.
+    '''
+    deltas = Counter()
+    for kind, genres, seeking, delta in changes:
+        for genre in set(genres or ()):
+            deltas[kind, genre, 'count'] += delta
+            if seeking:
+                deltas[kind, genre, 'seeking_count'] += delta
+    rows = sorted({(kind, genre) for kind, genre, column in deltas})
+    params = [{'kind': kind, 'genre': genre,
+               'count': deltas[kind, genre, 'count'],
+               'seeking_count': deltas[kind, genre, 'seeking_count']}
+              for kind, genre in rows]
+    params = [row for row in params if row['count'] or row['seeking_count']]
+    if params:
+        table = GenreCount.__table__
+        statement = insert(table)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.kind, table.c.genre],
+            set_={'count': table.c.count + statement.excluded.count,
+                  'seeking_count': table.c.seeking_count +
+                  statement.excluded.seeking_count}), params)
+
+
+def _genre_key(instance, state):
+    '''the (kind, genres, seeking) of a venue or artist before ('old') or
+    after ('new') the pending flush.'''
+    key = [instance.__tablename__]
+    for attribute in ('genres', SEEKING[type(instance)]):
+        history = get_history(instance, attribute)
+        if state == 'old' and history.deleted:
+            key.append(history.deleted[0])
+        elif state == 'new' and history.added:
+            key.append(history.added[0])
+        else:
+            key.append(getattr(instance, attribute))
+    key[2] = bool(key[2])
+    return tuple(key)
+
+
+@event.listens_for(Session, 'after_flush')
+def _adjust_flushed_genre_counts(session, flush_context):
+    changes = []
+    for instance in session.new:
+        if type(instance) in SEEKING:
+            changes.append(_genre_key(instance, 'new') + (1,))
+    for instance in session.deleted:
+        if type(instance) in SEEKING:
+            changes.append(_genre_key(instance, 'old') + (-1,))
+    for instance in session.dirty:
+        if type(instance) in SEEKING and session.is_modified(instance):
+            old, new = _genre_key(instance, 'old'), _genre_key(instance, 'new')
+            if old != new:
+                changes.extend((old + (-1,), new + (1,)))
+    if changes:
+        adjust_genre_counts(session.connection(), changes)
+
+
+def repair(connection):
+    '''
+    repair(connection)
+        recounts GenreCount from the venue and artist tables.
+    '''
+    connection.execute(GenreCount.__table__.delete())
+    for entity, seeking in SEEKING.items():
+        genres = select(
+            entity.id, func.unnest(entity.genres).label('genre'),
+            getattr(entity, seeking).label('seeking')
+        ).distinct().subquery()
+        connection.execute(insert(GenreCount.__table__).from_select(
+            ['kind', 'genre', 'count', 'seeking_count'],
+            select(literal(entity.__tablename__),
+                   genres.c.genre, func.count(),
+                   func.count().filter(genres.c.seeking.is_(True)))
+            .group_by(genres.c.genre)))
+
+
+@facets_cli.command('repair', help='Recount the genre facet counts.')
+def repair_command():
+    with db.engine.begin() as connection:
+        repair(connection)
+    click.echo('Recounted genre facets.')
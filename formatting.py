@@ -0,0 +1,48 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+
+#----------------------------------------------------------------------------#
+# Date formatting.
+#----------------------------------------------------------------------------#
+# The `datetime` template filter. Controllers hand it datetime objects;
+# babel patterns are compiled once per (format, locale) and formatted
+# strings are memoized per (timestamp, format, locale), so a page that
+# repeats a start time formats it once. Strings are still accepted but
+# have to be parsed first. babel and dateutil are imported on first use.
+
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+# Formatted strings kept in the LRU cache.
+FORMAT_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=64)
+def _compiled(format, locale):
+    from babel import Locale
+    from babel.dates import LC_TIME, parse_pattern
+    return (parse_pattern(FORMATS.get(format, format)),
+            Locale.parse(locale or LC_TIME))
+
+
+@lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def _format(value, format, locale):
+    pattern, locale = _compiled(format, locale)
+    if value.tzinfo is None:
+        # as babel.dates.format_datetime does for naive datetimes
+        value = value.replace(tzinfo=timezone.utc)
+    return pattern.apply(value, locale)
+
+
+def format_datetime(value, format='medium', locale=None):
+    '''
+    format_datetime(value, format, locale)
+        formats a datetime (or, more slowly, a date string) with one of
+        the named FORMATS or a babel pattern.
+    '''
+    if not isinstance(value, datetime):
+        import dateutil.parser
+        value = dateutil.parser.parse(value)
+    return _format(value, format, locale)
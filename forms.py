@@ -1,22 +1,51 @@
 from datetime import datetime
-from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField
-from wtforms.validators import DataRequired, AnyOf, URL
+from flask_wtf import FlaskForm
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, \
+    IntegerField, DateField
+from wtforms.validators import DataRequired, AnyOf, URL, NumberRange, Optional, \
+    Regexp
+from bookings import DEFAULT_DURATION
 
-class ShowForm(Form):
+class ShowForm(FlaskForm):
     artist_id = StringField(
-        'artist_id'
+        'artist_id',
+        validators=[DataRequired(), Regexp(r'^\d+$', message='Not an id.')]
     )
     venue_id = StringField(
-        'venue_id'
+        'venue_id',
+        validators=[DataRequired(), Regexp(r'^\d+$', message='Not an id.')]
     )
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired()],
         default= datetime.today()
     )
+    # minutes
+    duration = IntegerField(
+        'duration',
+        validators=[Optional(), NumberRange(min=1, max=24 * 60)],
+        default=DEFAULT_DURATION
+    )
+    # a series: weekly or monthly, `count` times or until a date
+    repeat = SelectField(
+        'repeat',
+        choices=[
+            ('', 'Does not repeat'),
+            ('weekly', 'Weekly'),
+            ('monthly', 'Monthly'),
+        ],
+        default=''
+    )
+    count = IntegerField(
+        'count',
+        validators=[Optional(), NumberRange(min=1)]
+    )
+    until = DateField(
+        'until',
+        validators=[Optional()]
+    )
 
-class VenueForm(Form):
+class VenueForm(FlaskForm):
     name = StringField(
         'name', validators=[DataRequired()]
     )
@@ -120,7 +149,7 @@ class VenueForm(Form):
         'website', validators=[URL()]
     )
 
-class ArtistForm(Form):
+class ArtistForm(FlaskForm):
     name = StringField(
         'name', validators=[DataRequired()]
     )
@@ -0,0 +1,401 @@
+import csv
+import json
+import os
+import re
+import time
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+import click
+from flask.cli import AppGroup
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from werkzeug.datastructures import MultiDict
+from model import db, Venue, Artist, Show, ImportProgress, \
+    bump_table_versions
+from cache import page_cache
+from counters import adjust_show_counters, touch_show_partners
+from facets import adjust_genre_counts, SEEKING
+from areas import adjust_area_counts
+from bookings import end_time
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+# `flask import venues|artists|shows FILE` streams a CSV or NDJSON file,
+# validates every row with the same form the create page uses, and
+# writes valid rows in batches: one multi-row INSERT per batch, upserting
+# venues and artists on their unique name. Shows may name their venue
+# and artist (columns `venue` / `artist`) instead of giving ids, and
+# end with an `end_time` or run for a `duration` in minutes. Shows that
+# would double-book their venue or artist are skipped by the INSERT
+# (ON CONFLICT DO NOTHING, see bookings.py) and rejected.
+#
+# A name repeated within a batch is written once, from its last row; the
+# earlier rows are rejected, as a single upsert cannot affect a row twice.
+# Show rows naming a venue or artist id that does not exist are rejected
+# rather than failing the batch on the foreign key.
+#
+# Each batch commits together with the job's ImportProgress row, so a
+# failed import run again resumes after the last committed batch.
+# Rejected rows are written with their errors to FILE.rejects.ndjson.
+
+import_cli = AppGroup('import', help='Bulk load venues, artists and shows.')
+
+GENRE_SEPARATOR = re.compile(r'\s*[;|,]\s*')
+
+
+def read_rows(path, format):
+    with open(path, newline='', encoding='utf-8') as source:
+        if format == 'csv':
+            for row in csv.DictReader(source):
+                yield row
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def formdata(row):
+    data = MultiDict()
+    for key, value in row.items():
+        if value is None:
+            continue
+        if key == 'genres':
+            if isinstance(value, str):
+                value = [genre for genre in GENRE_SEPARATOR.split(value)
+                         if genre]
+            for genre in value:
+                data.add(key, genre)
+        else:
+            data.add(key, str(value))
+    return data
+
+
+class Kind(object):
+    '''
+    Kind
+        how one kind of row is validated and written.
+    '''
+    form = None  # the name of its form class in forms.py
+    model = None
+
+    def __init__(self):
+        # WTForms loads with the first import, not with the app
+        import forms
+        self.validator = getattr(forms, self.form)(meta={'csrf': False})
+
+    def prepare(self, rows):
+        return rows
+
+    def validate(self, row):
+        self.validator.process(formdata=formdata(row))
+        if not self.validator.validate():
+            return None, self.validator.errors
+        return self.values(self.validator.data), None
+
+    def superseded(self, values):
+        '''
+        superseded(values)
+            the indexes of the rows of `values` that a later row of the
+            batch replaces.
+        '''
+        return []
+
+    def writing(self, connection, values):
+        pass
+
+    def statement(self, values):
+        return insert(self.model.__table__).values(values)
+
+    def write(self, connection, values):
+        '''
+        write(connection, values)
+            inserts `values`; returns {index: errors} for those refused.
+        '''
+        connection.execute(self.statement(values))
+        return {}
+
+    def written(self, connection, values):
+        pass
+
+
+class VenueKind(Kind):
+    form = 'VenueForm'
+    model = Venue
+    columns = ('name', 'city', 'state', 'address', 'phone', 'genres',
+               'website', 'image_link', 'facebook_link')
+
+    def values(self, data):
+        return {column: data[column] for column in self.columns}
+
+    def superseded(self, values):
+        last = {row['name']: index for index, row in enumerate(values)}
+        return [index for index, row in enumerate(values)
+                if last[row['name']] != index]
+
+    def writing(self, connection, values):
+        # the rows the upsert replaces, locked until the batch commits, so
+        # they leave the genre facets and the area directory (see
+        # facets.py and areas.py)
+        model = self.model
+        rows = connection.execute(
+            select(model.id, model.name, model.image_link, model.genres,
+                   getattr(model, SEEKING[model]).label('seeking'),
+                   model.state, model.city, model.upcoming_shows_count)
+            .where(model.name.in_([row['name'] for row in values]))
+            .with_for_update())
+        self.replaced = {row.name: row for row in rows}
+
+    def statement(self, values):
+        statement = insert(self.model.__table__).values(values)
+        return statement.on_conflict_do_update(
+            index_elements=[self.model.__table__.c.name],
+            set_={column: statement.excluded[column]
+                  for column in self.columns + ('updated_at',)
+                  if column != 'name'})
+
+    def area_change(self, state, city, delta, upcoming):
+        # (state, city, venues, artists, upcoming shows) for areas.py
+        return (state, city, delta, 0, delta * upcoming)
+
+    def written(self, connection, values):
+        kind = self.model.__tablename__
+        genre_changes = []
+        area_changes = []
+        new_images = {row['name']: row['image_link'] for row in values}
+        for row in values:
+            # the upsert keeps a replaced row's seeking flag and counters
+            seeking, upcoming = False, 0
+            old = self.replaced.get(row['name'])
+            if old is not None:
+                seeking, upcoming = bool(old.seeking), old.upcoming_shows_count
+                genre_changes.append((kind, old.genres, seeking, -1))
+                area_changes.append(
+                    self.area_change(old.state, old.city, -1, upcoming))
+            genre_changes.append((kind, row['genres'], seeking, 1))
+            area_changes.append(
+                self.area_change(row['state'], row['city'], 1, upcoming))
+        adjust_genre_counts(connection, genre_changes)
+        adjust_area_counts(connection, area_changes)
+        # show cards on the other side render the image
+        touch_show_partners(connection, self.model, [
+            old.id for old in self.replaced.values()
+            if old.image_link != new_images[old.name]])
+
+
+class ArtistKind(VenueKind):
+    form = 'ArtistForm'
+    model = Artist
+    columns = ('name', 'city', 'state', 'phone', 'genres', 'image_link',
+               'facebook_link')
+
+    def area_change(self, state, city, delta, upcoming):
+        return (state, city, 0, delta, 0)
+
+
+class ShowKind(Kind):
+    form = 'ShowForm'
+    model = Show
+
+    def __init__(self):
+        super(ShowKind, self).__init__()
+        self.ids = {Venue: {}, Artist: {}}
+        self.existing = {Venue: set(), Artist: set()}
+
+    def resolve(self, model, names):
+        '''
+        resolve(model, names)
+            looks up the ids of the `names` not already known, in one
+            query per batch.
+        '''
+        known = self.ids[model]
+        missing = {name for name in names if name and name not in known}
+        if missing:
+            known.update(db.session.execute(
+                select(model.name, model.id).where(model.name.in_(missing))
+            ).all())
+        return known
+
+    def check(self, model, ids):
+        '''
+        check(model, ids)
+            looks up which of the `ids` not already known exist, in one
+            query per batch.
+        '''
+        existing = self.existing[model]
+        missing = {int(entity_id) for entity_id in ids
+                   if str(entity_id or '').isdigit()} - existing
+        if missing:
+            existing.update(db.session.execute(
+                select(model.id).where(model.id.in_(missing))).scalars())
+
+    def prepare(self, rows):
+        venues = self.resolve(Venue, [row.get('venue') for row in rows])
+        artists = self.resolve(Artist, [row.get('artist') for row in rows])
+        rows = [dict(row) for row in rows]
+        for row in rows:
+            if not row.get('venue_id') and row.get('venue') in venues:
+                row['venue_id'] = venues[row['venue']]
+            if not row.get('artist_id') and row.get('artist') in artists:
+                row['artist_id'] = artists[row['artist']]
+        self.check(Venue, [row.get('venue_id') for row in rows])
+        self.check(Artist, [row.get('artist_id') for row in rows])
+        return rows
+
+    def validate(self, row):
+        errors = {}
+        for field, model in (('venue_id', Venue), ('artist_id', Artist)):
+            entity_id = str(row.get(field) or '')
+            if not entity_id.isdigit() or \
+                    int(entity_id) not in self.existing[model]:
+                errors[field] = ['unknown or missing ' + field[:-3]]
+        if not row.get('start_time'):
+            errors['start_time'] = ['This field is required.']
+        if errors:
+            return None, errors
+        values, errors = super(ShowKind, self).validate(row)
+        if values is not None and row.get('end_time'):
+            try:
+                values['end_time'] = datetime.fromisoformat(
+                    str(row['end_time']))
+            except ValueError:
+                return None, {'end_time': ['Not a valid datetime value.']}
+            if values['end_time'] <= values['start_time']:
+                return None, {'end_time': ['must be after start_time']}
+        return values, errors
+
+    def values(self, data):
+        return {'venue': int(data['venue_id']),
+                'artist': int(data['artist_id']),
+                'start_time': data['start_time'],
+                'end_time': end_time(data['start_time'], data['duration'])}
+
+    def write(self, connection, values):
+        table = Show.__table__
+        inserted = Counter(connection.execute(
+            self.statement(values).on_conflict_do_nothing().returning(
+                table.c.venue, table.c.artist, table.c.start_time)).all())
+        refused = {}
+        for index, row in enumerate(values):
+            key = (row['venue'], row['artist'], row['start_time'])
+            if inserted[key]:
+                inserted[key] -= 1
+            else:
+                refused[index] = {'start_time': [
+                    'The venue or artist is already booked at that time.']}
+        return refused
+
+    def written(self, connection, values):
+        adjust_show_counters(connection, (
+            (row['venue'], row['artist'], row['start_time'], 1)
+            for row in values))
+
+
+KINDS = {'venues': VenueKind, 'artists': ArtistKind, 'shows': ShowKind}
+
+
+def reject(rejects, line, row, errors):
+    rejects.write(json.dumps({'row': line, 'errors': errors, 'data': row},
+                             default=str))
+    rejects.write('\n')
+
+
+def run_import(kind_name, path, format, batch_size, job, restart):
+    kind = KINDS[kind_name]()
+    format = format or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+    job = job or '{}:{}'.format(kind_name, os.path.abspath(path))
+
+    progress = db.session.get(ImportProgress, job)
+    if progress is None:
+        progress = ImportProgress(job=job, rows_done=0)
+        db.session.add(progress)
+    elif restart:
+        progress.rows_done = 0
+    db.session.commit()
+    skip = progress.rows_done
+    if skip:
+        click.echo('Resuming {} after row {}'.format(job, skip))
+
+    rows = islice(read_rows(path, format), skip, None)
+    offset = skip
+    imported = rejected = 0
+    started = time.perf_counter()
+    with open(path + '.rejects.ndjson', 'a', encoding='utf-8') as rejects:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            values, valid = [], []
+            for line, row in enumerate(kind.prepare(batch), offset + 1):
+                row_values, errors = kind.validate(row)
+                if errors:
+                    rejected += 1
+                    reject(rejects, line, row, errors)
+                else:
+                    values.append(row_values)
+                    valid.append((line, row))
+            superseded = set(kind.superseded(values))
+            for index in sorted(superseded):
+                rejected += 1
+                reject(rejects, *valid[index], errors={
+                    'name': ['replaced by a later row of this batch']})
+            values = [row for index, row in enumerate(values)
+                      if index not in superseded]
+            valid = [row for index, row in enumerate(valid)
+                     if index not in superseded]
+
+            try:
+                if values:
+                    kind.writing(db.session.connection(), values)
+                    refused = kind.write(db.session.connection(), values)
+                    for index, errors in sorted(refused.items()):
+                        rejected += 1
+                        reject(rejects, *valid[index], errors=errors)
+                    values = [row for index, row in enumerate(values)
+                              if index not in refused]
+                    kind.written(db.session.connection(), values)
+                    bump_table_versions(db.session.connection(),
+                                        [kind.model.__tablename__])
+                offset += len(batch)
+                progress.rows_done = offset
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            imported += len(values)
+
+            elapsed = time.perf_counter() - started
+            click.echo('{:>10} rows  {:>8} imported  {:>6} rejected  '
+                       '{:>9.0f} rows/s'.format(
+                           offset, imported, rejected,
+                           (offset - skip) / elapsed if elapsed else 0))
+
+    page_cache.clear()
+    elapsed = time.perf_counter() - started
+    click.echo('Done: {} imported, {} rejected in {:.1f}s ({:.0f} rows/s)'
+               .format(imported, rejected, elapsed,
+                       (offset - skip) / elapsed if elapsed else 0))
+    if rejected:
+        click.echo('Rejected rows: ' + path + '.rejects.ndjson')
+
+
+def import_command(kind_name):
+    @import_cli.command(kind_name, help='Import {} from a CSV or NDJSON '
+                        'file.'.format(kind_name))
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', type=click.Choice(['csv', 'ndjson']),
+                  help='Input format (default: from the file extension).')
+    @click.option('--batch-size', default=1000, show_default=True,
+                  help='Rows per INSERT and per transaction.')
+    @click.option('--job', help='Progress key (default: kind and path).')
+    @click.option('--restart', is_flag=True,
+                  help='Ignore saved progress and start from the first row.')
+    def command(path, format, batch_size, job, restart):
+        run_import(kind_name, path, format, batch_size, job, restart)
+    return command
+
+
+import_venues = import_command('venues')
+import_artists = import_command('artists')
+import_shows = import_command('shows')
@@ -0,0 +1,75 @@
+from functools import wraps
+from flask import g, current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import contains_eager
+from model import db, Show
+
+#----------------------------------------------------------------------------#
+# Loading strategies.
+#----------------------------------------------------------------------------#
+# Relationships on the models are lazy (not loaded) by default. Each
+# controller declares the related rows it renders, so pages that never
+# touch shows (listings, edit forms) never pay for them and pages that do
+# touch them never lazy-load one row at a time.
+
+
+def shows_query(*relationships, session=None):
+    '''
+    shows_query(*relationships, session)
+        returns a Show query that inner joins each of the given Show
+        relationships (Show.Venue, Show.Artist) and populates them from
+        the same row with contains_eager, so show.Venue / show.Artist
+        never issue a per-row lazy load.
+    '''
+    query = (session or db.session).query(Show)
+    for relationship in relationships:
+        query = query.join(relationship).options(contains_eager(relationship))
+    return query
+
+#----------------------------------------------------------------------------#
+# Query budget.
+#----------------------------------------------------------------------------#
+# Counts the SQL statements issued while a view runs (including template
+# rendering) and compares them against the budget the view declares.
+# With TESTING or QUERY_BUDGET_ENFORCE set, going over budget raises
+# QueryBudgetExceeded; otherwise it is logged as a warning.
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context() and 'query_count' in g:
+        g.query_count += 1
+
+
+def query_budget(limit):
+    '''
+    query_budget(limit)
+        decorates a view so that it may issue at most `limit` statements.
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            outer = g.pop('query_count', None)
+            g.query_count = 0
+            try:
+                response = view(*args, **kwargs)
+            finally:
+                count = g.pop('query_count')
+                if outer is not None:
+                    g.query_count = outer + count
+
+            if count > limit:
+                message = '{} issued {} SQL statements (budget {})'.format(
+                    view.__name__, count, limit)
+                if current_app.testing or \
+                        current_app.config.get('QUERY_BUDGET_ENFORCE'):
+                    raise QueryBudgetExceeded(message)
+                current_app.logger.warning(message)
+            return response
+        return wrapper
+    return decorator
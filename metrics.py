@@ -0,0 +1,191 @@
+import random
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, g, request, has_app_context
+from flask.signals import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Request metrics.
+#----------------------------------------------------------------------------#
+# Records, per endpoint, the wall time, SQL statement count, database
+# time, template render time and response size of a sample of requests
+# (METRICS_SAMPLE_RATE) as histograms, and serves them in the Prometheus
+# text format at /metrics. Every request is counted in
+# fyyur_requests_total whether sampled or not. Histograms live in the
+# worker process; each worker serves its own.
+
+SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+           2.5, 5.0, 10.0)
+STATEMENTS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BYTES = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram(object):
+    '''
+    Histogram
+        a Prometheus histogram keyed by a tuple of label values.
+    '''
+    def __init__(self, name, help, buckets, labels=('endpoint',)):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = \
+                    [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help),
+                 '# TYPE {} histogram'.format(self.name)]
+        with self.lock:
+            series = sorted((key, list(counts), total)
+                            for key, (counts, total) in self.series.items())
+        for label_values, counts, total in series:
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append('{}_bucket{{{}le="{}"}} {}'.format(
+                    self.name, labels + ',' if labels else '', bound,
+                    cumulative))
+            lines.append('{}_sum{{{}}} {}'.format(self.name, labels, total))
+            lines.append('{}_count{{{}}} {}'.format(self.name, labels,
+                                                    cumulative))
+        return lines
+
+
+class Counter(Histogram):
+    '''
+    Counter
+        a Prometheus counter keyed by a tuple of label values.
+    '''
+    def __init__(self, name, help, labels):
+        super(Counter, self).__init__(name, help, (), labels)
+
+    def inc(self, label_values):
+        with self.lock:
+            self.series[label_values] = self.series.get(label_values, 0) + 1
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help),
+                 '# TYPE {} counter'.format(self.name)]
+        with self.lock:
+            series = sorted(self.series.items())
+        for label_values, value in series:
+            lines.append('{}{{{}}} {}'.format(
+                self.name, _labels(self.labels, label_values), value))
+        return lines
+
+
+def _labels(names, values):
+    return ','.join('{}="{}"'.format(name, str(value).replace('"', '\\"'))
+                    for name, value in zip(names, values))
+
+
+requests_total = Counter('fyyur_requests_total', 'Requests served.',
+                         ('endpoint', 'status'))
+request_seconds = Histogram('fyyur_request_duration_seconds',
+                            'Wall time of sampled requests.', SECONDS)
+sql_statements = Histogram('fyyur_request_sql_statements',
+                           'SQL statements per sampled request.', STATEMENTS)
+db_seconds = Histogram('fyyur_request_db_seconds',
+                       'Time spent executing SQL per sampled request.',
+                       SECONDS)
+template_seconds = Histogram('fyyur_request_template_seconds',
+                             'Template render time per sampled request.',
+                             SECONDS)
+response_bytes = Histogram('fyyur_response_size_bytes',
+                           'Response body size of sampled requests.', BYTES)
+
+METRICS = (requests_total, request_seconds, sql_statements, db_seconds,
+           template_seconds, response_bytes)
+
+
+def _sampled():
+    return has_app_context() and g.get('metrics') is not None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_statement(conn, cursor, statement, parameters, context,
+                     executemany):
+    if _sampled():
+        g.metrics['statements'] += 1
+        if context is not None:
+            context.metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _end_statement(conn, cursor, statement, parameters, context,
+                   executemany):
+    started = getattr(context, 'metrics_started', None)
+    if started is not None and _sampled():
+        g.metrics['db'] += time.perf_counter() - started
+
+
+def _start_template(sender, template, context, **extra):
+    if _sampled():
+        g.metrics['template_started'] = time.perf_counter()
+
+
+def _end_template(sender, template, context, **extra):
+    if _sampled() and 'template_started' in g.metrics:
+        g.metrics['template'] += \
+            time.perf_counter() - g.metrics.pop('template_started')
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app):
+    '''
+    init_metrics(app)
+        instruments the requests of `app` and adds the /metrics endpoint.
+        A no-op unless METRICS_ENABLED is set.
+    '''
+    if not app.config.get('METRICS_ENABLED'):
+        return
+    before_render_template.connect(_start_template, app)
+    template_rendered.connect(_end_template, app)
+
+    @app.before_request
+    def start_request():
+        g.request_started = time.perf_counter()
+        if request.endpoint != 'metrics' and \
+                random.random() < app.config['METRICS_SAMPLE_RATE']:
+            g.metrics = {'statements': 0, 'db': 0.0, 'template': 0.0}
+
+    @app.after_request
+    def record_request(response):
+        endpoint = (request.endpoint or 'unmatched',)
+        requests_total.inc(endpoint + (response.status_code,))
+        sample = g.pop('metrics', None)
+        if sample is not None:
+            request_seconds.observe(
+                endpoint, time.perf_counter() - g.request_started)
+            sql_statements.observe(endpoint, sample['statements'])
+            db_seconds.observe(endpoint, sample['db'])
+            template_seconds.observe(endpoint, sample['template'])
+            # streamed responses have no length up front
+            if response.content_length is not None:
+                response_bytes.observe(endpoint, response.content_length)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render_metrics(),
+                        mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,57 @@
+"""show end times and booking constraints
+
+Revision ID: 3d7a9e1c5b28
+Revises: 2e8b4f6a9c13
+Create Date: 2026-10-18 22:41:36.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3d7a9e1c5b28'
+down_revision = '2e8b4f6a9c13'
+branch_labels = None
+depends_on = None
+
+BOOKINGS = ('venue', 'artist')
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(), nullable=True))
+
+    # Existing shows run for two hours, cut short where the next show of
+    # their venue or artist starts, so the history already satisfies the
+    # constraints; shows sharing a start time get an empty range.
+    op.execute("""
+        UPDATE "Show" SET end_time = ends.end_time
+        FROM (SELECT id, least(
+                  start_time + interval '2 hours',
+                  lead(start_time) OVER (PARTITION BY venue
+                                         ORDER BY start_time, id),
+                  lead(start_time) OVER (PARTITION BY artist
+                                         ORDER BY start_time, id)
+              ) AS end_time
+              FROM "Show") AS ends
+        WHERE ends.id = "Show".id
+    """)
+    op.alter_column('Show', 'end_time', nullable=False)
+    op.create_check_constraint('ck_Show_end_time', 'Show',
+                               'end_time >= start_time')
+
+    # Builds a GiST index each, under a lock that holds off writes to Show.
+    for column in BOOKINGS:
+        op.execute(
+            'ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_{column}_booking" '
+            'EXCLUDE USING gist ('
+            "int4range({column}, {column}, '[]') WITH &&, "
+            'tsrange(start_time, end_time) WITH &&'
+            ') WHERE ({column} IS NOT NULL)'.format(column=column))
+
+
+def downgrade():
+    for column in BOOKINGS:
+        op.drop_constraint('ex_Show_{}_booking'.format(column), 'Show')
+    op.drop_constraint('ck_Show_end_time', 'Show')
+    op.drop_column('Show', 'end_time')
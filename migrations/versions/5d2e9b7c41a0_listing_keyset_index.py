@@ -0,0 +1,27 @@
+"""listing keyset index
+
+Revision ID: 5d2e9b7c41a0
+Revises: 8c777a4535a3
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2e9b7c41a0'
+down_revision = '8c777a4535a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # /venues is keyset paginated on (state, city, name, id).
+    # /artists pages on (name, id), served by the unique index on name.
+    op.create_index('ix_Venue_state_city_name_id', 'Venue',
+                    ['state', 'city', 'name', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Venue_state_city_name_id', table_name='Venue')
@@ -0,0 +1,58 @@
+"""recurring show series
+
+Revision ID: 8b1e4c7d2f60
+Revises: 3d7a9e1c5b28
+Create Date: 2026-10-18 23:52:17.408316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b1e4c7d2f60'
+down_revision = '3d7a9e1c5b28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'ShowSeries',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('venue', sa.Integer(), nullable=True),
+        sa.Column('artist', sa.Integer(), nullable=True),
+        sa.Column('frequency', sa.String(length=16), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('duration', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=True),
+        sa.Column('until', sa.Date(), nullable=True),
+        sa.Column('cancelled_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['venue'], ['Venue.id'],
+                                ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['artist'], ['Artist.id'],
+                                ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # nullable, so adding it does not rewrite Show
+    op.add_column('Show', sa.Column('series', sa.Integer(), nullable=True))
+    op.create_foreign_key('Show_series_fkey', 'Show', 'ShowSeries',
+                          ['series'], ['id'])
+
+    # CONCURRENTLY does not lock out writes, but cannot run inside the
+    # migration transaction.
+    with op.get_context().autocommit_block():
+        op.create_index('ix_Show_series_start_time', 'Show',
+                        ['series', 'start_time'],
+                        postgresql_where=sa.text('series IS NOT NULL'),
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_Show_series_start_time', table_name='Show',
+                      postgresql_concurrently=True)
+    op.drop_constraint('Show_series_fkey', 'Show', type_='foreignkey')
+    op.drop_column('Show', 'series')
+    op.drop_table('ShowSeries')
@@ -0,0 +1,50 @@
+"""search trigram indexes
+
+Revision ID: 9a4c1e6f2d83
+Revises: 5d2e9b7c41a0
+Create Date: 2026-10-18 10:03:17.402911
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4c1e6f2d83'
+down_revision = '5d2e9b7c41a0'
+branch_labels = None
+depends_on = None
+
+TRIGRAM_INDEXES = (
+    ('ix_Venue_name_trgm', 'Venue', 'name'),
+    ('ix_Venue_city_trgm', 'Venue', 'city'),
+    ('ix_Venue_genres_trgm', 'Venue', 'fyyur_genres_text(genres)'),
+    ('ix_Artist_name_trgm', 'Artist', 'name'),
+    ('ix_Artist_city_trgm', 'Artist', 'city'),
+    ('ix_Artist_genres_trgm', 'Artist', 'fyyur_genres_text(genres)'),
+)
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # array_to_string is only STABLE; genres are plain text so wrapping
+    # it as IMMUTABLE is safe and lets the genres text be indexed.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION fyyur_genres_text(varchar[])
+        RETURNS text LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        AS $$ SELECT array_to_string($1, ' ') $$
+    """)
+    # CONCURRENTLY does not lock out writes to Venue and Artist while the
+    # GIN indexes build, but cannot run inside the migration transaction.
+    with op.get_context().autocommit_block():
+        for name, table, expression in TRIGRAM_INDEXES:
+            op.execute('CREATE INDEX CONCURRENTLY "{}" ON "{}" '
+                       'USING gin ({} gin_trgm_ops)'
+                       .format(name, table, expression))
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, expression in TRIGRAM_INDEXES:
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS "{}"'.format(name))
+    op.execute('DROP FUNCTION IF EXISTS fyyur_genres_text(varchar[])')
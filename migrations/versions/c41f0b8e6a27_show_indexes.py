@@ -0,0 +1,40 @@
+"""show indexes
+
+Revision ID: c41f0b8e6a27
+Revises: 9a4c1e6f2d83
+Create Date: 2026-10-18 11:26:05.730552
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41f0b8e6a27'
+down_revision = '9a4c1e6f2d83'
+branch_labels = None
+depends_on = None
+
+# id is the keyset tie-breaker, so (start_time, id) > (x, y) is an index
+# condition rather than a filter over every show of the venue/artist.
+SHOW_INDEXES = (
+    ('ix_Show_venue_start_time', ['venue', 'start_time', 'id']),
+    ('ix_Show_artist_start_time', ['artist', 'start_time', 'id']),
+    ('ix_Show_start_time', ['start_time', 'id']),
+)
+
+
+def upgrade():
+    # CONCURRENTLY does not lock out writes to Show, but cannot run
+    # inside the migration transaction.
+    with op.get_context().autocommit_block():
+        for name, columns in SHOW_INDEXES:
+            op.create_index(name, 'Show', columns, unique=False,
+                            postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, columns in SHOW_INDEXES:
+            op.drop_index(name, table_name='Show',
+                          postgresql_concurrently=True)
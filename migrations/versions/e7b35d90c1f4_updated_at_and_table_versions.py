@@ -0,0 +1,42 @@
+"""updated_at and table versions
+
+Revision ID: e7b35d90c1f4
+Revises: c41f0b8e6a27
+Create Date: 2026-10-18 12:40:52.913370
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b35d90c1f4'
+down_revision = 'c41f0b8e6a27'
+branch_labels = None
+depends_on = None
+
+VERSIONED_TABLES = ('Venue', 'Artist', 'Show')
+
+
+def upgrade():
+    for table in VERSIONED_TABLES:
+        op.add_column(table, sa.Column(
+            'updated_at', sa.DateTime(), nullable=False,
+            server_default=sa.text("timezone('utc', now())")))
+
+    table_version = op.create_table('TableVersion',
+    sa.Column('table_name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+    op.execute(table_version.insert().values([
+        {'table_name': table, 'version': 0,
+         'updated_at': sa.text("timezone('utc', now())")}
+        for table in VERSIONED_TABLES]))
+
+
+def downgrade():
+    op.drop_table('TableVersion')
+    for table in VERSIONED_TABLES:
+        op.drop_column(table, 'updated_at')
@@ -1,9 +1,12 @@
+import os
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-from flask_migrate import Migrate
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
+from sqlalchemy.orm import Session
+from routing import RoutingSession, init_routing
 
-db = SQLAlchemy()
-migrate = Migrate()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 '''
@@ -14,7 +17,12 @@ def setup_db(app):
     app.config.from_object('config')
     db.app = app
     db.init_app(app)
-    migrate.init_app(app, db)
+    # Flask-Migrate, and alembic with it, is only needed by `flask db`;
+    # the flask command sets FLASK_RUN_FROM_CLI before loading the app
+    if os.environ.get('FLASK_RUN_FROM_CLI'):
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    init_routing(app)
     # db.create_all()
 #----------------------------------------------------------------------------#
 # Models.
@@ -34,8 +42,16 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500)) 
     website = db.Column(db.String(500))
-    shows = db.relationship('Show', backref='Venue', lazy=False)
+    shows = db.relationship('Show', backref='Venue', lazy='select')
     genres = db.Column(db.ARRAY(db.String), nullable=False)
+    # maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0,
+                                     server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0,
+                                 server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.text("timezone('utc', now())"))
 
     def __repr__(self):
        return f'Venue ID: {self.id} Name : {self.name}'
@@ -55,7 +71,15 @@ class Artist(db.Model):
     facebook_link = db.Column(db.String(400))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String())
-    shows = db.relationship('Show', backref='Artist', lazy=False)
+    shows = db.relationship('Show', backref='Artist', lazy='select')
+    # maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0,
+                                     server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0,
+                                 server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.text("timezone('utc', now())"))
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
@@ -66,4 +90,220 @@ class Show(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     venue = db.Column(db.Integer, db.ForeignKey('Venue.id'))
     artist = db.Column(db.Integer, db.ForeignKey('Artist.id'))
-    start_time = db.Column(db.DateTime, nullable=False)
\ No newline at end of file
+    start_time = db.Column(db.DateTime, nullable=False)
+    # the show takes the venue and artist for [start_time, end_time);
+    # see bookings.py
+    end_time = db.Column(db.DateTime, nullable=False)
+    # the ShowSeries it was created by, if any; see series.py
+    series = db.Column(db.Integer, db.ForeignKey('ShowSeries.id'))
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.text("timezone('utc', now())"))
+
+
+'''
+ShowSeries
+    a recurring show: its shows start every week or month from
+    start_time, `count` times or until the date `until`, and are edited
+    and cancelled together (see series.py). The venue and artist are
+    those of its upcoming shows.
+'''
+class ShowSeries(db.Model):
+    __tablename__ = 'ShowSeries'
+    id = db.Column(db.Integer, primary_key=True)
+    venue = db.Column(db.Integer,
+                      db.ForeignKey('Venue.id', ondelete='SET NULL'))
+    artist = db.Column(db.Integer,
+                       db.ForeignKey('Artist.id', ondelete='SET NULL'))
+    frequency = db.Column(db.String(16), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    # minutes
+    duration = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.Integer)
+    until = db.Column(db.Date)
+    cancelled_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+'''
+TableVersion
+    a counter per table, bumped in the same transaction as every write
+    to that table (see bump_table_versions). Listing pages derive their
+    ETag from it, since a max(updated_at) would not see deletes.
+'''
+class TableVersion(db.Model):
+    __tablename__ = 'TableVersion'
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow)
+
+
+'''
+ImportProgress
+    input rows consumed by a bulk import job (see importer.py), written
+    in the same transaction as each batch so a failed import resumes
+    exactly where its last committed batch ended.
+'''
+class ImportProgress(db.Model):
+    __tablename__ = 'ImportProgress'
+    job = db.Column(db.String(500), primary_key=True)
+    rows_done = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+'''
+CounterWatermark
+    the time the upcoming/past show counters were last rolled over: a
+    show counts as upcoming while its start_time is after counted_at
+    (all shows, when counted_at is NULL). See counters.py.
+'''
+class CounterWatermark(db.Model):
+    __tablename__ = 'CounterWatermark'
+    name = db.Column(db.String(64), primary_key=True)
+    counted_at = db.Column(db.DateTime)
+
+
+
+'''
+WebSession
+    server-side session data for SESSION_BACKEND 'database' (see
+    sessions.py); the session cookie holds only the signed id.
+'''
+class WebSession(db.Model):
+    __tablename__ = 'WebSession'
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+
+'''
+GenreCount
+    the number of venues or artists (`kind` is the table name) listing
+    each genre, overall and among those seeking artists / venues; the
+    genre facets of the unfiltered listings (see facets.py).
+'''
+class GenreCount(db.Model):
+    __tablename__ = 'GenreCount'
+    kind = db.Column(db.String(16), primary_key=True)
+    genre = db.Column(db.String(120), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    seeking_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+'''
+Area
+    the area directory: the venues, artists and upcoming shows at the
+    venues of each (state, city key), with the first spelling of the
+    city seen (see areas.py).
+'''
+class Area(db.Model):
+    __tablename__ = 'Area'
+    state = db.Column(db.String(120), primary_key=True)
+    city_key = db.Column(db.String(120), primary_key=True)
+    city = db.Column(db.String(120), nullable=False)
+    venue_count = db.Column(db.Integer, nullable=False, default=0)
+    artist_count = db.Column(db.Integer, nullable=False, default=0)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+VERSIONED_TABLES = ('Venue', 'Artist', 'Show')
+
+
+def bump_table_versions(connection, tables):
+    '''
+    bump_table_versions(connection, tables)
+        increments the TableVersion rows of `tables`. Called for every ORM
+        flush; writes that bypass the ORM (bulk loads) call it directly.
+    '''
+    for table in sorted(set(tables)):
+        connection.execute(
+            TableVersion.__table__.update().where(
+                TableVersion.table_name == table
+            ).values(version=TableVersion.version + 1,
+                     updated_at=datetime.utcnow()))
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_flushed_table_versions(session, flush_context):
+    tables = set()
+    for instance in session.new | session.deleted:
+        tables.add(instance.__tablename__)
+    for instance in session.dirty:
+        if session.is_modified(instance):
+            tables.add(instance.__tablename__)
+    tables.intersection_update(VERSIONED_TABLES)
+    if tables:
+        bump_table_versions(session.connection(), tables)
+
+#----------------------------------------------------------------------------#
+# Indexes.
+#----------------------------------------------------------------------------#
+# Declared here so autogenerated migrations keep them; each is created by
+# the migration named next to it.
+
+# keyset order of the /venues listing (5d2e9b7c41a0)
+db.Index('ix_Venue_state_city_name_id',
+         Venue.state, Venue.city, Venue.name, Venue.id)
+
+# per-venue / per-artist show lists and the /shows listing, each ordered
+# by the (start_time, id) keyset (c41f0b8e6a27)
+db.Index('ix_Show_venue_start_time', Show.venue, Show.start_time, Show.id)
+db.Index('ix_Show_artist_start_time', Show.artist, Show.start_time, Show.id)
+db.Index('ix_Show_start_time', Show.start_time, Show.id)
+
+# the shows of a series, by start time (8b1e4c7d2f60)
+db.Index('ix_Show_series_start_time', Show.series, Show.start_time,
+         postgresql_where=Show.series.isnot(None))
+
+# trigram search on name, city and genres (9a4c1e6f2d83)
+def trigram_index(model, field, expression):
+    label = '{}_{}'.format(model.__tablename__, field)
+    return db.Index('ix_{}_trgm'.format(label), expression.label(label),
+                    postgresql_using='gin',
+                    postgresql_ops={label: 'gin_trgm_ops'})
+
+
+trigram_index(Venue, 'name', Venue.name)
+trigram_index(Venue, 'city', Venue.city)
+trigram_index(Venue, 'genres', db.func.fyyur_genres_text(Venue.genres))
+trigram_index(Artist, 'name', Artist.name)
+trigram_index(Artist, 'city', Artist.city)
+trigram_index(Artist, 'genres', db.func.fyyur_genres_text(Artist.genres))
+
+# genre filters: array overlap (&&) and containment (@>) (6c3f1a8e2b94)
+db.Index('ix_Venue_genres', Venue.genres, postgresql_using='gin')
+db.Index('ix_Artist_genres', Artist.genres, postgresql_using='gin')
+
+# area browsing on (state, city key); the venue index carries the
+# listing's keyset order within an area (2e8b4f6a9c13)
+db.Index('ix_Venue_area', Venue.state, db.func.fyyur_city_key(Venue.city),
+         Venue.city, Venue.name, Venue.id)
+db.Index('ix_Artist_area', Artist.state, db.func.fyyur_city_key(Artist.city),
+         Artist.name, Artist.id)
+
+#----------------------------------------------------------------------------#
+# Constraints.
+#----------------------------------------------------------------------------#
+# No venue or artist is booked for two overlapping shows (3d7a9e1c5b28).
+# The id is matched as a one-value range so the core GiST range operator
+# class covers the whole constraint, without the btree_gist extension;
+# shows without a venue or artist are left out.
+
+
+def booking_constraint(entity_fk):
+    label = entity_fk.key
+    return ExcludeConstraint(
+        (db.func.int4range(entity_fk, entity_fk, '[]'), '&&'),
+        (db.func.tsrange(Show.start_time, Show.end_time), '&&'),
+        name='ex_Show_{}_booking'.format(label), using='gist',
+        where=entity_fk.isnot(None))
+
+
+Show.__table__.append_constraint(booking_constraint(Show.__table__.c.venue))
+Show.__table__.append_constraint(booking_constraint(Show.__table__.c.artist))
+Show.__table__.append_constraint(db.CheckConstraint(
+    'end_time >= start_time', name='ck_Show_end_time'))
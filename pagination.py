@@ -0,0 +1,95 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import tuple_
+
+#----------------------------------------------------------------------------#
+# Cursors.
+#----------------------------------------------------------------------------#
+# Keyset cursors are the sort key of the last row on a page, serialized
+# to an opaque url-safe token. Datetimes round-trip as ISO strings.
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*key):
+    values = [{'t': value.isoformat()} if isinstance(value, datetime)
+              else value for value in key]
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw.decode('utf-8'))
+        return tuple(datetime.fromisoformat(value['t'])
+                     if isinstance(value, dict) else value
+                     for value in values)
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise InvalidCursor(cursor)
+
+#----------------------------------------------------------------------------#
+# Keyset pages.
+#----------------------------------------------------------------------------#
+# A page is fetched by comparing the row value of the sort key with the
+# cursor, (a, b) > (x, y), so it is an index range scan whatever the
+# depth of the page; there is no OFFSET. Cursors come from the client,
+# so one that does not fit the key is refused before it gets to SQL.
+
+Page = namedtuple('Page', ['items', 'next_cursor', 'prev_cursor'])
+
+
+def check_cursor(cursor, key):
+    '''
+    check_cursor(cursor, key)
+        raises InvalidCursor unless `cursor` holds a value of the Python
+        type of each of the `key` columns.
+    '''
+    if len(cursor) != len(key):
+        raise InvalidCursor(cursor)
+    for value, column in zip(cursor, key):
+        if type(value) is not column.type.python_type:
+            raise InvalidCursor(cursor)
+        # which Postgres text cannot hold
+        if isinstance(value, str) and '\x00' in value:
+            raise InvalidCursor(cursor)
+
+
+def _key_values(row, key):
+    if hasattr(row, '_mapping'):
+        return [row._mapping[column] for column in key]
+    return [getattr(row, column.key) for column in key]
+
+
+def keyset_page(query, key, size, after=None, before=None):
+    '''
+    keyset_page(query, key, size, after, before)
+        returns the Page of `size` rows of `query` ordered by the `key`
+        columns that follows the `after` cursor (or precedes the `before`
+        cursor), with the cursors of the neighbouring pages.
+    '''
+    for cursor in (after, before):
+        if cursor is not None:
+            check_cursor(cursor, key)
+
+    if before is not None:
+        rows = query.filter(tuple_(*key) < tuple_(*before)).order_by(
+            *[column.desc() for column in key]).limit(size + 1).all()
+        has_more = len(rows) > size
+        rows = rows[:size][::-1]
+        prev_cursor = has_more and encode_cursor(*_key_values(rows[0], key))
+        next_cursor = rows and encode_cursor(*_key_values(rows[-1], key))
+    else:
+        if after is not None:
+            query = query.filter(tuple_(*key) > tuple_(*after))
+        rows = query.order_by(*key).limit(size + 1).all()
+        has_more = len(rows) > size
+        rows = rows[:size]
+        next_cursor = has_more and encode_cursor(*_key_values(rows[-1], key))
+        prev_cursor = after is not None and rows and \
+            encode_cursor(*_key_values(rows[0], key))
+    return Page(rows, next_cursor or None, prev_cursor or None)
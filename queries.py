@@ -0,0 +1,452 @@
+from datetime import datetime
+from itertools import groupby
+from sqlalchemy import JSON, func, select, text, true, tuple_, \
+    type_coerce
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from model import db, Venue, Artist, Show
+from pagination import encode_cursor, check_cursor, keyset_page
+from loading import shows_query
+from facets import genre_criteria
+from areas import area_criteria
+from counters import started_since_counted
+
+#----------------------------------------------------------------------------#
+# Read queries.
+#----------------------------------------------------------------------------#
+# Shape query results straight into the structures the templates expect,
+# loading only the columns each page renders.
+
+
+# Listings
+# ----------------------------------------------------------------
+# Listings are keyset paginated (see pagination.keyset_page): venues on
+# (state, city, name, id) so a page holds whole runs of an area,
+# artists on (name, id) and shows on (start_time, id).
+#
+# The venue and artist listings take an optional GenreFilter (see
+# facets.py) and AreaFilter (see areas.py), the show listing a
+# [start, end) window of start times. Every read takes an optional
+# `session`, db.session by default; the async read views (asgi.py) pass
+# the sync facade of an AsyncSession.
+
+
+def _starting_in(start, end):
+    criteria = []
+    if start is not None:
+        criteria.append(Show.start_time >= start)
+    if end is not None:
+        criteria.append(Show.start_time < end)
+    return criteria
+
+
+def venue_areas(size, after=None, before=None,
+                genre_filter=None, area_filter=None, session=None):
+    '''
+    venue_areas(size, after, before, genre_filter, area_filter)
+        returns a Page whose items are the page's venues grouped by
+        (city, state) with the number of upcoming shows per venue, in the
+        shape pages/venues.html expects. Runs as a single query; the
+        upcoming count is the venue's counter (see counters.py).
+    '''
+    num_upcoming_shows = Venue.upcoming_shows_count.label(
+        'num_upcoming_shows')
+    query = (session or db.session).query(
+        Venue.city,
+        Venue.state,
+        Venue.id,
+        Venue.name,
+        num_upcoming_shows
+    ).filter(*genre_criteria(Venue, genre_filter),
+             *area_criteria(Venue, area_filter))
+    page = keyset_page(query, (Venue.state, Venue.city, Venue.name, Venue.id),
+                       size, after, before)
+
+    areas = []
+    for (city, state), venues in groupby(page.items,
+                                         key=lambda row: (row.city, row.state)):
+        areas.append({
+            "city": city,
+            "state": state,
+            "venues": [{
+                "id": venue.id,
+                "name": venue.name,
+                "num_upcoming_shows": venue.num_upcoming_shows
+            } for venue in venues]
+        })
+    return page._replace(items=areas)
+
+
+def artist_listing(size, after=None, before=None,
+                   genre_filter=None, area_filter=None, session=None):
+    '''
+    artist_listing(size, after, before, genre_filter, area_filter)
+        returns a Page of artist ids and names ordered by name.
+    '''
+    query = (session or db.session).query(Artist.id, Artist.name).filter(
+        *genre_criteria(Artist, genre_filter),
+        *area_criteria(Artist, area_filter))
+    page = keyset_page(query, (Artist.name, Artist.id), size, after, before)
+    return page._replace(items=[{
+        "id": artist.id,
+        "name": artist.name
+    } for artist in page.items])
+
+
+def show_listing(size, after=None, before=None,
+                 start=None, end=None, session=None):
+    '''
+    show_listing(size, after, before, start, end)
+        returns a Page of show cards ordered by start time, with the venue
+        and artist joined into the same statement, optionally only the
+        shows starting in [start, end).
+    '''
+    query = shows_query(Show.Venue, Show.Artist, session=session).filter(
+        *_starting_in(start, end))
+    page = keyset_page(query, (Show.start_time, Show.id), size, after,
+                       before)
+    return page._replace(items=[{
+        "venue_id": show.Venue.id,
+        "venue_name": show.Venue.name,
+        "artist_id": show.Artist.id,
+        "artist_name": show.Artist.name,
+        "artist_image_link": show.Artist.image_link,
+        "start_time": show.start_time
+    } for show in page.items])
+
+
+# Detail pages
+# ----------------------------------------------------------------
+# The entity, its past/upcoming show counters (see counters.py) and the
+# first page of each show list come back from one statement. Show cards
+# are aggregated to JSON in the database; both lists are split on the
+# same `now` snapshot, and the header counts are corrected for the shows
+# that started since the counters' last rollover, so they agree with the
+# lists.
+# Upcoming shows are listed soonest first, past shows latest first, and
+# further pages are fetched with a (start_time, id) keyset cursor.
+
+
+def _card_select(entity_fk, entity_id, other, prefix, upcoming, now,
+                 limit, cursor=None):
+    other_fk = Show.venue if other is Venue else Show.artist
+    query = select(
+        other.id.label(prefix + '_id'),
+        other.name.label(prefix + '_name'),
+        other.image_link.label(prefix + '_image_link'),
+        Show.start_time,
+        Show.id.label('show_id'),
+        Show.series.label('series_id')
+    ).select_from(Show).join(
+        other, other.id == other_fk
+    ).where(entity_fk == entity_id)
+
+    key = tuple_(Show.start_time, Show.id)
+    if upcoming:
+        query = query.where(Show.start_time > now).order_by(
+            Show.start_time.asc(), Show.id.asc())
+        if cursor:
+            query = query.where(key > tuple_(*cursor))
+    else:
+        query = query.where(Show.start_time <= now).order_by(
+            Show.start_time.desc(), Show.id.desc())
+        if cursor:
+            query = query.where(key < tuple_(*cursor))
+    return query.limit(limit)
+
+
+def _cards_json(cards, prefix, upcoming):
+    cards = cards.subquery()
+    fields = []
+    for name in (prefix + '_id', prefix + '_name', prefix + '_image_link',
+                 'start_time', 'show_id', 'series_id'):
+        fields.extend((name, cards.c[name]))
+    if upcoming:
+        order = (cards.c.start_time.asc(), cards.c.show_id.asc())
+    else:
+        order = (cards.c.start_time.desc(), cards.c.show_id.desc())
+    return select(func.coalesce(
+        func.json_agg(aggregate_order_by(func.json_build_object(*fields),
+                                         *order)),
+        text("'[]'::json")
+    )).scalar_subquery()
+
+
+def _next_cursor(cards, limit):
+    if len(cards) > limit:
+        return encode_cursor(cards[limit - 1]['start_time'],
+                             cards[limit - 1]['show_id'])
+    return None
+
+
+def _detail(entity, columns, entity_fk, other, prefix, entity_id, now,
+            limit, fields=None, session=None):
+    now = now or datetime.now()
+
+    def wanted(name):
+        return fields is None or name in fields
+
+    columns = [column for column in columns if wanted(column)]
+    started = started_since_counted(entity_fk, entity_id, now)
+    lists = {}
+    for when, upcoming in (('upcoming', True), ('past', False)):
+        if wanted(when + '_shows') or wanted(when + '_shows_next'):
+            # one card more than shown tells whether there is a next page
+            cards = _card_select(entity_fk, entity_id, other, prefix,
+                                 upcoming, now, limit + 1)
+            lists[when + '_shows'] = type_coerce(
+                _cards_json(cards, prefix, upcoming), JSON)
+        if wanted(when + '_shows_count'):
+            count = getattr(entity, when + '_shows_count')
+            lists[when + '_shows_count'] = \
+                count - started.c.started if upcoming else \
+                count + started.c.started
+
+    # the id tells a missing entity from one with no field selected
+    query = (session or db.session).query(
+        entity.id.label('entity_id'),
+        *[getattr(entity, column) for column in columns],
+        *[value.label(name) for name, value in lists.items()]
+    ).filter(entity.id == entity_id)
+    if wanted('upcoming_shows_count') or wanted('past_shows_count'):
+        query = query.join(started, true())
+    row = query.first()
+    if row is None:
+        return None
+
+    data = {column: getattr(row, column) for column in columns}
+    for when in ('upcoming', 'past'):
+        if when + '_shows' in lists:
+            cards = getattr(row, when + '_shows')
+            for card in cards:
+                # json_agg renders timestamps as ISO 8601 strings
+                card['start_time'] = datetime.fromisoformat(
+                    card['start_time'])
+            if wanted(when + '_shows'):
+                data[when + '_shows'] = cards[:limit]
+            if wanted(when + '_shows_next'):
+                data[when + '_shows_next'] = _next_cursor(cards, limit)
+        if when + '_shows_count' in lists:
+            data[when + '_shows_count'] = getattr(row, when + '_shows_count')
+    return data
+
+
+def _more_cards(entity_fk, other, prefix, entity_id, when, cursor, now,
+                limit, session=None):
+    # a (start_time, show id) cursor, as _next_cursor encodes it
+    check_cursor(cursor, (Show.start_time, Show.id))
+    now = now or datetime.now()
+    rows = (session or db.session).execute(_card_select(
+        entity_fk, entity_id, other, prefix, when == 'upcoming', now,
+        limit + 1, cursor)).mappings().all()
+    cards = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(cards[-1]['start_time'],
+                                    cards[-1]['show_id'])
+    return cards, next_cursor
+
+
+VENUE_DETAIL_COLUMNS = (
+    'id', 'name', 'genres', 'address', 'city', 'state', 'phone', 'website',
+    'facebook_link', 'seeking_talent', 'seeking_description', 'image_link'
+)
+
+ARTIST_DETAIL_COLUMNS = (
+    'id', 'name', 'genres', 'city', 'state', 'phone', 'facebook_link',
+    'seeking_venue', 'seeking_description', 'image_link'
+)
+
+
+def venue_detail(venue_id, limit, now=None, fields=None, session=None):
+    '''
+    venue_detail(venue_id, limit)
+        returns the venue page payload, with artist show cards,
+        or None when the venue does not exist. `fields` (a set) restricts
+        the columns selected and the show lists built.
+    '''
+    return _detail(Venue, VENUE_DETAIL_COLUMNS, Show.venue, Artist, 'artist',
+                   venue_id, now, limit, fields, session)
+
+
+def artist_detail(artist_id, limit, now=None, fields=None, session=None):
+    '''
+    artist_detail(artist_id, limit)
+        returns the artist page payload, with venue show cards,
+        or None when the artist does not exist. `fields` (a set) restricts
+        the columns selected and the show lists built.
+    '''
+    return _detail(Artist, ARTIST_DETAIL_COLUMNS, Show.artist, Venue,
+                   'venue', artist_id, now, limit, fields, session)
+
+
+def venue_show_cards(venue_id, when, cursor, limit, now=None, session=None):
+    '''
+    venue_show_cards(venue_id, when, cursor, limit)
+        returns the next page of a venue's 'upcoming' or 'past' show
+        cards after `cursor`, and the cursor for the page after that.
+    '''
+    return _more_cards(Show.venue, Artist, 'artist', venue_id, when, cursor,
+                       now, limit, session)
+
+
+def artist_show_cards(artist_id, when, cursor, limit, now=None,
+                      session=None):
+    '''
+    artist_show_cards(artist_id, when, cursor, limit)
+        returns the next page of an artist's 'upcoming' or 'past' show
+        cards after `cursor`, and the cursor for the page after that.
+    '''
+    return _more_cards(Show.artist, Venue, 'venue', artist_id, when, cursor,
+                       now, limit, session)
+
+
+# Collections
+# ----------------------------------------------------------------
+# Whole tables for the JSON API. The collection functions build the
+# statement; stream_rows runs it on its own connection with a
+# server-side cursor and yields rows batch by batch, so it does not
+# depend on the request's session staying open while a response streams.
+# Only the requested fields are selected, and the venue/artist tables
+# are joined to Show only when one of their fields is requested.
+
+
+class UnknownField(ValueError):
+    pass
+
+
+def venue_fields():
+    return {
+        'id': Venue.id,
+        'name': Venue.name,
+        'city': Venue.city,
+        'state': Venue.state,
+        'address': Venue.address,
+        'phone': Venue.phone,
+        'genres': Venue.genres,
+        'website': Venue.website,
+        'image_link': Venue.image_link,
+        'facebook_link': Venue.facebook_link,
+        'seeking_talent': Venue.seeking_talent,
+        'seeking_description': Venue.seeking_description,
+        'num_upcoming_shows': Venue.upcoming_shows_count,
+    }
+
+
+def artist_fields():
+    return {
+        'id': Artist.id,
+        'name': Artist.name,
+        'city': Artist.city,
+        'state': Artist.state,
+        'phone': Artist.phone,
+        'genres': Artist.genres,
+        'image_link': Artist.image_link,
+        'facebook_link': Artist.facebook_link,
+        'seeking_venue': Artist.seeking_venue,
+        'seeking_description': Artist.seeking_description,
+    }
+
+
+def show_fields():
+    return {
+        'id': Show.id,
+        'start_time': Show.start_time,
+        'end_time': Show.end_time,
+        'series_id': Show.series,
+        'venue_id': Show.venue,
+        'venue_name': Venue.name,
+        'venue_image_link': Venue.image_link,
+        'artist_id': Show.artist,
+        'artist_name': Artist.name,
+        'artist_image_link': Artist.image_link,
+    }
+
+
+def _selected(available, fields):
+    if not fields:
+        return dict(available)
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise UnknownField(', '.join(unknown))
+    return {field: available[field] for field in fields}
+
+
+def _select(columns, limit):
+    statement = select(*[column.label(name)
+                         for name, column in columns.items()])
+    return statement.limit(limit) if limit else statement
+
+
+def venue_collection(fields=None, limit=None, genre_filter=None,
+                     area_filter=None):
+    '''
+    venue_collection(fields, limit, genre_filter, area_filter)
+        the statement for venues as the requested fields, in listing order.
+    '''
+    return _select(_selected(venue_fields(), fields), limit).select_from(
+        Venue).where(*genre_criteria(Venue, genre_filter),
+                     *area_criteria(Venue, area_filter)).order_by(
+        Venue.state, Venue.city, Venue.name, Venue.id)
+
+
+def artist_collection(fields=None, limit=None, genre_filter=None,
+                      area_filter=None):
+    '''
+    artist_collection(fields, limit, genre_filter, area_filter)
+        the statement for artists as the requested fields, by name.
+    '''
+    return _select(_selected(artist_fields(), fields), limit).select_from(
+        Artist).where(*genre_criteria(Artist, genre_filter),
+                      *area_criteria(Artist, area_filter)).order_by(
+        Artist.name, Artist.id)
+
+
+def show_collection(fields=None, limit=None, start=None, end=None):
+    '''
+    show_collection(fields, limit, start, end)
+        the statement for shows as the requested fields, by start time,
+        optionally only those starting in [start, end).
+    '''
+    columns = _selected(show_fields(), fields)
+    statement = _select(columns, limit).select_from(Show)
+    models = {column.class_ for column in columns.values()
+              if hasattr(column, 'class_')}
+    if Venue in models:
+        statement = statement.outerjoin(Venue, Venue.id == Show.venue)
+    if Artist in models:
+        statement = statement.outerjoin(Artist, Artist.id == Show.artist)
+    return statement.where(*_starting_in(start, end)).order_by(
+        Show.start_time, Show.id)
+
+
+def show_events(entity, entity_id, start=None, end=None):
+    '''
+    show_events(entity, entity_id, start, end)
+        the statement for the calendar events of the Venue or Artist
+        `entity_id`'s shows by start time, optionally only those starting
+        in [start, end); a range scan of its (start_time, id) index.
+    '''
+    fk = Show.venue if entity is Venue else Show.artist
+    return select(
+        Show.id, Show.start_time, Show.end_time, Show.updated_at,
+        Venue.name.label('venue_name'), Venue.address, Venue.city,
+        Venue.state, Artist.name.label('artist_name')
+    ).select_from(Show).join(Venue, Venue.id == Show.venue).join(
+        Artist, Artist.id == Show.artist
+    ).where(fk == entity_id, *_starting_in(start, end)).order_by(
+        Show.start_time, Show.id)
+
+
+def stream_rows(engine, statement, batch_size=1000):
+    '''
+    stream_rows(engine, statement, batch_size)
+        yields the rows of `statement` as dicts, fetched from a
+        server-side cursor `batch_size` rows at a time.
+    '''
+    with engine.connect() as connection:
+        result = connection.execution_options(
+            stream_results=True, max_row_buffer=batch_size
+        ).execute(statement)
+        for rows in result.mappings().partitions(batch_size):
+            for row in rows:
+                yield dict(row)
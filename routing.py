@@ -0,0 +1,135 @@
+import random
+import time
+from flask import current_app, g, request, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#----------------------------------------------------------------------------#
+# Every DATABASE_REPLICA_URLS entry becomes a `replica_<n>` bind (see
+# config.py). Requests to the read-only endpoints below read from one
+# replica chosen for the whole request, whatever their method (the HTML
+# searches are POSTs); everything else, and anything flushed, goes to the
+# primary, so a new endpoint reads from the primary until it is listed.
+# A client whose request committed a write carries a short-lived cookie
+# that sends its reads to the primary too, so it sees its own writes
+# whatever the replication lag.
+#
+# test_routing.py checks this against a primary and a replica database.
+
+REPLICA_PREFIX = 'replica_'
+STICKY_COOKIE = 'fyyur_read_primary'
+READ_ENDPOINTS = frozenset({
+    'index', 'areas', 'venues', 'search_venues', 'show_venue',
+    'venue_shows', 'artists', 'search_artists', 'show_artist',
+    'artist_shows', 'shows'
+})
+# blueprints whose every endpoint only reads
+READ_BLUEPRINTS = frozenset({'api', 'calendars', 'export'})
+
+
+def replica_keys(app=None):
+    binds = (app or current_app).config.get('SQLALCHEMY_BINDS') or {}
+    return sorted(key for key in binds if key.startswith(REPLICA_PREFIX))
+
+
+def read_bind_key():
+    '''
+    read_bind_key()
+        the replica bind this request reads from, or None for the primary.
+    '''
+    if not has_request_context():
+        return None
+    return g.get('read_bind_key')
+
+
+def read_engine():
+    '''
+    read_engine()
+        the engine reads of this request should use, for work done outside
+        the session (e.g. queries.stream_rows).
+    '''
+    return current_app.extensions['sqlalchemy'].engines[read_bind_key()]
+
+
+class RoutingSession(Session):
+    '''
+    RoutingSession
+        db.session class sending the reads of replica-routed requests to
+        their replica. Models with an explicit bind key and any flush keep
+        Flask-SQLAlchemy's usual choice of engine.
+    '''
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind,
+                                  **kwargs)
+        key = read_bind_key()
+        # only what would go to the default (primary) engine is rerouted
+        if key is None or bind is not None or self._flushing or \
+                engine is not self._db.engine:
+            return engine
+        return self._db.engines[key]
+
+
+# A request wrote once a transaction that flushed or ran an INSERT,
+# UPDATE or DELETE commits; see stick_to_primary.
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _flushed(session, flush_context):
+    session.info['writing'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _executing(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or \
+            orm_execute_state.is_delete:
+        orm_execute_state.session.info['writing'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _committed(session):
+    if session.info.pop('writing', False) and has_request_context():
+        g.committed_write = True
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _rolled_back(session):
+    session.info.pop('writing', None)
+
+
+def is_read_endpoint(endpoint):
+    '''
+    is_read_endpoint(endpoint)
+        whether the view `endpoint` only reads, and may use a replica.
+    '''
+    if endpoint is None:
+        return False
+    blueprint, _, _ = endpoint.rpartition('.')
+    return endpoint in READ_ENDPOINTS or blueprint in READ_BLUEPRINTS
+
+
+def init_routing(app):
+    '''
+    init_routing(app)
+        routes the reads of the read-only endpoints to a replica and
+        makes clients that commit a write stick to the primary for
+        READ_YOUR_WRITES_SECONDS afterwards. A no-op without replicas.
+    '''
+    keys = replica_keys(app)
+    if not keys:
+        return
+
+    @app.before_request
+    def choose_read_bind():
+        if is_read_endpoint(request.endpoint) and \
+                STICKY_COOKIE not in request.cookies:
+            g.read_bind_key = random.choice(keys)
+
+    @app.after_request
+    def stick_to_primary(response):
+        window = app.config['READ_YOUR_WRITES_SECONDS']
+        if g.get('committed_write') and window:
+            response.set_cookie(STICKY_COOKIE, str(int(time.time())),
+                                max_age=window, httponly=True,
+                                samesite='Lax')
+        return response
@@ -0,0 +1,88 @@
+from sqlalchemy import func, literal, or_
+from model import db, Venue, Artist
+from facets import genre_criteria
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+# Venues and artists are matched on name, city and genres and ranked by
+# trigram word similarity, name matches first. Every predicate is served
+# by the pg_trgm GIN indexes (see migration 9a4c1e6f2d83):
+#   - the default mode is a case-insensitive partial match (ILIKE),
+#   - the typo-tolerant mode matches on word similarity (`term <% column`),
+#     so "jaz" finds "Jazz" and "musicla" finds "Musical".
+# The total match count comes from a window over the same statement.
+# An optional GenreFilter (see facets.py) narrows the matches.
+
+# Rank weights per matched field.
+NAME_WEIGHT = 1.0
+CITY_WEIGHT = 0.6
+GENRES_WEIGHT = 0.4
+
+
+def genres_text(genres):
+    '''
+    genres_text(genres)
+        the genres array as one string; an IMMUTABLE SQL function created
+        by the search migration so it can be indexed.
+    '''
+    return func.fyyur_genres_text(genres)
+
+
+def _like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%') \
+        .replace('_', '\\_')
+    return '%{}%'.format(escaped)
+
+
+def _search(entity, term, fuzzy, limit, genre_filter=None, session=None):
+    term = (term or '').strip()
+    fields = ((entity.name, NAME_WEIGHT),
+              (entity.city, CITY_WEIGHT),
+              (genres_text(entity.genres), GENRES_WEIGHT))
+
+    if fuzzy:
+        matches = [literal(term).op('<%')(field) for field, _ in fields]
+    else:
+        pattern = _like_pattern(term)
+        matches = [field.ilike(pattern, escape='\\') for field, _ in fields]
+    rank = func.greatest(*[func.word_similarity(term, field) * weight
+                           for field, weight in fields])
+
+    rows = (session or db.session).query(
+        entity.id,
+        entity.name,
+        func.count().over().label('total')
+    ).filter(
+        or_(*matches), *genre_criteria(entity, genre_filter)
+    ).order_by(
+        rank.desc(), entity.name, entity.id
+    ).limit(limit).all()
+
+    return {
+        "count": rows[0].total if rows else 0,
+        "data": [{
+            "id": row.id,
+            "name": row.name,
+        } for row in rows]
+    }
+
+
+def venue_search(term, fuzzy=False, limit=50, genre_filter=None,
+                 session=None):
+    '''
+    venue_search(term, fuzzy, limit, genre_filter)
+        returns {"count", "data"} for the venues matching `term`, best
+        match first, at most `limit` of them.
+    '''
+    return _search(Venue, term, fuzzy, limit, genre_filter, session)
+
+
+def artist_search(term, fuzzy=False, limit=50, genre_filter=None,
+                  session=None):
+    '''
+    artist_search(term, fuzzy, limit, genre_filter)
+        returns {"count", "data"} for the artists matching `term`, best
+        match first, at most `limit` of them.
+    '''
+    return _search(Artist, term, fuzzy, limit, genre_filter, session)
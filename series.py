@@ -0,0 +1,229 @@
+import calendar
+from collections import namedtuple
+from datetime import datetime, timedelta
+from itertools import count as counting
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from model import db, Show, ShowSeries, bump_table_versions
+from bookings import DEFAULT_DURATION, booked_entity, end_time, \
+    find_conflicts
+from counters import adjust_show_counters
+
+#----------------------------------------------------------------------------#
+# Show series.
+#----------------------------------------------------------------------------#
+# A weekly residency is one ShowSeries rather than dozens of show
+# submissions. The new show form takes a recurrence rule, weekly or
+# monthly, for a number of shows or until a date; the series is expanded
+# here, checked against the venue's and artist's bookings in one query
+# (bookings.find_conflicts) and its shows written by one multi-row
+# INSERT, all in the caller's transaction. A monthly series keeps its
+# day of the month and skips the months without it, as RFC 5545 does.
+#
+# Editing a series replaces its upcoming shows with those of the new
+# rule; cancelling it removes them. Past shows are left as they were.
+# These writes bypass the ORM, so they adjust the show counters and
+# table versions themselves, as bulk imports do.
+
+FREQUENCIES = ('weekly', 'monthly')
+
+Recurrence = namedtuple('Recurrence', ['frequency', 'count', 'until'])
+
+
+class InvalidSeries(ValueError):
+    pass
+
+
+class SeriesConflict(Exception):
+    '''
+    SeriesConflict
+        shows of a series would double-book its venue or artist;
+        `conflicts` are their BookingConflicts, if known.
+    '''
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super(SeriesConflict, self).__init__(self.message())
+
+    def message(self):
+        if not self.conflicts:
+            return 'The venue or artist is already booked at one of ' \
+                'those times.'
+        message = ' '.join(str(conflict) for conflict in self.conflicts[:3])
+        if len(self.conflicts) > 3:
+            message += ' {} more shows conflict.'.format(
+                len(self.conflicts) - 3)
+        return message
+
+
+def parse_recurrence(frequency, count, until):
+    '''
+    parse_recurrence(frequency, count, until)
+        the Recurrence given by the repeat, count and until fields of the
+        show form, or None for a single show.
+    '''
+    if not frequency:
+        return None
+    if frequency not in FREQUENCIES:
+        raise InvalidSeries('Repeat must be weekly or monthly.')
+    if not count and not until:
+        raise InvalidSeries('A series needs a number of shows or an end '
+                            'date.')
+    return Recurrence(frequency, count or None, until or None)
+
+
+def _shifted(start_time, frequency, n):
+    # the n-th start of a series, None for a month without its day
+    if frequency == 'weekly':
+        return start_time + timedelta(weeks=n)
+    months = start_time.month - 1 + n
+    year, month = start_time.year + months // 12, months % 12 + 1
+    if start_time.day > calendar.monthrange(year, month)[1]:
+        return None
+    return start_time.replace(year=year, month=month)
+
+
+def occurrences(start_time, recurrence, limit):
+    '''
+    occurrences(start_time, recurrence, limit)
+        the start times of the shows of a series starting at
+        `start_time`. Raises InvalidSeries past `limit` shows.
+    '''
+    starts = []
+    for n in counting():
+        start = _shifted(start_time, recurrence.frequency, n)
+        if start is None:
+            continue
+        if recurrence.until and start.date() > recurrence.until or \
+                recurrence.count and len(starts) == recurrence.count:
+            return starts
+        if len(starts) == limit:
+            raise InvalidSeries('A series holds at most {} shows.'
+                                .format(limit))
+        starts.append(start)
+
+
+def _slots(series):
+    starts = occurrences(
+        series.start_time,
+        Recurrence(series.frequency, series.count, series.until),
+        current_app.config['SERIES_MAX_SHOWS'])
+    if not starts:
+        raise InvalidSeries('The series ends before its first show.')
+    return [(start, end_time(start, series.duration)) for start in starts]
+
+
+def _add_shows(series, slots, session):
+    if not slots:
+        return
+    conflicts = find_conflicts(series.venue, series.artist, slots,
+                               series.id, session)
+    if conflicts:
+        raise SeriesConflict(conflicts)
+    try:
+        # one statement; a savepoint keeps the transaction usable to
+        # look up what was booked since the check
+        with session.begin_nested():
+            session.execute(insert(Show.__table__).values([{
+                'venue': series.venue,
+                'artist': series.artist,
+                'start_time': start,
+                'end_time': end,
+                'series': series.id
+            } for start, end in slots]))
+    except IntegrityError as error:
+        if booked_entity(error) is None:
+            raise
+        raise SeriesConflict(find_conflicts(
+            series.venue, series.artist, slots, series.id, session))
+    connection = session.connection()
+    adjust_show_counters(connection, (
+        (series.venue, series.artist, start, 1) for start, end in slots))
+    bump_table_versions(connection, ['Show'])
+
+
+def _remove_upcoming(series, now, session):
+    table = Show.__table__
+    removed = session.execute(table.delete().where(
+        table.c.series == series.id, table.c.start_time > now
+    ).returning(table.c.venue, table.c.artist, table.c.start_time)).all()
+    if removed:
+        connection = session.connection()
+        adjust_show_counters(connection, (
+            (venue, artist, start, -1) for venue, artist, start in removed))
+        bump_table_versions(connection, ['Show'])
+    return len(removed)
+
+
+def create_series(venue_id, artist_id, start_time, duration, recurrence,
+                  session=None):
+    '''
+    create_series(venue_id, artist_id, start_time, duration, recurrence)
+        adds a ShowSeries and all its shows, each running `duration`
+        minutes. Raises SeriesConflict if one would double-book the
+        venue or artist. Returns the series and its number of shows;
+        the caller commits.
+    '''
+    session = session or db.session
+    series = ShowSeries(venue=int(venue_id), artist=int(artist_id),
+                        frequency=recurrence.frequency,
+                        start_time=start_time,
+                        duration=duration or DEFAULT_DURATION,
+                        count=recurrence.count, until=recurrence.until)
+    slots = _slots(series)
+    session.add(series)
+    session.flush()
+    _add_shows(series, slots, session)
+    return series, len(slots)
+
+
+def edit_series(series, venue_id, artist_id, start_time, duration,
+                recurrence, now=None, session=None):
+    '''
+    edit_series(series, venue_id, artist_id, start_time, duration,
+                recurrence, now)
+        gives `series` a new venue, artist, rule and duration, replacing
+        its upcoming shows with those of the new rule still to come.
+        Raises SeriesConflict as create_series does. Returns the number
+        of upcoming shows; the caller commits.
+    '''
+    if series.cancelled_at is not None:
+        raise InvalidSeries('The series was cancelled.')
+    session = session or db.session
+    now = now or datetime.now()
+    series.venue = int(venue_id)
+    series.artist = int(artist_id)
+    series.frequency = recurrence.frequency
+    series.start_time = start_time
+    series.duration = duration or DEFAULT_DURATION
+    series.count = recurrence.count
+    series.until = recurrence.until
+    slots = [slot for slot in _slots(series) if slot[0] > now]
+    _remove_upcoming(series, now, session)
+    _add_shows(series, slots, session)
+    return len(slots)
+
+
+def cancel_series(series, now=None, session=None):
+    '''
+    cancel_series(series, now)
+        removes the upcoming shows of `series` and marks it cancelled.
+        Returns the number of shows removed; the caller commits.
+    '''
+    removed = _remove_upcoming(series, now or datetime.now(),
+                               session or db.session)
+    series.cancelled_at = datetime.utcnow()
+    return removed
+
+
+def upcoming_shows(series, now=None, session=None):
+    '''
+    upcoming_shows(series, now)
+        the (start_time, end_time) of the shows of `series` still to
+        come, soonest first.
+    '''
+    return (session or db.session).query(
+        Show.start_time, Show.end_time
+    ).filter(Show.series == series.id,
+             Show.start_time > (now or datetime.now())).order_by(
+        Show.start_time).all()
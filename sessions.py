@@ -0,0 +1,263 @@
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from flask.sessions import SecureCookieSession, SessionInterface, \
+    session_json_serializer
+from itsdangerous import BadSignature, Signer
+from sqlalchemy.dialects.postgresql import insert
+from model import db, WebSession
+
+#----------------------------------------------------------------------------#
+# Sessions.
+#----------------------------------------------------------------------------#
+# Flask keeps the session (flashed messages, the forms' CSRF token) in a
+# cookie signed with SECRET_KEY, so every worker must share the key (see
+# config.py). With SESSION_BACKEND set, the data moves server side and
+# the cookie carries only a signed random session id:
+#   'file'     - one file per session under SESSION_PATH, for the
+#                workers of one host
+#   'sqlite'   - a SQLite file at SESSION_PATH, for the workers of one
+#                host
+#   'database' - the WebSession table on the primary, for every node
+#   None       - signed cookie sessions
+#
+# A session is stored only when it changes, and for
+# PERMANENT_SESSION_LIFETIME; `flask sessions purge` removes the expired
+# ones.
+
+
+class FileStore(object):
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sid):
+        return os.path.join(self.directory, sid)
+
+    def get(self, sid):
+        try:
+            with open(self._path(sid), encoding='utf-8') as f:
+                expires = float(f.readline())
+                data = f.read()
+        except (FileNotFoundError, ValueError):
+            return None
+        if expires <= time.time():
+            self.delete(sid)
+            return None
+        return data
+
+    def set(self, sid, data, expires):
+        path = self._path(sid)
+        # written whole, so another worker never reads half a session
+        temporary = '{}.{}.tmp'.format(path, threading.get_ident())
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write('{}\n{}'.format(expires, data))
+        os.replace(temporary, path)
+
+    def delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except FileNotFoundError:
+            pass
+
+    def purge(self):
+        purged = 0
+        for sid in os.listdir(self.directory):
+            if not sid.endswith('.tmp') and self.get(sid) is None:
+                purged += 1
+        return purged
+
+
+class SqliteStore(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                'id TEXT PRIMARY KEY, data TEXT NOT NULL, '
+                'expires REAL NOT NULL)')
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS sessions_expires '
+                'ON sessions(expires)')
+
+    def _connect(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+        return connection
+
+    def get(self, sid):
+        row = self._connect().execute(
+            'SELECT data FROM sessions WHERE id = ? AND expires > ?',
+            (sid, time.time())).fetchone()
+        return row and row[0]
+
+    def set(self, sid, data, expires):
+        with self._connect() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)',
+                (sid, data, expires))
+
+    def delete(self, sid):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM sessions WHERE id = ?', (sid,))
+
+    def purge(self):
+        with self._connect() as connection:
+            return connection.execute(
+                'DELETE FROM sessions WHERE expires <= ?',
+                (time.time(),)).rowcount
+
+
+class DatabaseStore(object):
+    # on its own connection to the primary, outside the request's ORM
+    # session and its replica routing
+
+    table = WebSession.__table__
+
+    def get(self, sid):
+        with db.engine.connect() as connection:
+            return connection.execute(
+                self.table.select().with_only_columns(self.table.c.data)
+                .where(self.table.c.id == sid,
+                       self.table.c.expires_at > datetime.utcnow())
+            ).scalar()
+
+    def set(self, sid, data, expires):
+        expires_at = datetime.utcfromtimestamp(expires)
+        statement = insert(self.table).values(
+            id=sid, data=data, expires_at=expires_at)
+        with db.engine.begin() as connection:
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=[self.table.c.id],
+                set_={'data': data, 'expires_at': expires_at}))
+
+    def delete(self, sid):
+        with db.engine.begin() as connection:
+            connection.execute(
+                self.table.delete().where(self.table.c.id == sid))
+
+    def purge(self):
+        with db.engine.begin() as connection:
+            return connection.execute(self.table.delete().where(
+                self.table.c.expires_at <= datetime.utcnow())).rowcount
+
+
+class ServerSession(SecureCookieSession):
+    '''
+    ServerSession
+        a session whose data lives in a store under `sid`.
+    '''
+    def __init__(self, initial=None, sid=None, new=False):
+        super(ServerSession, self).__init__(initial)
+        self.sid = sid
+        self.new = new
+
+
+class ServerSessionInterface(SessionInterface):
+    '''
+    ServerSessionInterface
+        keeps session data in `store`, keyed by the signed id in the
+        session cookie.
+    '''
+    salt = 'fyyur-session'
+
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=self.salt)
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode('ascii')
+            except BadSignature:
+                sid = None
+            data = sid and self.store.get(sid)
+            if data is not None:
+                return ServerSession(session_json_serializer.loads(data), sid)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not self.should_set_cookie(app, session):
+            return
+        self.store.set(
+            session.sid, session_json_serializer.dumps(dict(session)),
+            time.time() + app.permanent_session_lifetime.total_seconds())
+        response.set_cookie(
+            name, self._signer(app).sign(session.sid).decode('ascii'),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain, path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app))
+
+
+def session_store(app):
+    backend = app.config.get('SESSION_BACKEND')
+    path = app.config.get('SESSION_PATH')
+    if backend == 'file':
+        return FileStore(path or os.path.join(app.instance_path, 'sessions'))
+    if backend == 'sqlite':
+        path = path or os.path.join(app.instance_path, 'sessions.sqlite3')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return SqliteStore(path)
+    if backend == 'database':
+        return DatabaseStore()
+    if backend:
+        raise ValueError('Unknown SESSION_BACKEND ' + repr(backend))
+    return None
+
+
+def init_sessions(app):
+    '''
+    init_sessions(app)
+        checks the secret key of `app` and gives it the SESSION_BACKEND
+        store. In DEPLOYMENT mode a missing key is an error; otherwise
+        the process gets a random one, good for a single worker only.
+    '''
+    if not app.secret_key:
+        if app.config.get('DEPLOYMENT'):
+            raise RuntimeError(
+                'FYYUR_DEPLOYMENT needs a SECRET_KEY shared by every worker: '
+                'set FYYUR_SECRET_KEY or FYYUR_SECRET_KEY_FILE')
+        app.secret_key = os.urandom(32)
+    store = session_store(app)
+    if store is not None:
+        app.session_interface = ServerSessionInterface(store)
+    app.cli.add_command(sessions_cli)
+
+
+sessions_cli = AppGroup('sessions')
+
+
+@sessions_cli.command('purge', help='Delete expired server-side sessions.')
+def purge_command():
+    interface = current_app.session_interface
+    if not isinstance(interface, ServerSessionInterface):
+        raise click.UsageError('SESSION_BACKEND is not set.')
+    click.echo('Purged {} expired sessions.'.format(interface.store.purge()))
@@ -2,3 +2,16 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// "Load more" on venue and artist pages: swap the link for the next page
+// of show cards (which carries its own link when there are more).
+document.addEventListener('click', function(event) {
+  var link = event.target.closest && event.target.closest('.load-more-link');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  fetch(link.href)
+    .then(function(res) { return res.text(); })
+    .then(function(html) { link.parentNode.outerHTML = html; });
+});
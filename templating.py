@@ -0,0 +1,57 @@
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from jinja2 import FileSystemBytecodeCache
+
+#----------------------------------------------------------------------------#
+# Template compilation.
+#----------------------------------------------------------------------------#
+# Jinja compiles a template to Python the first time a worker renders
+# it. With JINJA_BYTECODE_CACHE the compiled code is kept on disk, in
+# JINJA_BYTECODE_CACHE_DIR (jinja's per-user temp directory by default),
+# where every worker of the host finds it; entries are keyed by a hash
+# of the template source, so an edited template is compiled afresh.
+# `flask templates warm` compiles every template into the cache ahead
+# of the first request, e.g. as a deploy step.
+
+TEMPLATE_EXTENSIONS = ('.html',)
+
+
+def init_templates(app):
+    '''
+    init_templates(app)
+        gives `app` the bytecode cache and the `flask templates` commands.
+    '''
+    if app.config.get('JINJA_BYTECODE_CACHE'):
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(
+            app.config.get('JINJA_BYTECODE_CACHE_DIR'))
+    app.cli.add_command(templates_cli)
+
+
+def warm_templates(app):
+    '''
+    warm_templates(app)
+        compiles every template of `app` (and so fills the bytecode
+        cache); returns their names.
+    '''
+    names = [name for name in app.jinja_env.list_templates()
+             if name.endswith(TEMPLATE_EXTENSIONS)]
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
+
+
+templates_cli = AppGroup('templates')
+
+
+@templates_cli.command('warm', help='Compile every template into the '
+                       'bytecode cache.')
+def warm_command():
+    if current_app.jinja_env.bytecode_cache is None:
+        click.echo('JINJA_BYTECODE_CACHE is off; nothing would be kept.',
+                   err=True)
+    started = time.perf_counter()
+    names = warm_templates(current_app)
+    click.echo('Warmed {} templates in {:.0f} ms.'.format(
+        len(names), (time.perf_counter() - started) * 1000))
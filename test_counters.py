@@ -0,0 +1,105 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from dbtest import DatabaseTestCase
+from model import db, Venue, Artist, Show, CounterWatermark
+from counters import rollover
+from queries import venue_detail, artist_detail
+import conditional
+
+#----------------------------------------------------------------------------#
+# Show counter tests.
+#----------------------------------------------------------------------------#
+# A venue and an artist share a show that started after the counters'
+# last rollover and one that is still to come. The detail pages list the
+# started show as past and count it so, whether rollover is an hour late
+# or has never run. Needs FYYUR_TEST_DATABASE_URL (see dbtest.py).
+
+
+class ShowCountersTestCase(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.venue = Venue(name='The Musical Hop', city='San Francisco',
+                           state='CA', address='1015 Folsom Street',
+                           phone='123-123-1234', genres=['Jazz'])
+        self.artist = Artist(name='Guns N Petals', city='San Francisco',
+                             state='CA', phone='326-123-5000',
+                             genres=['Rock n Roll'])
+        db.session.add_all((self.venue, self.artist))
+        db.session.commit()
+
+    def add_show(self, start_time):
+        db.session.add(Show(venue=self.venue.id, artist=self.artist.id,
+                            start_time=start_time,
+                            end_time=start_time + timedelta(hours=2)))
+        db.session.commit()
+
+    def add_shows(self):
+        now = datetime.now()
+        self.started = now - timedelta(minutes=30)
+        self.upcoming = now + timedelta(days=1)
+        self.add_show(self.started)
+        self.add_show(self.upcoming)
+
+    def assert_split(self, data):
+        self.assertEqual([card['start_time'] for card in data['past_shows']],
+                         [self.started])
+        self.assertEqual(
+            [card['start_time'] for card in data['upcoming_shows']],
+            [self.upcoming])
+        self.assertEqual(data['past_shows_count'], 1)
+        self.assertEqual(data['upcoming_shows_count'], 1)
+
+    def test_started_show_is_past_before_rollover(self):
+        rollover(db.session.connection(),
+                 now=datetime.now() - timedelta(hours=1))
+        db.session.commit()
+        self.add_shows()
+        # the counters have not caught up
+        db.session.refresh(self.venue)
+        self.assertEqual((self.venue.upcoming_shows_count,
+                          self.venue.past_shows_count), (2, 0))
+        self.assert_split(venue_detail(self.venue.id, limit=10))
+        self.assert_split(artist_detail(self.artist.id, limit=10))
+
+    def test_started_show_is_past_without_a_watermark(self):
+        self.add_shows()
+        CounterWatermark.query.delete()
+        db.session.commit()
+        self.assert_split(venue_detail(self.venue.id, limit=10))
+
+    def test_started_show_is_past_after_rollover(self):
+        self.add_shows()
+        rollover(db.session.connection())
+        db.session.commit()
+        db.session.refresh(self.venue)
+        self.assertEqual((self.venue.upcoming_shows_count,
+                          self.venue.past_shows_count), (1, 1))
+        self.assert_split(venue_detail(self.venue.id, limit=10))
+
+    def test_counts_alone(self):
+        self.add_shows()
+        data = venue_detail(self.venue.id, limit=10,
+                            fields={'upcoming_shows_count'})
+        self.assertEqual(data, {'upcoming_shows_count': 1})
+
+    def test_validators_change_when_a_show_starts(self):
+        now = datetime.now()
+        self.add_show(now + timedelta(hours=1))
+
+        class Later(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return now + timedelta(hours=2)
+
+        with self.app.test_request_context('/venues/1'):
+            before = conditional.venue_validators(self.venue.id)
+            with mock.patch.object(conditional, 'datetime', Later):
+                after = conditional.venue_validators(self.venue.id)
+        self.assertNotEqual(before[0], after[0])
+        self.assertGreater(after[1], before[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from dbtest import DatabaseTestCase
+from model import db, Venue, Artist, Show, Area, GenreCount, \
+    ImportProgress
+import importer
+
+#----------------------------------------------------------------------------#
+# Bulk import tests.
+#----------------------------------------------------------------------------#
+# `flask import` runs on NDJSON files in a temporary directory: names
+# repeated within a batch, a run that fails part way and is run again,
+# and show rows the database or the checks refuse, which go to the
+# rejects file while the rest of the batch is written. Needs
+# FYYUR_TEST_DATABASE_URL (see dbtest.py).
+
+
+def venue_row(name, city='San Francisco', genres='Jazz'):
+    return {'name': name, 'city': city, 'state': 'CA',
+            'address': '1015 Folsom Street', 'phone': '123-123-1234',
+            'genres': genres, 'website': 'https://example.com',
+            'image_link': 'https://example.com/venue.png',
+            'facebook_link': 'https://www.facebook.com/venue'}
+
+
+def artist_row(name):
+    return {'name': name, 'city': 'San Francisco', 'state': 'CA',
+            'phone': '326-123-5000', 'genres': 'Rock n Roll',
+            'image_link': 'https://example.com/artist.png',
+            'facebook_link': 'https://www.facebook.com/artist'}
+
+
+class ImporterTestCase(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    def run_import(self, kind, rows, batch_size=100, restart=False):
+        path = os.path.join(self.directory, kind + '.ndjson')
+        with open(path, 'w', encoding='utf-8') as source:
+            for row in rows:
+                source.write(json.dumps(row, default=str) + '\n')
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            importer.run_import(kind, path, None, batch_size, None, restart)
+        return output.getvalue()
+
+    def rejects(self, kind):
+        path = os.path.join(self.directory, kind + '.ndjson.rejects.ndjson')
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding='utf-8') as rejects:
+            return [json.loads(line) for line in rejects]
+
+    def test_names_repeated_within_a_batch(self):
+        self.run_import('venues', [
+            venue_row('The Musical Hop', city='Oakland'),
+            venue_row('Park Square'),
+            venue_row('The Musical Hop', city='Berkeley', genres='Folk')])
+        self.assertEqual(
+            sorted(db.session.query(Venue.name, Venue.city)),
+            [('Park Square', 'San Francisco'),
+             ('The Musical Hop', 'Berkeley')])
+        rejects = self.rejects('venues')
+        self.assertEqual([reject['row'] for reject in rejects], [1])
+        self.assertEqual(rejects[0]['errors'],
+                         {'name': ['replaced by a later row of this batch']})
+        # only the rows written are counted
+        self.assertEqual(
+            sorted(db.session.query(Area.city, Area.venue_count).filter(
+                Area.venue_count > 0)),
+            [('Berkeley', 1), ('San Francisco', 1)])
+        self.assertEqual(
+            sorted(db.session.query(GenreCount.genre, GenreCount.count)
+                   .filter(GenreCount.kind == 'Venue',
+                           GenreCount.count > 0)),
+            [('Folk', 1), ('Jazz', 1)])
+
+    def test_names_repeated_across_batches(self):
+        self.run_import('artists', [artist_row('Guns N Petals'),
+                                    artist_row('Matt Quevedo'),
+                                    dict(artist_row('Guns N Petals'),
+                                         city='Oakland')], batch_size=2)
+        self.assertEqual(self.rejects('artists'), [])
+        self.assertEqual(
+            sorted(db.session.query(Artist.name, Artist.city)),
+            [('Guns N Petals', 'Oakland'),
+             ('Matt Quevedo', 'San Francisco')])
+
+    def add_venue_and_artist(self):
+        venue = Venue(**dict(venue_row('The Musical Hop'), genres=['Jazz']))
+        artist = Artist(**dict(artist_row('Guns N Petals'),
+                               genres=['Rock n Roll']))
+        db.session.add_all((venue, artist))
+        db.session.commit()
+        return venue.id, artist.id
+
+    def show_rows(self, count):
+        start = datetime(2030, 1, 7, 20)
+        return [{'venue': 'The Musical Hop', 'artist': 'Guns N Petals',
+                 'start_time': start + timedelta(days=n)}
+                for n in range(count)]
+
+    def test_resumes_after_a_failed_batch(self):
+        self.add_venue_and_artist()
+        rows = self.show_rows(5)
+        bump_table_versions = importer.bump_table_versions
+        batches = []
+
+        def fail_second_batch(connection, tables):
+            batches.append(tables)
+            if len(batches) == 2:
+                raise RuntimeError('lost the connection')
+            bump_table_versions(connection, tables)
+
+        with mock.patch.object(importer, 'bump_table_versions',
+                               fail_second_batch):
+            with self.assertRaises(RuntimeError):
+                self.run_import('shows', rows, batch_size=2)
+        self.assertEqual(db.session.query(Show).count(), 2)
+        self.assertEqual(db.session.query(ImportProgress.rows_done).scalar(),
+                         2)
+
+        output = self.run_import('shows', rows, batch_size=2)
+        self.assertIn('Resuming', output)
+        self.assertIn('Done: 3 imported, 0 rejected', output)
+        self.assertEqual(
+            [show.start_time for show in
+             db.session.query(Show).order_by(Show.start_time)],
+            [row['start_time'] for row in rows])
+        self.assertEqual(self.rejects('shows'), [])
+        self.assertEqual(db.session.query(ImportProgress.rows_done).scalar(),
+                         5)
+
+        # --restart reads the file from the start: all booked by now
+        output = self.run_import('shows', rows, batch_size=2, restart=True)
+        self.assertIn('Done: 0 imported, 5 rejected', output)
+
+    def test_unknown_ids_are_rejected(self):
+        venue_id, artist_id = self.add_venue_and_artist()
+        start = datetime(2030, 1, 7, 20)
+        self.run_import('shows', [
+            {'venue_id': venue_id, 'artist_id': artist_id,
+             'start_time': start},
+            {'venue_id': venue_id + 100, 'artist_id': artist_id,
+             'start_time': start + timedelta(days=1)},
+            {'venue_id': venue_id, 'artist_id': 'Guns N Petals',
+             'start_time': start + timedelta(days=2)},
+            {'venue': 'Nowhere', 'artist_id': artist_id,
+             'start_time': start + timedelta(days=3)},
+            {'venue_id': venue_id, 'artist_id': artist_id,
+             'start_time': start + timedelta(days=4)}])
+        self.assertEqual(
+            [show.start_time for show in
+             db.session.query(Show).order_by(Show.start_time)],
+            [start, start + timedelta(days=4)])
+        rejects = self.rejects('shows')
+        self.assertEqual([reject['row'] for reject in rejects], [2, 3, 4])
+        self.assertEqual([sorted(reject['errors']) for reject in rejects],
+                         [['venue_id'], ['artist_id'], ['venue_id']])
+        self.assertEqual(rejects[0]['errors']['venue_id'],
+                         ['unknown or missing venue'])
+
+    def test_double_bookings_are_rejected_and_not_counted(self):
+        venue_id, artist_id = self.add_venue_and_artist()
+        start = datetime(2030, 1, 7, 20)
+        db.session.add(Show(venue=venue_id, artist=artist_id,
+                            start_time=start,
+                            end_time=start + timedelta(hours=2)))
+        db.session.commit()
+        show = {'venue_id': venue_id, 'artist_id': artist_id}
+        self.run_import('shows', [
+            dict(show, start_time=start + timedelta(hours=1)),
+            dict(show, start_time=start + timedelta(days=1)),
+            # the same show twice in one batch
+            dict(show, start_time=start + timedelta(days=2)),
+            dict(show, start_time=start + timedelta(days=2))])
+        self.assertEqual([reject['row'] for reject in self.rejects('shows')],
+                         [1, 4])
+        self.assertEqual(db.session.query(Show).count(), 3)
+        for model in (Venue, Artist):
+            self.assertEqual(db.session.query(
+                model.upcoming_shows_count + model.past_shows_count
+            ).scalar(), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
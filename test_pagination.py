@@ -0,0 +1,171 @@
+import base64
+import unittest
+from datetime import datetime, timedelta
+from dbtest import DatabaseTestCase
+from model import db, Venue, Artist, Show
+from pagination import InvalidCursor, check_cursor, decode_cursor, \
+    encode_cursor
+from queries import show_listing, venue_detail, venue_show_cards
+
+#----------------------------------------------------------------------------#
+# Keyset pagination tests.
+#----------------------------------------------------------------------------#
+# Cursors round-trip and refuse anything they did not encode. The show
+# listing, many of whose shows start at the same time, is walked page by
+# page in both directions; that and the 400s of the routes for bad
+# cursors need FYYUR_TEST_DATABASE_URL (see dbtest.py).
+
+
+def raw_cursor(raw):
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+class CursorTestCase(unittest.TestCase):
+
+    def test_round_trip(self):
+        key = (datetime(2030, 1, 7, 20, 30), 42)
+        self.assertEqual(decode_cursor(encode_cursor(*key)), key)
+        key = ('CA', 'San Francisco', 'The "Hop" / Folsom', 7)
+        self.assertEqual(decode_cursor(encode_cursor(*key)), key)
+
+    def test_garbage(self):
+        for cursor in ('', 'not a cursor!', raw_cursor(b'[1,'),
+                       raw_cursor(b'5'), raw_cursor(b'[{"t":"soon"}]'),
+                       raw_cursor(b'[{"x":1}]'), raw_cursor(b'\xff\xfe')):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+    def test_cursor_must_fit_the_key(self):
+        key = (Show.start_time, Show.id)
+        check_cursor((datetime(2030, 1, 7), 1), key)
+        for cursor in ((datetime(2030, 1, 7),),
+                       (datetime(2030, 1, 7), 1, 2),
+                       ('2030-01-07', 1),
+                       (datetime(2030, 1, 7), '1'),
+                       (datetime(2030, 1, 7), None),
+                       (datetime(2030, 1, 7), True),
+                       (datetime(2030, 1, 7), [1])):
+            with self.assertRaises(InvalidCursor):
+                check_cursor(cursor, key)
+        with self.assertRaises(InvalidCursor):
+            check_cursor(('Hop\x00', 1), (Venue.name, Venue.id))
+
+
+class ShowListingTestCase(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        venues = [Venue(name='Venue {}'.format(n), city='San Francisco',
+                        state='CA', address='1015 Folsom Street',
+                        phone='123-123-1234', genres=['Jazz'])
+                  for n in range(8)]
+        artists = [Artist(name='Artist {}'.format(n), city='San Francisco',
+                          state='CA', phone='326-123-5000', genres=['Jazz'])
+                   for n in range(8)]
+        db.session.add_all(venues + artists)
+        db.session.flush()
+        self.start = datetime(2030, 5, 1, 20)
+        # seven shows at once, and one before and after them
+        starts = [self.start - timedelta(days=1)] + [self.start] * 7 + \
+            [self.start + timedelta(days=1)]
+        for n, start_time in enumerate(starts):
+            db.session.add(Show(venue=venues[n % 8].id,
+                                artist=artists[n % 8].id,
+                                start_time=start_time,
+                                end_time=start_time + timedelta(hours=2)))
+        db.session.commit()
+        self.shows = [(show.start_time, show.venue) for show in
+                      db.session.query(Show).order_by(Show.start_time,
+                                                      Show.id)]
+
+    def keys(self, page):
+        return [(item['start_time'], item['venue_id'])
+                for item in page.items]
+
+    def test_first_page(self):
+        page = show_listing(3)
+        self.assertEqual(self.keys(page), self.shows[:3])
+        self.assertIsNone(page.prev_cursor)
+        self.assertIsNotNone(page.next_cursor)
+
+    def test_forwards_and_backwards(self):
+        for size in (1, 2, 3, 9, 10):
+            pages = [show_listing(size)]
+            while pages[-1].next_cursor:
+                pages.append(show_listing(
+                    size, after=decode_cursor(pages[-1].next_cursor)))
+            # neither skipped nor repeated across equal start times
+            self.assertEqual(sum((self.keys(page) for page in pages), []),
+                             self.shows)
+            self.assertEqual(len(pages), -(-len(self.shows) // size))
+            self.assertIsNone(pages[-1].next_cursor)
+
+            back = [pages[-1]]
+            while back[-1].prev_cursor:
+                back.append(show_listing(
+                    size, before=decode_cursor(back[-1].prev_cursor)))
+            self.assertEqual(
+                [self.keys(page) for page in reversed(back)],
+                [self.keys(page) for page in pages])
+            self.assertIsNone(back[-1].prev_cursor)
+
+    def test_last_page_back_to_the_start(self):
+        # a short last page: the page before it is a full one
+        last = show_listing(4, after=decode_cursor(show_listing(
+            8).next_cursor))
+        self.assertEqual(self.keys(last), self.shows[8:])
+        self.assertIsNone(last.next_cursor)
+        page = show_listing(4, before=decode_cursor(last.prev_cursor))
+        self.assertEqual(self.keys(page), self.shows[4:8])
+        self.assertEqual(self.keys(show_listing(
+            4, after=decode_cursor(page.next_cursor))), self.shows[8:])
+
+    def test_past_the_ends(self):
+        page = show_listing(3, before=(self.shows[0][0], 1))
+        self.assertEqual(page.items, [])
+        self.assertIsNone(page.prev_cursor)
+        page = show_listing(3, after=(self.shows[-1][0], 10 ** 6))
+        self.assertEqual(page.items, [])
+        self.assertIsNone(page.next_cursor)
+
+    def test_show_cards(self):
+        venue_id = self.shows[0][1]
+        data = venue_detail(venue_id, limit=1, now=self.start + timedelta(
+            days=7))
+        self.assertEqual(len(data['past_shows']), 1)
+        cards, next_cursor = venue_show_cards(
+            venue_id, 'past', decode_cursor(data['past_shows_next']), 1,
+            now=self.start + timedelta(days=7))
+        self.assertEqual([card['start_time'] for card in cards],
+                         [self.start - timedelta(days=1)])
+        self.assertIsNone(next_cursor)
+
+    def test_bad_cursors_are_bad_requests(self):
+        start = self.shows[0][0]
+        for url in ('/shows?after=garbage',
+                    '/shows?before=' + raw_cursor(b'[]'),
+                    '/shows?after=' + encode_cursor('x', 'y'),
+                    '/shows?after=' + encode_cursor(start),
+                    '/artists?after=' + encode_cursor('Artist\x00', 1),
+                    '/venues?before=' + encode_cursor('CA', 1),
+                    '/venues/1/shows?when=past&cursor=garbage',
+                    '/venues/1/shows?when=past&cursor=' +
+                    encode_cursor(start, 'x'),
+                    '/api/v1/venues/1/shows?when=upcoming&cursor=' +
+                    encode_cursor(start)):
+            self.assertEqual(self.client.get(url).status_code, 400, url)
+
+    def test_next_link(self):
+        size = self.app.config['LISTING_PAGE_SIZE']
+        self.app.config['LISTING_PAGE_SIZE'] = 4
+        try:
+            response = self.client.get('/shows')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('after=' + show_listing(4).next_cursor,
+                          response.get_data(as_text=True))
+        finally:
+            self.app.config['LISTING_PAGE_SIZE'] = size
+
+
+if __name__ == '__main__':
+    unittest.main()
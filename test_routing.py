@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+import unittest
+from flask import Flask, request
+from flask_sqlalchemy import SQLAlchemy
+from routing import RoutingSession, STICKY_COOKIE, init_routing, read_bind_key
+
+#----------------------------------------------------------------------------#
+# Read replica routing tests.
+#----------------------------------------------------------------------------#
+# A small app routes through RoutingSession between a primary and a
+# replica database holding a `routing_test` row that names them. Set
+# FYYUR_TEST_PRIMARY_URL and FYYUR_TEST_REPLICA_URL to two Postgres
+# databases to run against them (the table is created and dropped);
+# otherwise two SQLite files stand in.
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+class Row(db.Model):
+    __tablename__ = 'routing_test'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(20), nullable=False)
+
+
+class ArchivedRow(db.Model):
+    __tablename__ = 'routing_test_archive'
+    __bind_key__ = 'archive'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(20), nullable=False)
+
+
+def database_urls(directory):
+    primary = os.environ.get('FYYUR_TEST_PRIMARY_URL')
+    replica = os.environ.get('FYYUR_TEST_REPLICA_URL')
+    if primary and replica:
+        return primary, replica
+    return tuple('sqlite:///' + os.path.join(directory, name + '.sqlite3')
+                 for name in ('primary', 'replica'))
+
+
+def routing_app(primary, replica):
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=primary,
+        SQLALCHEMY_BINDS={'replica_0': replica, 'archive': primary},
+        READ_YOUR_WRITES_SECONDS=5)
+    db.init_app(app)
+    init_routing(app)
+
+    def first_name():
+        return db.session.query(Row.name).order_by(Row.id).first().name
+
+    # endpoints named as the app's, in and out of routing.READ_ENDPOINTS
+    @app.route('/venues', endpoint='venues')
+    def read():
+        return first_name()
+
+    @app.route('/venues/search', methods=['POST'], endpoint='search_venues')
+    def search():
+        return first_name()
+
+    @app.route('/venues/1/edit', endpoint='edit_venue')
+    def edit_form():
+        return first_name()
+
+    @app.route('/archive', endpoint='shows')
+    def archive():
+        engine = db.session.get_bind(ArchivedRow.__mapper__)
+        return 'archive' if engine is db.engines['archive'] else 'other'
+
+    @app.route('/venues/create', methods=['POST'],
+               endpoint='create_venue_submission')
+    def write():
+        db.session.add(Row(name='new'))
+        if request.form.get('fail'):
+            db.session.rollback()
+        else:
+            db.session.commit()
+        return first_name()
+
+    @app.route('/venues/1/edit', methods=['POST'],
+               endpoint='edit_venue_submission')
+    def read_and_commit():
+        name = first_name()
+        db.session.commit()
+        return name
+
+    return app
+
+
+class RoutingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.app = routing_app(*database_urls(self.directory))
+        with self.app.app_context():
+            for key, name in ((None, 'primary'), ('replica_0', 'replica')):
+                engine = db.engines[key]
+                Row.__table__.drop(engine, checkfirst=True)
+                Row.__table__.create(engine)
+                with engine.begin() as connection:
+                    connection.execute(Row.__table__.insert(), {'name': name})
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        with self.app.app_context():
+            for key in (None, 'replica_0'):
+                Row.__table__.drop(db.engines[key])
+            for engine in db.engines.values():
+                engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def text(self, response):
+        self.assertEqual(response.status_code, 200)
+        return response.get_data(as_text=True)
+
+    def test_read_endpoints_use_the_replica(self):
+        self.assertEqual(self.text(self.client.get('/venues')), 'replica')
+        # the HTML searches are POSTs
+        self.assertEqual(self.text(self.client.post('/venues/search')),
+                         'replica')
+
+    def test_other_endpoints_use_the_primary(self):
+        self.assertEqual(self.text(self.client.get('/venues/1/edit')),
+                         'primary')
+
+    def test_explicit_bind_keys_are_kept(self):
+        self.assertEqual(self.text(self.client.get('/archive')), 'archive')
+
+    def test_committed_write_sticks_to_the_primary(self):
+        response = self.client.post('/venues/create')
+        self.assertEqual(self.text(response), 'primary')
+        self.assertIsNotNone(self.client.get_cookie(STICKY_COOKIE))
+        self.assertEqual(self.text(self.client.get('/venues')), 'primary')
+
+    def test_no_sticky_cookie_without_a_committed_write(self):
+        self.client.post('/venues/create', data={'fail': '1'})
+        self.assertIsNone(self.client.get_cookie(STICKY_COOKIE))
+        self.client.post('/venues/1/edit')
+        self.assertIsNone(self.client.get_cookie(STICKY_COOKIE))
+        self.assertEqual(self.text(self.client.get('/venues')), 'replica')
+
+    def test_no_replica_outside_requests(self):
+        with self.app.app_context():
+            self.assertIsNone(read_bind_key())
+            self.assertEqual(db.session.query(Row.name).first().name,
+                             'primary')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,232 @@
+import unittest
+from datetime import date, datetime, timedelta
+from dbtest import DatabaseTestCase
+from model import db, Venue, Artist, Show, ShowSeries
+from bookings import end_time, find_conflicts
+from series import InvalidSeries, Recurrence, SeriesConflict, \
+    create_series, edit_series, occurrences, parse_recurrence
+
+#----------------------------------------------------------------------------#
+# Show series and booking tests.
+#----------------------------------------------------------------------------#
+# Recurrence rules expand without a database. The booking checks of
+# series and of single show submissions run against Postgres, whose
+# exclusion constraints refuse double bookings; they need
+# FYYUR_TEST_DATABASE_URL (see dbtest.py).
+
+
+class OccurrencesTestCase(unittest.TestCase):
+
+    def test_weekly_count(self):
+        self.assertEqual(
+            occurrences(datetime(2030, 1, 7, 20),
+                        Recurrence('weekly', 3, None), 104),
+            [datetime(2030, 1, 7, 20), datetime(2030, 1, 14, 20),
+             datetime(2030, 1, 21, 20)])
+
+    def test_until_is_inclusive(self):
+        self.assertEqual(
+            occurrences(datetime(2030, 1, 7, 20),
+                        Recurrence('weekly', None, date(2030, 1, 21)), 104),
+            [datetime(2030, 1, 7, 20), datetime(2030, 1, 14, 20),
+             datetime(2030, 1, 21, 20)])
+
+    def test_count_or_until_whichever_comes_first(self):
+        start = datetime(2030, 1, 7, 20)
+        self.assertEqual(len(occurrences(
+            start, Recurrence('weekly', 2, date(2030, 12, 31)), 104)), 2)
+        self.assertEqual(len(occurrences(
+            start, Recurrence('weekly', 10, date(2030, 1, 14)), 104)), 2)
+
+    def test_until_before_the_start(self):
+        self.assertEqual(occurrences(
+            datetime(2030, 1, 7, 20),
+            Recurrence('weekly', None, date(2030, 1, 6)), 104), [])
+
+    def test_monthly_skips_months_without_the_day(self):
+        self.assertEqual(
+            occurrences(datetime(2030, 1, 31, 21),
+                        Recurrence('monthly', 4, None), 104),
+            [datetime(2030, 1, 31, 21), datetime(2030, 3, 31, 21),
+             datetime(2030, 5, 31, 21), datetime(2030, 7, 31, 21)])
+
+    def test_monthly_across_years(self):
+        self.assertEqual(
+            occurrences(datetime(2030, 11, 15, 19),
+                        Recurrence('monthly', None, date(2031, 2, 15)),
+                        104),
+            [datetime(2030, 11, 15, 19), datetime(2030, 12, 15, 19),
+             datetime(2031, 1, 15, 19), datetime(2031, 2, 15, 19)])
+
+    def test_limit(self):
+        start = datetime(2030, 1, 7, 20)
+        self.assertEqual(len(occurrences(
+            start, Recurrence('weekly', 104, None), 104)), 104)
+        with self.assertRaises(InvalidSeries):
+            occurrences(start, Recurrence('weekly', 105, None), 104)
+        with self.assertRaises(InvalidSeries):
+            occurrences(start, Recurrence('weekly', None,
+                                          date(2040, 1, 1)), 104)
+
+    def test_parse_recurrence(self):
+        self.assertIsNone(parse_recurrence('', 3, None))
+        self.assertEqual(parse_recurrence('monthly', None, date(2030, 6, 1)),
+                         Recurrence('monthly', None, date(2030, 6, 1)))
+        with self.assertRaises(InvalidSeries):
+            parse_recurrence('daily', 3, None)
+        with self.assertRaises(InvalidSeries):
+            parse_recurrence('weekly', None, None)
+
+
+class BookingsTestCase(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.venues = [Venue(name=name, city='San Francisco', state='CA',
+                             address='1015 Folsom Street',
+                             phone='123-123-1234', genres=['Jazz'])
+                       for name in ('The Musical Hop', 'Park Square')]
+        self.artists = [Artist(name=name, city='San Francisco', state='CA',
+                               phone='326-123-5000', genres=['Jazz'])
+                        for name in ('Guns N Petals', 'Matt Quevedo')]
+        db.session.add_all(self.venues + self.artists)
+        db.session.commit()
+        self.venue, self.other_venue = [venue.id for venue in self.venues]
+        self.artist, self.other_artist = [artist.id
+                                          for artist in self.artists]
+        # a show the tests try to double-book
+        self.booked = datetime(2030, 3, 4, 20)
+        self.add_show(self.venue, self.artist, self.booked)
+
+    def add_show(self, venue, artist, start_time):
+        db.session.add(Show(venue=venue, artist=artist,
+                            start_time=start_time,
+                            end_time=end_time(start_time)))
+        db.session.commit()
+
+    def show_count(self):
+        return db.session.query(Show).count()
+
+    def test_conflicts_with_existing_shows(self):
+        overlapping = (self.booked + timedelta(hours=1),
+                       self.booked + timedelta(hours=3))
+        conflicts = find_conflicts(self.venue, self.other_artist,
+                                   [overlapping])
+        self.assertEqual([conflict.entity for conflict in conflicts],
+                         [Venue])
+        self.assertIn('The Musical Hop is already booked',
+                      str(conflicts[0]))
+        conflicts = find_conflicts(self.other_venue, self.artist,
+                                   [overlapping])
+        self.assertEqual([conflict.entity for conflict in conflicts],
+                         [Artist])
+        self.assertEqual(len(find_conflicts(self.venue, self.artist,
+                                            [overlapping])), 2)
+
+    def test_adjacent_shows_do_not_conflict(self):
+        after = end_time(self.booked)
+        self.assertEqual(find_conflicts(
+            self.venue, self.artist, [(after, end_time(after)),
+                                      (self.booked - timedelta(hours=2),
+                                       self.booked)]), [])
+
+    def test_series_conflicting_with_a_show(self):
+        # the second of three weekly shows clashes
+        with self.assertRaises(SeriesConflict) as raised:
+            create_series(self.venue, self.other_artist,
+                          self.booked - timedelta(weeks=1), 120,
+                          Recurrence('weekly', 3, None))
+        db.session.rollback()
+        self.assertEqual(len(raised.exception.conflicts), 1)
+        self.assertEqual(raised.exception.conflicts[0].show.start_time,
+                         self.booked)
+        self.assertEqual(self.show_count(), 1)
+        self.assertEqual(db.session.query(ShowSeries).count(), 0)
+
+    def test_series_leaves_out_its_own_shows(self):
+        start = self.booked + timedelta(days=1)
+        series, shows = create_series(self.other_venue, self.other_artist,
+                                      start, 120,
+                                      Recurrence('weekly', 3, None))
+        db.session.commit()
+        self.assertEqual(shows, 3)
+        slots = [(start + timedelta(weeks=n, minutes=30),
+                  end_time(start + timedelta(weeks=n, minutes=30)))
+                 for n in range(3)]
+        self.assertEqual(len(find_conflicts(
+            self.other_venue, self.other_artist, slots)), 6)
+        self.assertEqual(find_conflicts(
+            self.other_venue, self.other_artist, slots, series.id), [])
+
+        # moving every show by half an hour overlaps only the old times
+        self.assertEqual(edit_series(
+            series, self.other_venue, self.other_artist,
+            start + timedelta(minutes=30), 120,
+            Recurrence('weekly', 3, None), now=start - timedelta(days=1)), 3)
+        db.session.commit()
+        self.assertEqual(
+            [show.start_time for show in db.session.query(Show).filter(
+                Show.series == series.id).order_by(Show.start_time)],
+            [slot[0] for slot in slots])
+
+    def test_series_edit_conflicting_with_a_show(self):
+        start = self.booked + timedelta(days=1)
+        series, shows = create_series(self.other_venue, self.artist, start,
+                                      120, Recurrence('weekly', 2, None))
+        db.session.commit()
+        with self.assertRaises(SeriesConflict):
+            edit_series(series, self.other_venue, self.artist,
+                        self.booked - timedelta(weeks=1), 120,
+                        Recurrence('weekly', 2, None),
+                        now=self.booked - timedelta(weeks=2))
+        db.session.rollback()
+        self.assertEqual(self.show_count(), 3)
+
+    def test_series_limit(self):
+        limit = self.app.config['SERIES_MAX_SHOWS']
+        self.app.config['SERIES_MAX_SHOWS'] = 3
+        try:
+            with self.assertRaises(InvalidSeries):
+                create_series(self.other_venue, self.other_artist,
+                              self.booked, 120,
+                              Recurrence('weekly', 4, None))
+        finally:
+            self.app.config['SERIES_MAX_SHOWS'] = limit
+            db.session.rollback()
+
+    def submit_show(self, **form):
+        form.setdefault('duration', '120')
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        try:
+            return self.client.post('/shows/create', data=form)
+        finally:
+            self.app.config['WTF_CSRF_ENABLED'] = True
+
+    def test_double_booked_show_is_a_conflict(self):
+        response = self.submit_show(
+            venue_id=str(self.venue), artist_id=str(self.other_artist),
+            start_time='2030-03-04 21:00:00')
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('The Musical Hop is already booked',
+                      response.get_data(as_text=True))
+        self.assertEqual(self.show_count(), 1)
+
+    def test_double_booked_series_is_a_conflict(self):
+        response = self.submit_show(
+            venue_id=str(self.other_venue), artist_id=str(self.artist),
+            start_time='2030-02-25 20:30:00', repeat='weekly', count='2')
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('Guns N Petals is already booked',
+                      response.get_data(as_text=True))
+        self.assertEqual(self.show_count(), 1)
+
+    def test_free_slot_is_listed(self):
+        response = self.submit_show(
+            venue_id=str(self.venue), artist_id=str(self.artist),
+            start_time='2030-03-04 22:00:00')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.show_count(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
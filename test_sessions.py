@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from flask import Flask, flash, get_flashed_messages
+from sessions import FileStore, SqliteStore, ServerSessionInterface
+
+#----------------------------------------------------------------------------#
+# Server-side session tests.
+#----------------------------------------------------------------------------#
+# Each store backs a small app through ServerSessionInterface: a message
+# flashed by one request must reach the next request, and the cookie
+# must carry only the signed session id. Needs no database.
+
+
+def flashing_app(store):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.session_interface = ServerSessionInterface(store)
+
+    @app.route('/flash')
+    def flash_message():
+        flash('Venue Alpha was successfully listed!')
+        return ''
+
+    @app.route('/messages')
+    def messages():
+        return '|'.join(get_flashed_messages())
+
+    return app
+
+
+class StoreTestCase(object):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = self.make_store()
+        self.client = flashing_app(self.store).test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_flash_round_trip(self):
+        self.client.get('/flash')
+        cookie = self.client.get_cookie('session')
+        self.assertIsNotNone(cookie)
+        self.assertNotIn('Alpha', cookie.value)
+
+        response = self.client.get('/messages')
+        self.assertEqual(response.get_data(as_text=True),
+                         'Venue Alpha was successfully listed!')
+        # consumed: the emptied session is deleted with its cookie
+        self.assertEqual(self.client.get('/messages').get_data(), b'')
+        self.assertIsNone(self.client.get_cookie('session'))
+
+    def test_tampered_cookie_starts_a_new_session(self):
+        self.client.get('/flash')
+        cookie = self.client.get_cookie('session')
+        self.client.set_cookie('session', cookie.value + 'x')
+        self.assertEqual(self.client.get('/messages').get_data(), b'')
+
+    def test_expired_sessions_are_purged(self):
+        self.store.set('stale', '{}', time.time() - 1)
+        self.store.set('fresh', '{}', time.time() + 60)
+        self.assertEqual(self.store.purge(), 1)
+        self.assertIsNone(self.store.get('stale'))
+        self.assertEqual(self.store.get('fresh'), '{}')
+
+
+class FileStoreTestCase(StoreTestCase, unittest.TestCase):
+
+    def make_store(self):
+        return FileStore(os.path.join(self.directory, 'sessions'))
+
+
+class SqliteStoreTestCase(StoreTestCase, unittest.TestCase):
+
+    def make_store(self):
+        return SqliteStore(os.path.join(self.directory, 'sessions.sqlite3'))
+
+
+if __name__ == '__main__':
+    unittest.main()